@@ -0,0 +1,86 @@
+# benchmarks/bench_alignment.py
+#
+# Compares single-pass timestamp alignment with the former pairwise outer-merge loop.
+# Run from the repository root: python -m benchmarks.bench_alignment --sizes 100 1000 5000
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from src.mc1_scraper import align_ticker_series
+
+
+def make_frames(n_tickers, n_bars=100, seed=0):
+    '''
+    Builds synthetic per-ticker frames shaped like `fetch_all_tickers_data` output.
+    input:
+        - n_tickers: Number of ticker frames (int).
+        - n_bars: Number of daily bars per ticker (int, default: 100).
+        - seed: Random seed (int, default: 0).
+    output:
+        - List of DataFrames with a "timestamp" column and one ticker column each.
+    '''
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range("2024-01-02", periods=n_bars + 20)
+    frames = []
+    for i in range(n_tickers):
+        # Mix 13:30 and 14:30 UTC opens and let listings start on different days
+        start = rng.integers(0, 20)
+        opens = pd.Timedelta(hours=13, minutes=30) if i % 2 else pd.Timedelta(hours=14, minutes=30)
+        timestamps = days[start:start + n_bars] + opens
+        frames.append(pd.DataFrame({"timestamp": timestamps, f"T{i}": rng.random(n_bars) * 100}))
+    return frames
+
+
+def pairwise_outer_merge(all_data):
+    '''
+    The alignment loop `fetch_all_tickers_data` used before `align_ticker_series`.
+    '''
+    unique_tickers = {df.columns[1]: df for df in all_data}
+    merged_data = pd.DataFrame()
+    for df in unique_tickers.values():
+        if merged_data.empty:
+            merged_data = df
+        else:
+            merged_data = pd.merge(merged_data, df, on="timestamp", how="outer")
+    return merged_data.sort_values(by="timestamp").reset_index(drop=True)
+
+
+def measure(func, frames):
+    '''
+    Runs `func(frames)` and returns (seconds, peak traced bytes, result shape).
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(frames)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result.shape
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark timestamp alignment engines.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--bars", type=int, default=100)
+    args = parser.parse_args()
+
+    engines = [
+        ("pairwise_merge", pairwise_outer_merge),
+        ("single_pass", align_ticker_series),
+        ("single_pass_snap", lambda frames: align_ticker_series(frames, snap_to="D")),
+    ]
+
+    print(f"{'tickers':>8} {'engine':>18} {'seconds':>10} {'peak MiB':>10} {'rows':>6}")
+    for n_tickers in args.sizes:
+        frames = make_frames(n_tickers, args.bars)
+        for name, func in engines:
+            elapsed, peak, shape = measure(func, frames)
+            print(f"{n_tickers:>8} {name:>18} {elapsed:>10.3f} {peak / 2**20:>10.1f} {shape[0]:>6}")
+
+
+if __name__ == "__main__":
+    main()
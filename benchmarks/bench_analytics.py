@@ -0,0 +1,77 @@
+# benchmarks/bench_analytics.py
+#
+# Compares the pandas computations of docs/5_EDA.ipynb (corr + unstack + sort, corrwith over
+# shifted frames per leading ticker) with the batched versions in src/mc1_analytics.py.
+# Run from the repository root:
+#   python -m benchmarks.bench_analytics --tickers 500 --bars 1000 --lags 1 2 3
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.mc1_analytics import (
+    RollingCorrelation,
+    compute_returns,
+    correlation_matrix,
+    lead_lag_correlations,
+    top_correlations,
+)
+
+
+def make_prices(bars, tickers, seed=0):
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, tickers)), axis=0))
+    data = pd.DataFrame(prices, columns=[f"T{i:05d}" for i in range(tickers)])
+    data.insert(0, "timestamp", pd.date_range("2020-01-01", periods=bars, freq="D"))
+    return data
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def eda_top_pairs(frame, k):
+    # The notebook: full matrix, every pair unstacked and sorted
+    pairs = frame.corr().unstack()
+    pairs = pairs[pairs.index.get_level_values(0) < pairs.index.get_level_values(1)]
+    return pairs.sort_values(ascending=False).head(k)
+
+
+def eda_lagged(frame, lags):
+    # The notebook: one corrwith over the whole frame per leading ticker and lag
+    return [[frame.corrwith(frame[leader].shift(lag)) for leader in frame.columns] for lag in lags]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized analytics against the EDA loops.")
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=1000)
+    parser.add_argument("--lags", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--k", type=int, default=15)
+    args = parser.parse_args()
+
+    data = make_prices(args.bars, args.tickers)
+    returns = compute_returns(data)
+    frame = returns.drop(columns="timestamp")
+
+    pandas_pairs_s, _ = timed(lambda: eda_top_pairs(frame, args.k))
+    pairs_s, _ = timed(lambda: top_correlations(correlation_matrix(returns), args.k))
+    pandas_lag_s, _ = timed(lambda: eda_lagged(frame, args.lags))
+    lag_s, _ = timed(lambda: lead_lag_correlations(returns, args.lags))
+
+    rolling = RollingCorrelation(list(frame.columns), window=250).update(data.iloc[:-20])
+    update_s, _ = timed(lambda: [rolling.update(data.iloc[[i]]) for i in range(len(data) - 20, len(data))])
+    recompute_s, _ = timed(lambda: correlation_matrix(returns.iloc[-250:]))
+
+    print(f"{args.tickers} tickers x {args.bars} bars, lags {args.lags}")
+    print(f"top-{args.k} pairs      pandas {pandas_pairs_s:>8.3f} s   batched {pairs_s:>8.3f} s")
+    print(f"lead/lag            pandas {pandas_lag_s:>8.3f} s   batched {lag_s:>8.3f} s")
+    print(f"rolling update      per bar {update_s / 20 * 1e3:>7.2f} ms   full window {recompute_s * 1e3:>8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
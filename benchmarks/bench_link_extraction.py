@@ -0,0 +1,98 @@
+# benchmarks/bench_link_extraction.py
+#
+# Compares CPU time and WebDriver bytes per industry page for the page_source +
+# BeautifulSoup path and the in-browser script path of `extract_quote_links`.
+# Run from the repository root: python -m benchmarks.bench_link_extraction
+
+import argparse
+import glob
+import json
+import os
+import time
+from html.parser import HTMLParser
+
+from src.mc1_scraper import collect_quote_links_in_browser, parse_quote_links, quote_href_script
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+class _AnchorCollector(HTMLParser):
+    # Stand-in for document.querySelectorAll('a[href^="/quote/"]') on a recorded page
+    def __init__(self):
+        super().__init__()
+        self.hrefs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href and href.startswith("/quote/"):
+                self.hrefs.append(href)
+
+
+class RecordedPageDriver:
+    '''
+    Replays a recorded page through the two WebDriver calls the extraction paths use.
+    The in-browser query result is computed once up front, since that work happens in
+    the browser process, and every call records the bytes the WebDriver protocol would
+    carry (JSON-encoded response value).
+    input:
+        - html: Recorded page source (string).
+    '''
+
+    def __init__(self, html):
+        self._html = html
+        collector = _AnchorCollector()
+        collector.feed(html)
+        self._hrefs = collector.hrefs
+        self.bytes_transferred = 0
+
+    @property
+    def page_source(self):
+        self.bytes_transferred += len(json.dumps({"value": self._html}).encode())
+        return self._html
+
+    def execute_script(self, script):
+        if script != quote_href_script:
+            raise ValueError("unexpected script")
+        self.bytes_transferred += len(json.dumps({"value": self._hrefs}).encode())
+        return list(self._hrefs)
+
+
+def measure(extract, html, repeats):
+    '''
+    Runs `extract(driver)` on a recorded page and returns per-page CPU ms, bytes and links.
+    '''
+    recorded = RecordedPageDriver(html)
+    start = time.process_time()
+    for _ in range(repeats):
+        links = extract(recorded)
+    cpu_ms = (time.process_time() - start) * 1000 / repeats
+    return cpu_ms, recorded.bytes_transferred // repeats, links
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark industry page link extraction.")
+    parser.add_argument("--pages", nargs="+", default=sorted(glob.glob(os.path.join(FIXTURES_DIR, "industry_*.html"))))
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    modes = [
+        ("page_source", lambda d: parse_quote_links(d.page_source)),
+        ("in_browser", collect_quote_links_in_browser),
+    ]
+
+    print(f"{'page':>24} {'mode':>12} {'cpu ms':>9} {'bytes':>9} {'links':>6}")
+    for path in args.pages:
+        with open(path, encoding="utf-8") as file:
+            html = file.read()
+        results = {}
+        for name, extract in modes:
+            cpu_ms, transferred, links = measure(extract, html, args.repeats)
+            results[name] = links
+            print(f"{os.path.basename(path):>24} {name:>12} {cpu_ms:>9.2f} {transferred:>9} {len(links):>6}")
+        if results["page_source"] != results["in_browser"]:
+            print(f"WARNING: extraction modes disagree on {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# benchmarks/bench_pipeline.py
+#
+# End-to-end benchmark of discovery -> fetch_all_tickers_data -> save against the local
+# replay server in benchmarks/replay.py, at several universe sizes. Writes a JSON report
+# with throughput, p50/p95 request latency and peak RSS that can be compared across versions.
+# Run from the repository root:
+#   python -m benchmarks.bench_pipeline --sizes 50 200 1000 --latency-ms 20 --error-rate 0.02
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import src.mc1_scraper as scraper
+from benchmarks.replay import ReplayDriver, ReplayServer, ReplayUniverse
+
+
+class TimedSession:
+    '''
+    Wraps a requests.Session and records the latency of every request by kind
+    ("page" for HTML, "chart" for chart and spark responses).
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self.latencies = {"page": [], "chart": []}
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.session.get(url, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            kind = "chart" if "/finance/" in url else "page"
+            with self._lock:
+                self.latencies[kind].append(elapsed)
+
+    def close(self):
+        self.session.close()
+
+
+def latency_summary(samples):
+    '''
+    Returns count, p50 and p95 in milliseconds for a list of latencies in seconds.
+    '''
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None}
+    p50, p95 = np.percentile(np.asarray(samples) * 1000, [50, 95])
+    return {"count": len(samples), "p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3)}
+
+
+def peak_rss_mb():
+    '''
+    Returns the peak resident set size of this process in MiB, or None where unavailable.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def point_at_replay(server_url, universe):
+    '''
+    Redirects the scraper's endpoint globals to the replay server.
+    '''
+    scraper.sectors_url = f"{server_url}/u/{universe}/sectors/basic-materials/"
+    scraper.chart_base_url = f"{server_url}/v8/finance/chart/"
+    scraper.spark_base_url = f"{server_url}/v7/finance/spark"
+
+
+def run_pipeline(server_url, universe, discovery="http", fetch_mode="chart", output_dir=None):
+    '''
+    Runs the scraper pipeline once against a replay server, like `main` does.
+    input:
+        - server_url: Base URL of a running `ReplayServer` (string).
+        - universe: Number of tickers to discover (int, rounded up to whole industries).
+        - discovery: "http" for `discover_quote_links`, "browser" for `extract_quote_links`
+          on a `ReplayDriver` (default: "http").
+        - fetch_mode: `fetch_all_tickers_data` fetch mode (default: "chart").
+        - output_dir: Directory for the saved files (default: None, a temporary directory).
+    output:
+        - Dictionary with stage timings, throughput, latency percentiles and counts.
+    '''
+    point_at_replay(server_url, universe)
+    period1, period2 = ReplayUniverse().period()
+    session = scraper.create_http_session(max_connections_per_host=scraper.max_adaptive_requests)
+    timed = TimedSession(session)
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        output_dir = output_dir or tmp
+
+        start = time.perf_counter()
+        if discovery == "browser":
+            driver = ReplayDriver(timed)
+            driver.get(scraper.sectors_url)
+            scraper.gather_industry_names(driver)
+            links = scraper.extract_quote_links(driver, scraper.generate_urls(), in_browser=True)
+        else:
+            links = scraper.discover_quote_links(timed)
+        discovered = time.perf_counter()
+
+        controller = scraper.AdaptiveConcurrency(timed)
+        data = scraper.fetch_all_tickers_data(
+            links, session=controller, max_concurrency=controller.max_limit,
+            period1=period1, period2=period2, fetch_mode=fetch_mode,
+        )
+        fetched = time.perf_counter()
+
+        scraper.save_links_to_csv(links, os.path.join(output_dir, "extracted_links.csv"))
+        scraper.save_data_to_csv(data, os.path.join(output_dir, "stock_data.csv"))
+        try:
+            scraper.save_data_to_columnar(data, os.path.join(output_dir, "stock_data"))
+            columnar = True
+        except ImportError:
+            columnar = False
+        saved = time.perf_counter()
+
+    timed.close()
+    n_pages = len(timed.latencies["page"])
+    n_tickers = max(len(data.columns) - 1, 0)
+    return {
+        "universe": universe,
+        "links": len(links),
+        "tickers": n_tickers,
+        "pages": n_pages,
+        "columnar_saved": columnar,
+        "stages_s": {
+            "discovery": round(discovered - start, 4),
+            "fetch": round(fetched - discovered, 4),
+            "save": round(saved - fetched, 4),
+            "total": round(saved - start, 4),
+        },
+        "throughput": {
+            "pages_per_s": round(n_pages / max(discovered - start, 1e-9), 2),
+            "tickers_per_s": round(n_tickers / max(fetched - discovered, 1e-9), 2),
+        },
+        "latency": {kind: latency_summary(samples) for kind, samples in timed.latencies.items()},
+        "controller": controller.metrics(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_in_subprocess(server_url, universe, args):
+    '''
+    Runs one universe size in a fresh interpreter, so peak RSS belongs to that size alone.
+    '''
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as file:
+        result_path = file.name
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pipeline", "--worker", result_path,
+             "--server", server_url, "--sizes", str(universe),
+             "--discovery", args.discovery, "--fetch-mode", args.fetch_mode],
+            check=True,
+        )
+        with open(result_path, encoding="utf-8") as file:
+            return json.load(file)
+    finally:
+        os.remove(result_path)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper pipeline against a local replay server.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--discovery", choices=["http", "browser"], default="http")
+    parser.add_argument("--fetch-mode", choices=["chart", "batch", "auto"], default="chart")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--in-process", action="store_true",
+                        help="run all sizes in this process (peak RSS is then cumulative)")
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_pipeline(args.server, args.sizes[0], args.discovery, args.fetch_mode)
+        with open(args.worker, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return
+
+    report = {
+        "benchmark": "pipeline",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "discovery": args.discovery,
+            "fetch_mode": args.fetch_mode,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "error_status": args.error_status,
+            "seed": args.seed,
+            "rss_scope": "process" if args.in_process else "size",
+        },
+        "results": [],
+    }
+
+    print(f"{'universe':>9} {'tickers':>8} {'total s':>8} {'pages/s':>8} {'tickers/s':>10} "
+          f"{'chart p50':>10} {'chart p95':>10} {'errors':>7} {'rss MiB':>8}")
+    for universe in args.sizes:
+        server = ReplayServer(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                              error_status=args.error_status, seed=args.seed)
+        with server:
+            if args.in_process:
+                result = run_pipeline(server.url, universe, args.discovery, args.fetch_mode)
+            else:
+                result = run_in_subprocess(server.url, universe, args)
+            result["server"] = server.snapshot()
+        report["results"].append(result)
+
+        chart = result["latency"]["chart"]
+        print(f"{universe:>9} {result['tickers']:>8} {result['stages_s']['total']:>8.2f} "
+              f"{result['throughput']['pages_per_s']:>8.1f} {result['throughput']['tickers_per_s']:>10.1f} "
+              f"{chart['p50_ms'] or 0:>10.1f} {chart['p95_ms'] or 0:>10.1f} "
+              f"{result['server']['error']:>7} {result['peak_rss_mb'] or 0:>8.1f}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
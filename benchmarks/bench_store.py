@@ -0,0 +1,76 @@
+# benchmarks/bench_store.py
+#
+# Measures upserts, point lookups and range queries of the SQLite `PriceStore` as it grows
+# to millions of bars. Run from the repository root:
+#   python -m benchmarks.bench_store --tickers 2000 --days 1000
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.mc1_scraper import PriceStore
+
+
+def make_run(tickers, days, seed=0):
+    '''
+    Builds a wide frame like `fetch_all_tickers_data` output for `tickers` symbols over `days` daily bars.
+    '''
+    rng = np.random.default_rng(seed)
+    timestamps = pd.date_range("2020-01-02 14:30", periods=days, freq="D")
+    prices = rng.random((days, tickers)) * 100
+    data = pd.DataFrame(prices, columns=[f"T{i:05d}" for i in range(tickers)])
+    data.insert(0, "timestamp", timestamps)
+    return data
+
+
+def timed(func, repeat=1):
+    '''
+    Returns the mean seconds of `repeat` calls and the result of the last one.
+    '''
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the SQLite time-series store.")
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    data = make_run(args.tickers, args.days)
+    tickers = list(data.columns[1:])
+    rng = np.random.default_rng(1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "prices.sqlite")
+        with PriceStore(path) as store:
+            insert_s, rows = timed(lambda: store.upsert_frame(data))
+            # The same run again: every row is a conflict that updates in place
+            upsert_s, _ = timed(lambda: store.upsert_frame(data))
+
+            points = [(tickers[i], data["timestamp"][j]) for i, j in
+                      zip(rng.integers(0, len(tickers), args.lookups), rng.integers(0, args.days, args.lookups))]
+            point_s, _ = timed(lambda: [store.get(ticker, ts) for ticker, ts in points])
+            chosen = [tickers[i] for i in rng.choice(len(tickers), 20, replace=False)]
+            range_s, frame = timed(lambda: store.query(chosen, "2021-01-01", "2021-12-31 23:59"), repeat=5)
+            single_s, _ = timed(lambda: store.series(tickers[0], "2021-01-01", "2021-12-31 23:59"), repeat=20)
+        size_mb = os.path.getsize(path) / 2**20
+
+    print(f"rows stored          {rows:>12,}")
+    print(f"file size            {size_mb:>12.1f} MiB")
+    print(f"insert               {insert_s:>12.2f} s  ({rows / insert_s:,.0f} rows/s)")
+    print(f"re-upsert            {upsert_s:>12.2f} s  ({rows / upsert_s:,.0f} rows/s)")
+    print(f"point lookup         {point_s / args.lookups * 1e6:>12.1f} us")
+    print(f"1-year, 1 ticker     {single_s * 1e3:>12.2f} ms")
+    print(f"1-year, 20 tickers   {range_s * 1e3:>12.2f} ms  ({frame.shape[0]} x {frame.shape[1] - 1})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# benchmarks/replay.py
+#
+# Local HTTP stand-in for Yahoo Finance that replays the recorded pages and chart
+# responses in benchmarks/fixtures, with configurable latency and error injection.
+# Used by benchmarks/bench_pipeline.py; nothing here touches the network.
+
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+
+from src.mc1_scraper import filter_quote_hrefs, quote_href_script
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+LINKS_PER_INDUSTRY = 10  # `parse_quote_links` keeps the first 10 links of an industry page
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def replay_symbol(index):
+    '''
+    Returns a unique uppercase ticker for a position in the replayed universe, e.g. "QAAAB".
+    '''
+    letters = ""
+    for _ in range(4):
+        index, digit = divmod(index, 26)
+        letters = chr(ord("A") + digit) + letters
+    return "Q" + letters
+
+
+def replay_industry_name(index):
+    return f"Replay Industry {index}"
+
+
+class ReplayUniverse:
+    '''
+    Renders sector pages, industry pages and chart responses for synthetic universes
+    from one recorded page or response of each kind.
+    input:
+        - sector_html, industry_html, chart_json: Recorded fixtures (default: the files in benchmarks/fixtures).
+    '''
+
+    def __init__(self, sector_html=None, industry_html=None, chart_json=None):
+        self.sector_html = sector_html or _read_fixture("sector_basic_materials.html")
+        self.industry_html = industry_html or _read_fixture("industry_gold.html")
+        chart = json.loads(chart_json or _read_fixture("chart_NEM.json"))
+        self.chart_result = chart["chart"]["result"][0]
+
+        # The recorded page's tickers are swapped for per-industry symbols on every render
+        soup = BeautifulSoup(self.industry_html, "html.parser")
+        hrefs = [a["href"] for a in soup.find_all("a", href=True)]
+        recorded = dict.fromkeys(link.split("/")[-2] for link in filter_quote_hrefs(hrefs, limit=None))
+        self.recorded_tickers = list(recorded)[:LINKS_PER_INDUSTRY]
+        self._ticker_pattern = re.compile(
+            "/quote/(" + "|".join(re.escape(t) for t in self.recorded_tickers) + ")/"
+        )
+        self._ticker_slot = {ticker: slot for slot, ticker in enumerate(self.recorded_tickers)}
+
+        # The symbol is the only part of a chart response that changes between tickers
+        body = json.dumps(chart, separators=(",", ":"))
+        marker = json.dumps({"symbol": self.chart_result["meta"]["symbol"]}, separators=(",", ":"))[1:-1]
+        self._chart_prefix, self._chart_suffix = body.split(marker, 1)
+
+        self._industry_cache = {}
+        self._cache_lock = threading.Lock()
+
+    def n_industries(self, universe):
+        return max(1, math.ceil(universe / LINKS_PER_INDUSTRY))
+
+    def tickers(self, universe):
+        '''
+        Returns the symbols an industry crawl of `universe` tickers discovers.
+        '''
+        return [replay_symbol(i) for i in range(self.n_industries(universe) * LINKS_PER_INDUSTRY)]
+
+    def sector_page(self, universe):
+        '''
+        Returns the recorded sector page with one industry row per 10 tickers of the universe.
+        '''
+        rows = ['<tr class="yf-k3njn8"><td class="name">All Industries</td><td>100%</td><td>+0.00%</td></tr>']
+        for index in range(self.n_industries(universe)):
+            rows.append(
+                f'<tr class="yf-k3njn8"><td class="name">{replay_industry_name(index)}</td>'
+                f'<td>1.00%</td><td>+0.00%</td></tr>'
+            )
+        return re.sub(r"<tbody>.*?</tbody>", "<tbody>\n" + "\n".join(rows) + "\n</tbody>",
+                      self.sector_html, count=1, flags=re.S)
+
+    def industry_page(self, index):
+        '''
+        Returns the recorded industry page with its tickers renamed for industry `index`.
+        '''
+        with self._cache_lock:
+            page = self._industry_cache.get(index)
+        if page is None:
+            offset = index * LINKS_PER_INDUSTRY
+            page = self._ticker_pattern.sub(
+                lambda m: f"/quote/{replay_symbol(offset + self._ticker_slot[m.group(1)])}/", self.industry_html
+            )
+            with self._cache_lock:
+                self._industry_cache[index] = page
+        return page
+
+    def chart_body(self, symbol):
+        return (self._chart_prefix + json.dumps({"symbol": symbol})[1:-1] + self._chart_suffix).encode()
+
+    def spark_body(self, symbols):
+        result = [{"symbol": symbol, "response": [self.chart_result]} for symbol in symbols]
+        return json.dumps({"spark": {"result": result, "error": None}}, separators=(",", ":")).encode()
+
+    def period(self):
+        '''
+        Returns (period1, period2) covering the recorded bars, for fetch calls against the replay.
+        '''
+        timestamps = self.chart_result["timestamp"]
+        return timestamps[0], timestamps[-1] + 86400
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive like the real endpoints
+
+    sector_path = re.compile(r"^/u/(\d+)/sectors/[^/]+/$")
+    industry_path = re.compile(r"^/u/\d+/sectors/[^/]+/replay-industry-(\d+)/$")
+
+    def do_GET(self):
+        server = self.server
+        server.delay()
+        url = urlparse(self.path)
+
+        if server.inject_error():
+            self._send(server.error_status, b"", "text/plain", {"Retry-After": str(server.retry_after)})
+            return
+
+        match = self.sector_path.match(url.path)
+        if match:
+            server.count("page")
+            self._send(200, server.universe.sector_page(int(match.group(1))).encode(), "text/html")
+            return
+        match = self.industry_path.match(url.path)
+        if match:
+            server.count("page")
+            self._send(200, server.universe.industry_page(int(match.group(1))).encode(), "text/html")
+            return
+        if url.path.startswith("/v8/finance/chart/"):
+            server.count("chart")
+            self._send(200, server.universe.chart_body(url.path.rsplit("/", 1)[-1]), "application/json")
+            return
+        if url.path.startswith("/v7/finance/spark"):
+            server.count("spark")
+            symbols = parse_qs(url.query).get("symbols", [""])[0].split(",")
+            self._send(200, server.universe.spark_body(symbols), "application/json")
+            return
+        self._send(404, b"", "text/plain")
+
+    def _send(self, status, body, content_type, extra_headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    '''
+    Serves a `ReplayUniverse` on localhost in a background thread.
+    input:
+        - universe: `ReplayUniverse` to serve (default: None, built from the recorded fixtures).
+        - latency_ms: Delay added to every response in milliseconds (default: 0).
+        - jitter_ms: Uniform random extra delay in milliseconds (default: 0).
+        - error_rate: Fraction of requests answered with `error_status` (default: 0).
+        - error_status: Status code of injected errors (default: 503).
+        - retry_after: Retry-After seconds sent with injected errors (default: 0).
+        - seed: Seed for jitter and error injection (default: 0).
+    '''
+    daemon_threads = True
+
+    def __init__(self, universe=None, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=503,
+                 retry_after=0, seed=0):
+        super().__init__(("127.0.0.1", 0), _ReplayHandler)
+        self.universe = universe or ReplayUniverse()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"page": 0, "chart": 0, "spark": 0, "error": 0}
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def sectors_url(self, universe):
+        return f"{self.url}/u/{universe}/sectors/basic-materials/"
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        if self.latency_ms or jitter:
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def inject_error(self):
+        with self._lock:
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.counts["error"] += 1
+                return True
+        return False
+
+    def count(self, kind):
+        with self._lock:
+            self.counts[kind] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _ReplayElement:
+    # The slice of the WebElement API the scraper uses, on top of a BeautifulSoup tag
+    def __init__(self, tag):
+        self._tag = tag
+
+    @property
+    def text(self):
+        return self._tag.get_text(strip=True)
+
+    def get_attribute(self, name):
+        return self._tag.get(name)
+
+    def find_element(self, by, value):
+        return _select_one(self._tag, value)
+
+    def find_elements(self, by, value):
+        return [_ReplayElement(tag) for tag in self._tag.select(value)]
+
+
+def _select_one(soup, selector):
+    tag = soup.select_one(selector)
+    if tag is None:
+        raise NoSuchElementException(f"No element matches {selector}")
+    return _ReplayElement(tag)
+
+
+class ReplayDriver:
+    '''
+    WebDriver stand-in that loads pages from the replay server over HTTP, so the browser
+    code paths (`gather_industry_names`, `extract_quote_links`) run without Chrome.
+    Only CSS selectors and the scripts the scraper sends are supported.
+    input:
+        - session: requests.Session (or wrapper with `get`) used to load pages.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+        self.current_url = None
+        self.page_source = ""
+        self._soup = None
+
+    def get(self, url):
+        response = self.session.get(url, timeout=30)
+        response.raise_for_status()
+        self.current_url = url
+        self.page_source = response.text
+        self._soup = BeautifulSoup(self.page_source, "html.parser")
+
+    def find_element(self, by, value):
+        return _select_one(self._soup, value)
+
+    def find_elements(self, by, value):
+        return [_ReplayElement(tag) for tag in self._soup.select(value)]
+
+    def execute_script(self, script, *args):
+        if script == quote_href_script:
+            return [a["href"] for a in self._soup.select('a[href^="/quote/"]')]
+        if "document.readyState" in script:
+            return "complete"
+        if "getElementsByTagName('a').length" in script:
+            return len(self._soup.find_all("a"))
+        raise ValueError(f"unsupported script: {script.strip()[:60]}")
+
+    def quit(self):
+        pass
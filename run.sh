@@ -12,7 +12,7 @@ pip install -r requirements.txt
 
 # Step 3: Run the scraper
 echo "Running the scraper..."
-python3 src/mc1_scraper.py
+python3 src/mc1_scraper.py run-all
 
 # Step 4: Run tests
 echo "Running tests..."
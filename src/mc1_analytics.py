@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# ## 1. Setup
+
+# In[ ]:
+
+
+# Vectorized versions of the gain, correlation and lead/lag analyses of docs/5_EDA.ipynb.
+# Every function takes the wide price frame written by mc1_scraper (a "timestamp" column and
+# one close price column per ticker) or the matching NumPy matrix (rows = bars, columns = tickers).
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def price_matrix(data):
+    '''
+    Splits a wide price frame into its parts.
+    input:
+        - data: pandas DataFrame with a "timestamp" column (or a DatetimeIndex) and one price column per ticker.
+    output:
+        - Tuple (timestamps as DatetimeIndex, list of tickers, float64 matrix of shape (bars, tickers)).
+    '''
+    if "timestamp" in data.columns:
+        timestamps = pd.DatetimeIndex(data["timestamp"])
+        data = data.drop(columns="timestamp")
+    else:
+        timestamps = pd.DatetimeIndex(data.index)
+    return timestamps, list(data.columns), data.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _as_matrix(data):
+    # Accepts a wide frame or a matrix; returns (tickers or None, float64 matrix)
+    if isinstance(data, pd.DataFrame):
+        _, tickers, matrix = price_matrix(data)
+        return tickers, matrix
+    return None, np.asarray(data, dtype="float64")
+
+
+# ## 2. Returns and Gains
+
+# In[ ]:
+
+
+def compute_returns(data, kind="simple"):
+    '''
+    Computes bar-to-bar returns.
+    input:
+        - data: Wide price frame or price matrix.
+        - kind: "simple" for p[t] / p[t-1] - 1, "log" for log(p[t] / p[t-1]) (default: "simple").
+    output:
+        - Same type as `data`, one row shorter; NaN where either price is missing.
+    '''
+    if kind not in ("simple", "log"):
+        raise ValueError(f"Unknown return kind: {kind}")
+    tickers, prices = _as_matrix(data)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = prices[1:] / prices[:-1]
+        returns = np.log(ratio) if kind == "log" else ratio - 1.0
+
+    if tickers is None:
+        return returns
+    frame = pd.DataFrame(returns, columns=tickers)
+    frame.insert(0, "timestamp", price_matrix(data)[0][1:])
+    return frame
+
+
+def window_gains(data, start=None, end=None):
+    '''
+    Computes the gain of every ticker over a time window, from its first to its last price in the window.
+    input:
+        - data: Wide price frame.
+        - start, end: Inclusive window bounds (datetime-like) (default: None, the whole frame).
+    output:
+        - pandas Series: ticker -> gain in percent; NaN for tickers without a price in the window.
+    '''
+    timestamps, tickers, prices = price_matrix(data)
+    rows = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        rows &= timestamps >= pd.Timestamp(start)
+    if end is not None:
+        rows &= timestamps <= pd.Timestamp(end)
+    prices = prices[rows]
+
+    gains = np.full(len(tickers), np.nan)
+    valid = ~np.isnan(prices)
+    has_price = valid.any(axis=0)
+    if len(prices):
+        # Position of the first and last valid price per column, without a loop over tickers
+        first = prices[valid.argmax(axis=0), np.arange(len(tickers))]
+        last = prices[len(prices) - 1 - valid[::-1].argmax(axis=0), np.arange(len(tickers))]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gains[has_price] = ((last - first) / first * 100)[has_price]
+    return pd.Series(gains, index=tickers, name="gain_pct")
+
+
+def top_k(values, k=10, largest=True):
+    '''
+    Returns the k largest (or smallest) entries of a Series, using a partial selection
+    instead of sorting every entry. NaN entries are ignored.
+    input:
+        - values: pandas Series, e.g. from `window_gains`.
+        - k: Number of entries (default: 10).
+        - largest: True for the largest, False for the smallest entries (default: True).
+    output:
+        - pandas Series with the selected entries, ordered from the most extreme.
+    '''
+    values = values.dropna()
+    k = min(k, len(values))
+    if k == 0:
+        return values.iloc[:0]
+    scores = values.to_numpy(dtype="float64")
+    scores = -scores if largest else scores
+    chosen = np.argpartition(scores, k - 1)[:k]
+    return values.iloc[chosen[np.argsort(scores[chosen], kind="stable")]]
+
+
+# ## 3. Correlations
+
+# In[ ]:
+
+
+def cross_correlation(a, b, min_periods=2):
+    '''
+    Pairwise Pearson correlation between the columns of two matrices, over the rows where both
+    values are present (like `DataFrame.corr`), with a handful of matrix products instead of a
+    loop over pairs. Leading dimensions are batch dimensions.
+    input:
+        - a: Array of shape (..., bars, n) with NaN for missing values.
+        - b: Array of shape (..., bars, m) with NaN for missing values.
+        - min_periods: Minimum number of shared bars per pair (default: 2).
+    output:
+        - Array of shape (..., n, m); NaN where a pair has too few shared bars or no variance.
+    '''
+    a = np.asarray(a, dtype="float64")
+    b = np.asarray(b, dtype="float64")
+    mask_a = (~np.isnan(a)).astype("float64")
+    mask_b = (~np.isnan(b)).astype("float64")
+
+    # Correlation is shift invariant; centering first keeps the sums below small
+    with np.errstate(invalid="ignore"):
+        a = np.nan_to_num(a - np.nanmean(a, axis=-2, keepdims=True)) * mask_a
+        b = np.nan_to_num(b - np.nanmean(b, axis=-2, keepdims=True)) * mask_b
+
+    def t(x):
+        return np.swapaxes(x, -1, -2)
+
+    # Sums over the bars shared by each pair (i, j)
+    n = t(mask_a) @ mask_b
+    sum_a = t(a) @ mask_b
+    sum_b = t(mask_a) @ b
+    sum_aa = t(a * a) @ mask_b
+    sum_bb = t(mask_a) @ (b * b)
+    sum_ab = t(a) @ b
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sum_ab - sum_a * sum_b / n
+        var_a = sum_aa - sum_a * sum_a / n
+        var_b = sum_bb - sum_b * sum_b / n
+        corr = cov / np.sqrt(var_a * var_b)
+    corr[(n < min_periods) | (var_a <= 0) | (var_b <= 0)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def correlation_matrix(data, min_periods=2):
+    '''
+    Computes the correlation matrix of all tickers.
+    input:
+        - data: Wide frame (prices or returns) or matrix.
+        - min_periods: Minimum number of shared bars per pair (default: 2).
+    output:
+        - pandas DataFrame (ticker x ticker) for a frame, otherwise a NumPy array.
+    '''
+    tickers, matrix = _as_matrix(data)
+    corr = cross_correlation(matrix, matrix, min_periods)
+    np.fill_diagonal(corr, np.where(np.isnan(np.diag(corr)), np.nan, 1.0))
+    return corr if tickers is None else pd.DataFrame(corr, index=tickers, columns=tickers)
+
+
+def top_correlations(corr, k=15, sign="positive"):
+    '''
+    Returns the k strongest pairs of a correlation matrix. Each unordered pair is considered once
+    and selected with a partial selection, so the N^2 pairs are never sorted.
+    input:
+        - corr: Correlation matrix as a pandas DataFrame, from `correlation_matrix`.
+        - k: Number of pairs (default: 15).
+        - sign: "positive" for the largest, "negative" for the most negative, "absolute" for the
+          largest absolute correlations (default: "positive").
+    output:
+        - pandas DataFrame with the columns Stock1, Stock2 and Correlation, strongest first.
+    '''
+    if sign not in ("positive", "negative", "absolute"):
+        raise ValueError(f"Unknown sign: {sign}")
+    tickers = np.asarray(corr.columns)
+    rows, cols = np.triu_indices(len(tickers), k=1)
+    values = corr.to_numpy(dtype="float64")[rows, cols]
+
+    scores = {"positive": -values, "negative": values, "absolute": -np.abs(values)}[sign]
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if sign == "positive":
+        candidates = candidates[values[candidates] > 0]
+    elif sign == "negative":
+        candidates = candidates[values[candidates] < 0]
+
+    k = min(k, len(candidates))
+    if k == 0:
+        chosen = candidates[:0]
+    else:
+        chosen = candidates[np.argpartition(scores[candidates], k - 1)[:k]]
+        chosen = chosen[np.argsort(scores[chosen], kind="stable")]
+    return pd.DataFrame({
+        "Stock1": tickers[rows[chosen]],
+        "Stock2": tickers[cols[chosen]],
+        "Correlation": values[chosen],
+    })
+
+
+# ## 4. Lead/Lag Correlations
+
+# In[ ]:
+
+
+def lead_lag_correlations(data, lags=(1, 2, 3), min_periods=2):
+    '''
+    Computes the lagged correlation of every pair of tickers for several lags at once.
+    Entry [l, i, j] is the correlation of ticker i at bar t - lags[l] with ticker j at bar t,
+    i.e. how well i leads j; the diagonal is each ticker's autocorrelation. All lags are one
+    batched matrix product instead of a `corrwith` per leading ticker and lag.
+    input:
+        - data: Wide frame (prices or returns) or matrix.
+        - lags: Positive lags in bars (default: (1, 2, 3)).
+        - min_periods: Minimum number of shared bars per pair (default: 2).
+    output:
+        - float64 array of shape (len(lags), tickers, tickers).
+    '''
+    _, matrix = _as_matrix(data)
+    lags = [int(lag) for lag in lags]
+    if any(lag <= 0 for lag in lags):
+        raise ValueError("Lags must be positive")
+
+    # Stack the shifted copies; the NaN padding drops the first `lag` bars of each pair
+    leading = np.full((len(lags),) + matrix.shape, np.nan)
+    for position, lag in enumerate(lags):
+        leading[position, lag:] = matrix[:-lag]
+    following = np.broadcast_to(matrix, leading.shape)
+    return cross_correlation(leading, following, min_periods)
+
+
+def leading_stocks(lagged, tickers, k=10, lag_index=0):
+    '''
+    Ranks tickers by how strongly they lead the others: the mean absolute lagged correlation
+    of a ticker with every other ticker.
+    input:
+        - lagged: Array from `lead_lag_correlations`.
+        - tickers: Column names of the analysed frame (list of strings).
+        - k: Number of tickers (default: 10).
+        - lag_index: Position of the lag in `lags` (default: 0).
+    output:
+        - pandas Series: ticker -> influence, most influential first.
+    '''
+    matrix = np.abs(lagged[lag_index])
+    np.fill_diagonal(matrix, np.nan)
+    with np.errstate(invalid="ignore"):
+        influence = np.nanmean(matrix, axis=1) if matrix.shape[1] > 1 else np.full(len(tickers), np.nan)
+    return top_k(pd.Series(influence, index=tickers, name="influence"), k)
+
+
+def influenced_by(lagged, tickers, leader, k=3, lag_index=0):
+    '''
+    Returns the tickers that follow a leading ticker most closely at one lag.
+    input:
+        - lagged: Array from `lead_lag_correlations`.
+        - tickers: Column names of the analysed frame (list of strings).
+        - leader: The leading ticker (string).
+        - k: Number of tickers (default: 3).
+        - lag_index: Position of the lag in `lags` (default: 0).
+    output:
+        - pandas Series: ticker -> lagged correlation, largest first, without the leader itself.
+    '''
+    row = pd.Series(lagged[lag_index, list(tickers).index(leader)], index=tickers, name="lagged_correlation")
+    return top_k(row.drop(leader), k)
+
+
+# ## 5. Rolling Updates
+
+# In[ ]:
+
+
+class RollingCorrelation:
+    '''
+    Correlation matrix over the last `window` returns that is updated bar by bar: a new bar
+    adds and an expiring bar subtracts its outer products from running sums, so each update
+    costs O(tickers^2) however long the window is, instead of recomputing the whole window.
+    Missing prices are handled like `cross_correlation`.
+    input:
+        - tickers: Column names (list of strings).
+        - window: Number of most recent returns in the window (default: 60).
+        - kind: "simple" or "log" returns, see `compute_returns` (default: "simple").
+    '''
+
+    def __init__(self, tickers, window=60, kind="simple"):
+        self.tickers = list(tickers)
+        self.window = window
+        self.kind = kind
+        self.last_prices = None
+        self._rows = deque()
+        n = len(self.tickers)
+        self._count = np.zeros((n, n))
+        self._sum = np.zeros((n, n))
+        self._sum_sq = np.zeros((n, n))
+        self._sum_prod = np.zeros((n, n))
+
+    def _add(self, row, sign):
+        mask = (~np.isnan(row)).astype("float64")
+        values = np.nan_to_num(row)
+        self._count += sign * np.outer(mask, mask)
+        self._sum += sign * np.outer(values, mask)
+        self._sum_sq += sign * np.outer(values * values, mask)
+        self._sum_prod += sign * np.outer(values, values)
+
+    def update(self, prices):
+        '''
+        Adds new bars.
+        input:
+            - prices: Wide price frame with the new bars only, with the same tickers, or a matrix/1-D row.
+        output:
+            - The instance, so `update(...).corr()` can be chained.
+        '''
+        _, prices = _as_matrix(prices)
+        prices = np.atleast_2d(prices)
+        if self.last_prices is not None:
+            prices = np.vstack([self.last_prices, prices])
+        if len(prices) > 1:
+            for row in compute_returns(prices, self.kind):
+                self._rows.append(row)
+                self._add(row, 1.0)
+                if len(self._rows) > self.window:
+                    self._add(self._rows.popleft(), -1.0)
+        self.last_prices = prices[-1]
+        return self
+
+    def corr(self, min_periods=2):
+        '''
+        Returns the correlation matrix of the current window (pandas DataFrame).
+        '''
+        n = self._count
+        sum_a, sum_b = self._sum, self._sum.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cov = self._sum_prod - sum_a * sum_b / n
+            var_a = self._sum_sq - sum_a * sum_a / n
+            var_b = self._sum_sq.T - sum_b * sum_b / n
+            corr = np.clip(cov / np.sqrt(var_a * var_b), -1.0, 1.0)
+        # Sums that should cancel to zero leave rounding residue; treat tiny variances as none
+        scale = np.maximum(self._sum_sq, self._sum_sq.T) + 1e-300
+        corr[(n < min_periods) | (var_a <= 1e-12 * scale) | (var_b <= 1e-12 * scale)] = np.nan
+        return pd.DataFrame(corr, index=self.tickers, columns=self.tickers)
+
+    def returns(self):
+        '''
+        Returns the returns in the current window as a matrix of shape (bars, tickers).
+        '''
+        return np.array(self._rows).reshape(-1, len(self.tickers))
@@ -7,55 +7,172 @@
 
 
 #load libraries
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.action_chains import ActionChains
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-import pandas as pd
+import importlib
+import sys
+from urllib.parse import urljoin, urlparse, parse_qs, quote
 from datetime import datetime, timedelta
 import time
 import random
 import pickle
 import re
 import requests
+from urllib3.util.request import ACCEPT_ENCODING
 import csv
+import hashlib
 import json
+import logging
+import multiprocessing
+import os
+import socket
+import sqlite3
+from email.utils import parsedate_to_datetime
+import asyncio
+import heapq
+import itertools
+import queue
+from collections import deque
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _LazyImport:
+    '''
+    Stands in for a module or a module attribute and imports it on first use, so that
+    importing this file (e.g. for a fetch-only run) does not pay for selenium, bs4 or pandas.
+    input:
+        - module: Module name (string).
+        - attribute: Optional attribute of the module to stand in for (string) (default: None).
+    '''
+
+    def __init__(self, module, attribute=None):
+        self._module = module
+        self._attribute = attribute
+        self._target = None
+
+    def _resolve(self):
+        if self._target is None:
+            target = importlib.import_module(self._module)
+            self._target = getattr(target, self._attribute) if self._attribute else target
+        return self._target
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {self._module}{'.' + self._attribute if self._attribute else ''}>"
+
+
+# Heavy dependencies, imported when first used; `except` clauses import selenium exceptions locally
+webdriver = _LazyImport("selenium.webdriver")
+Service = _LazyImport("selenium.webdriver.chrome.service", "Service")
+By = _LazyImport("selenium.webdriver.common.by", "By")
+ActionChains = _LazyImport("selenium.webdriver.common.action_chains", "ActionChains")
+WebDriverWait = _LazyImport("selenium.webdriver.support.ui", "WebDriverWait")
+EC = _LazyImport("selenium.webdriver.support.expected_conditions")
+ChromeDriverManager = _LazyImport("webdriver_manager.chrome", "ChromeDriverManager")
+BeautifulSoup = _LazyImport("bs4", "BeautifulSoup")
+pd = _LazyImport("pandas")
+np = _LazyImport("numpy")
 
 
 # In[2]:
 
 
-# Initialize Chrome Options
-options = webdriver.ChromeOptions()
-options.add_argument("--headless")  # Run in headless mode
-options.add_argument("--no-sandbox")
-options.add_argument("--disable-dev-shm-usage")
-options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})  # Disable images
+def build_chrome_options():
+    '''
+    Builds the Chrome options shared by every WebDriver instance.
+    input:
+        - None.
+    output:
+        - selenium ChromeOptions for headless, image-free browsing.
+    '''
+    # Initialize Chrome Options
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")  # Run in headless mode
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})  # Disable images
+
+    # Configure Chrome anti-bot measures
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option("useAutomationExtension", False)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    return options
 
 
 # In[3]:
 
 
-# Configure Chrome anti-bot measures
-options.add_experimental_option("excludeSwitches", ["enable-automation"])
-options.add_experimental_option("useAutomationExtension", False)
-options.add_argument("--disable-blink-features=AutomationControlled")
+# Resolve the chromedriver binary once, even when several drivers are started
+@lru_cache(maxsize=None)
+def chromedriver_path():
+    '''
+    Installs (or finds the cached) chromedriver matching the local Chrome.
+    input:
+        - None.
+    output:
+        - Path (string) to the chromedriver executable.
+    '''
+    return ChromeDriverManager().install()
+
+
+def create_driver():
+    '''
+    Starts a new headless Chrome WebDriver.
+    input:
+        - None.
+    output:
+        - Selenium WebDriver instance.
+    '''
+    return webdriver.Chrome(
+        service=Service(chromedriver_path()),
+        options=build_chrome_options()
+    )
 
 
 # In[4]:
 
 
-# Initialize WebDriver with Chrome options
-driver = webdriver.Chrome(
-    service=Service(ChromeDriverManager().install()), 
-    options=options
-)
+# The shared WebDriver is only started when discovery needs a browser
+driver_factory = create_driver
+_driver = None
+
+
+def get_driver():
+    '''
+    Returns the shared WebDriver, starting it with `driver_factory` on first use.
+    input:
+        - None.
+    output:
+        - Selenium WebDriver instance.
+    '''
+    global _driver
+    if _driver is None:
+        _driver = driver_factory()
+    return _driver
+
+
+def close_driver():
+    '''
+    Quits the shared WebDriver if it was started.
+    '''
+    global _driver
+    if _driver is not None:
+        _driver.quit()
+        _driver = None
+
+
+def __getattr__(name):
+    # Keeps `mc1_scraper.driver` working for notebooks, without starting Chrome on import
+    if name == "driver":
+        return get_driver()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # In[5]:
@@ -63,8 +180,53 @@ driver = webdriver.Chrome(
 
 # Define paths for cookies and initial URLs
 cookie_file_path = "cookies.pkl"
+session_file = "yahoo_session.json"  # Consent cookies and crumb shared by the HTTP requests
+session_ttl = timedelta(hours=12)  # Longest time a bootstrapped session is reused
+session_bootstrap_url = "https://fc.yahoo.com/"  # Sets the session cookie; outside the EU without a consent page
+crumb_url = "https://query1.finance.yahoo.com/v1/test/getcrumb"
 base_url = "https://finance.yahoo.com/"
 sectors_url = "https://finance.yahoo.com/sectors/basic-materials/"
+chart_base_url = "https://query1.finance.yahoo.com/v8/finance/chart/"
+max_concurrent_requests = 8  # Chart requests kept in flight at the same time
+request_timeout = 30  # Seconds to wait for a chart response
+chart_cache_dir = "chart_cache"  # Directory of the on-disk chart cache
+page_ready_timeout = 15  # Seconds to wait for a rendered page to become ready
+driver_pool_size = 4  # Headless browsers used for parallel industry crawling
+max_adaptive_requests = 32  # Upper bound for the adaptive concurrency controller
+journal_file = "run_journal.sqlite"  # Checkpoint journal of completed pages and tickers
+work_queue_file = "work_queue.sqlite"  # Shared queue of the sharded execution mode
+price_store_file = "prices.sqlite"  # Time-series store that accumulates the prices of all runs
+discovery_cache_file = "discovery_cache.sqlite"  # Industry names and quote links of discovered pages
+discovery_ttl = timedelta(hours=24)  # Cached pages younger than this are not requested at all
+daemon_refresh_interval = timedelta(minutes=15)  # Time between two price refreshes of the daemon
+daemon_host = "127.0.0.1"  # Address of the daemon's query API
+daemon_port = 8765  # Port of the daemon's query API
+retry_attempts = 4  # Attempts per page or ticker before it is given up
+retry_base_delay = 0.5  # Seconds before the first retry, doubled per attempt (before jitter)
+retry_max_delay = 30.0  # Upper bound in seconds for a single retry delay
+# Intraday intervals: (bar seconds, days per chart request, days of history Yahoo keeps)
+intraday_intervals = {
+    "1m": (60, 7, 30),
+    "2m": (120, 30, 60),
+    "5m": (300, 30, 60),
+    "15m": (900, 30, 60),
+    "30m": (1800, 30, 60),
+    "60m": (3600, 60, 730),
+    "1h": (3600, 60, 730),
+    "90m": (5400, 30, 60),
+}
+
+
+# In[ ]:
+
+
+# Consent cookies and the crumb are bootstrapped at run time by `SessionManager`
+# accept-encoding is negotiated by `create_http_session`
+default_headers = {
+    "accept": "*/*",
+    "accept-language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
+    "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
+}
 
 
 # In[6]:
@@ -73,11 +235,12 @@ sectors_url = "https://finance.yahoo.com/sectors/basic-materials/"
 # Retry function for operations
 def retry_operation(func, retries=3, delay=5, *args, **kwargs):
     '''
-    Retries a function multiple times in case of failure, with a delay between attempts.
+    Retries a function multiple times in case of failure, with a growing, jittered delay between attempts.
+    For work made of many pages or tickers, `RetryScheduler` retries the failed items only.
     input:
         - func: The function to be executed.
         - retries: Number of retry attempts (default: 3).
-        - delay: Time (in seconds) between retry attempts (default: 5).
+        - delay: Base time (in seconds) between retry attempts, see `backoff_delay` (default: 5).
         - *args, **kwargs: Arguments and keyword arguments for the function `func`.
     output:
         - Returns the output of the function `func` if successful, otherwise None after exhausting retries.
@@ -86,409 +249,4852 @@ def retry_operation(func, retries=3, delay=5, *args, **kwargs):
         try:
             return func(*args, **kwargs)
         except Exception as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            time.sleep(delay)
-    print("Operation failed after retries.")
+            metrics.inc("retries", operation=getattr(func, "__name__", "operation"))
+            log_event("retry", f"Attempt {attempt + 1} failed: {e}", logging.WARNING,
+                      operation=getattr(func, "__name__", None), attempt=attempt + 1, error=str(e))
+            if attempt + 1 < retries:
+                time.sleep(backoff_delay(attempt, base=delay, cap=retry_max_delay))
+    log_event("retries_exhausted", "Operation failed after retries.", logging.ERROR,
+              operation=getattr(func, "__name__", None), retries=retries)
     return None
 
 
-# ## 2. Cookie Management
-
-# In[7]:
+# In[ ]:
 
 
-# Save cookies function
-def save_cookies(driver, path):
+# Create a pooled HTTP session shared by all backend requests
+def create_http_session(cookies=None, headers=None, max_connections_per_host=max_concurrent_requests, max_hosts=10):
     '''
-    Save browser cookies to a file for session reuse.
+    Creates a requests session that reuses keep-alive connections.
     input:
-        - driver: Selenium WebDriver instance.
-        - path: File path (string) to save the cookies (e.g., "cookies.pkl").
+        - cookies: Dictionary of cookies sent with every request (default: None).
+        - headers: Dictionary of headers sent with every request (default: None).
+        - max_connections_per_host: Maximum number of open connections per host (default: 8).
+        - max_hosts: Number of per-host connection pools kept alive (default: 10).
     output:
-        - None. Saves cookies to the specified file.
+        - requests.Session with connection pooling and compression configured.
     '''
-    with open(path, "wb") as file:
-        pickle.dump(driver.get_cookies(), file)
+    session = requests.Session()
 
+    # pool_block caps the connections per host; extra requests wait for a free connection
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=max_hosts,
+        pool_maxsize=max_connections_per_host,
+        pool_block=True,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
 
-# In[8]:
+    if headers:
+        session.headers.update(headers)
+    # Only advertise encodings urllib3 can decode (br requires the brotli package)
+    session.headers["accept-encoding"] = ACCEPT_ENCODING
 
+    if cookies:
+        session.cookies.update(cookies)
 
-# Load cookies function with domain check
-def load_cookies(driver, path):
+    return session
+
+
+# In[ ]:
+
+
+# Responses that signal an overloaded or rate-limiting server
+throttle_status_codes = (429, 502, 503, 504)
+
+
+def parse_retry_after(value, now=None):
     '''
-    Load browser cookies from a file to restore a session.
+    Parses a Retry-After header.
     input:
-        - driver: Selenium WebDriver instance.
-        - path: File path (string) from which cookies are loaded (e.g., "cookies.pkl").
+        - value: Header value, either delay seconds or an HTTP date (string or None).
+        - now: Current time as aware datetime (default: None, the current UTC time).
     output:
-        - Boolean: True if cookies are loaded successfully, False otherwise.
+        - Seconds to wait (float, at least 0), or None if the header is missing or invalid.
     '''
+    if not value:
+        return None
     try:
-        with open(path, "rb") as file:
-            cookies = pickle.load(file)
-            for cookie in cookies:
-                if "domain" in cookie and cookie["domain"] in driver.current_url:
-                    driver.add_cookie(cookie)
-            return True
-    except FileNotFoundError:
-        return False
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    now = now or datetime.now(retry_at.tzinfo)
+    return max(0.0, (retry_at - now).total_seconds())
 
 
-# ## 3. Frontend: Industry and Quote Link Extraction
+class AdaptiveConcurrency:
+    '''
+    AIMD controller for the number of requests in flight, used in place of a requests.Session.
+    Every success raises the limit by `increase / limit` (about +1 per round of requests),
+    every 429/5xx halves it once per round and pauses new requests for the Retry-After delay.
+    Throttled requests are retried, so a ticker is only lost after `max_retries` throttles.
+    '''
 
-# In[9]:
+    def __init__(self, session=None, initial=4, min_limit=1, max_limit=max_adaptive_requests, increase=1.0,
+                 decrease=0.5, max_retries=5, default_backoff=1.0, max_backoff=60.0, rate_window=10.0):
+        '''
+        input:
+            - session: requests.Session that performs the requests (default: None, the requests module).
+            - initial: Starting limit of requests in flight (default: 4).
+            - min_limit, max_limit: Bounds of the limit (default: 1 and 32).
+            - increase: Additive increase per round of successful requests (default: 1.0).
+            - decrease: Factor applied to the limit on a throttled response (default: 0.5).
+            - max_retries: Retries of a throttled request before its response is returned (default: 5).
+            - default_backoff: Pause in seconds when a throttled response has no Retry-After (default: 1.0).
+            - max_backoff: Upper bound in seconds for any pause (default: 60.0).
+            - rate_window: Seconds of successful responses averaged by `rate` (default: 10.0).
+        '''
+        self.session = session if session is not None else requests
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease = decrease
+        self.max_retries = max_retries
+        self.default_backoff = default_backoff
+        self.max_backoff = max_backoff
+        self.rate_window = rate_window
+        self.succeeded = 0
+        self.throttled = 0
+        self._in_flight = 0
+        self._round = 0  # bumped on every decrease, so one burst of 429s only halves the limit once
+        self._resume_at = 0.0
+        self._completions = deque()
+        self._condition = threading.Condition()
 
+    def _acquire(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now < self._resume_at:
+                    self._condition.wait(self._resume_at - now)
+                elif self._in_flight < int(self.limit):
+                    self._in_flight += 1
+                    return self._round
+                else:
+                    self._condition.wait()
 
-# Initialize an empty list to hold industry names
-industry_names = []
+    def _release(self, started_round, throttled, backoff=None):
+        with self._condition:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self.throttled += 1
+                if started_round == self._round:
+                    self._round += 1
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                if backoff is not None:
+                    self._resume_at = max(self._resume_at, now + min(backoff, self.max_backoff))
+            else:
+                self.succeeded += 1
+                self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                self._completions.append(now)
+                while self._completions and self._completions[0] < now - self.rate_window:
+                    self._completions.popleft()
+            self._condition.notify_all()
 
-def gather_industry_names(driver):
-    '''
-    Collects the names of industries listed on the Yahoo Finance sector page.
-    input:
-        - driver: Selenium WebDriver instance, already on the sector page.
-    output:
-        - None. Populates the global list `industry_names` with extracted industry names.
-    '''
-    global industry_names
-    # Reload sectors page if not on it
-    if driver.current_url != sectors_url:
-        print("Returning to sectors page...")
-        driver.get(sectors_url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "tr.yf-k3njn8"))
-        )
-        time.sleep(1)  # Short delay for additional page loading
+    def get(self, url, **kwargs):
+        '''
+        Sends a GET request once the controller admits it, retrying throttled responses.
+        input:
+            - url, **kwargs: As for `requests.Session.get`.
+        output:
+            - requests.Response of the last attempt.
+        '''
+        for attempt in range(self.max_retries + 1):
+            started_round = self._acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                # A timeout or reset under load counts as congestion, without a pause
+                self._release(started_round, throttled=True)
+                raise
+            except Exception:
+                self._release(started_round, throttled=False)
+                raise
 
-    # Select industry rows after page load
-    industry_rows = driver.find_elements(By.CSS_SELECTOR, "tr.yf-k3njn8")
-    print(f"Found {len(industry_rows)} industries.")
+            if response.status_code not in throttle_status_codes:
+                self._release(started_round, throttled=False)
+                return response
 
-    # Extract and clean names of the first 10 industries
-    industry_names = [
-        row.find_element(By.CSS_SELECTOR, "td.name").text for row in industry_rows[2:len(industry_rows)]#2:
-    ]
-    print("Collected industry names:", industry_names)
+            backoff = parse_retry_after(response.headers.get("Retry-After"))
+            if backoff is None:
+                backoff = min(self.max_backoff, self.default_backoff * 2 ** attempt)
+            self._release(started_round, throttled=True, backoff=backoff)
+            metrics.inc("throttled_responses", status=response.status_code)
+            if attempt < self.max_retries:
+                log_event("throttled", f"Throttled with {response.status_code}, retrying in {backoff:.1f}s "
+                          f"at a limit of {int(self.limit)} requests.", logging.WARNING,
+                          url=url, status=response.status_code, backoff=backoff, limit=int(self.limit))
+        return response
 
+    def rate(self):
+        '''
+        Returns the effective request rate: successful responses per second over the last `rate_window` seconds.
+        '''
+        with self._condition:
+            now = time.monotonic()
+            while self._completions and self._completions[0] < now - self.rate_window:
+                self._completions.popleft()
+            return len(self._completions) / self.rate_window
 
-# In[10]:
+    def metrics(self):
+        '''
+        Returns the current limit, requests in flight, effective rate and response counts (dictionary).
+        '''
+        rate = self.rate()
+        with self._condition:
+            snapshot = {
+                "limit": int(self.limit),
+                "in_flight": self._in_flight,
+                "rate": round(rate, 3),
+                "succeeded": self.succeeded,
+                "throttled": self.throttled,
+            }
+        metrics.set_gauge("concurrency_limit", snapshot["limit"])
+        metrics.set_gauge("request_rate", snapshot["rate"])
+        return snapshot
 
+    def close(self):
+        '''
+        Closes the wrapped session.
+        '''
+        if self.session is not requests:
+            self.session.close()
 
-def generate_urls():
+
+# ## 1.1 Metrics and Structured Logging
+
+# In[ ]:
+
+
+# Progress and errors go through this logger; `configure_logging` attaches a handler
+logger = logging.getLogger("mc1_scraper")
+logger.addHandler(logging.NullHandler())
+
+metrics_prefix = "mc1"  # Prefix of exported metric names
+
+
+def log_event(event, message=None, level=logging.INFO, **fields):
     '''
-    Generates URLs for industries based on their names.
+    Emits a structured log event.
     input:
-        - None. Uses the global list `industry_names` (populated by `gather_industry_names`).
-    output:
-        - List of URLs (strings) pointing to individual industry pages.
+        - event: Short event name (string, e.g. "chart_fetched").
+        - message: Human-readable message (string) (default: None, the event name).
+        - level: logging level (default: logging.INFO).
+        - **fields: Event fields, e.g. ticker=..., url=..., kept on the record for `JsonLogFormatter`.
     '''
-    # Generate URLs using industry names, replacing spaces with dashes and removing '&'
-    updated_urls = [
-        sectors_url + name.lower().replace('&', '').replace(' ', '-').replace('--', '-') + '/' 
-        for name in industry_names
-    ]
-    return updated_urls
+    if logger.isEnabledFor(level):
+        logger.log(level, message or event, extra={"event": event, "fields": fields})
 
 
-# In[11]:
+class JsonLogFormatter(logging.Formatter):
+    '''
+    Formats log records as one JSON object per line with the event name and fields.
+    '''
 
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname.lower(),
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+            "thread": record.threadName,
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
 
-# Function to extract "/quote/.../" hrefs from each URL in the list
-def extract_quote_links(driver, urls):
+
+def configure_logging(level=logging.INFO, json_logs=False, stream=None):
     '''
-    Extracts valid stock quote links from Yahoo Finance industry pages.
+    Sends the scraper's log events to a stream.
     input:
-        - driver: Selenium WebDriver instance.
-        - urls: List of industry page URLs (strings).
+        - level: Minimum level (default: logging.INFO; logging.DEBUG adds per-URL/ticker spans).
+        - json_logs: Write JSON lines instead of plain messages (default: False).
+        - stream: Output stream (default: None, stderr).
     output:
-        - List of valid stock quote links (strings) filtered for uppercase tickers only.
+        - The configured logging.Handler.
     '''
-    quote_links = []  # List to hold fully qualified extracted links
+    for handler in list(logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JsonLogFormatter() if json_logs else logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return handler
 
-    # Regular expression to validate tickers (uppercase letters only)
-    valid_ticker_pattern = re.compile(r"/quote/([A-Z]+)(/|$)")
-    
-    for index, url in enumerate(urls):
-        print(f"Accessing URL {index + 1}/{len(urls)}: {url}")
-        driver.get(url)
-        time.sleep(5)  # Delay to allow page load; adjust as needed for speed optimization
-
-        # Parse the page source with BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
-
-        # Find all hrefs that match "/quote/.../"
-        matched_links = []
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            if re.match(r"^/quote/.+/$", href):
-                full_url = urljoin(base_url, href)  # Prepend base URL
-
-                # Check if the link contains a valid ticker
-                if valid_ticker_pattern.search(full_url):
-                    matched_links.append(full_url)
-                    
-            # Stop after collecting the first 10 unique links
-            if len(matched_links) >= 10:
-                break
 
-        quote_links.extend(matched_links)
+class MetricsRegistry:
+    '''
+    Thread-safe counters and stage timers with JSON and Prometheus text export.
+    Timers keep count, sum and max per label set, so recording costs a dictionary update;
+    per-URL/ticker timings are only emitted as DEBUG "span" log events.
+    '''
 
-        print(f"Extracted {len(matched_links)} links from {url}")
+    def __init__(self, enabled=True):
+        '''
+        input:
+            - enabled: Record metrics; when False, all recording calls return immediately (default: True).
+        '''
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
 
-    return quote_links
+    def reset(self):
+        '''
+        Clears all recorded values.
+        '''
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timers = {}
+            self.started = time.time()
 
+    def inc(self, name, value=1, **labels):
+        '''
+        Adds `value` to the counter `name` with the given labels.
+        '''
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
 
-# ## 4. Backend: Data Fetching and Storage
+    def set_gauge(self, name, value, **labels):
+        '''
+        Sets the gauge `name` with the given labels to `value`.
+        '''
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._gauges[key] = value
 
-# In[12]:
+    def observe(self, name, seconds, **labels):
+        '''
+        Records one duration (seconds) for the timer `name` with the given labels.
+        '''
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                self._timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
 
+    @contextmanager
+    def timer(self, stage, item=None, **labels):
+        '''
+        Times the enclosed block as `stage`.
+        input:
+            - stage: Stage name (string, e.g. "chart_fetch", "html_parse", "csv_write").
+            - item: URL or ticker the block works on (default: None); logged with the duration at DEBUG level.
+            - **labels: Extra labels of the timer.
+        '''
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("stage_seconds", elapsed, stage=stage, **labels)
+            if item is not None and logger.isEnabledFor(logging.DEBUG):
+                log_event("span", f"{stage} {item} {elapsed * 1000:.1f}ms", logging.DEBUG,
+                          stage=stage, item=item, duration_ms=round(elapsed * 1000, 3), **labels)
 
-def fetch_all_tickers_data(links, cookies=None, headers=None):
-    '''
-    Fetches stock price data for multiple tickers and aligns it by timestamps.
-    input:
-        - links: List of stock quote links (strings).
-        - cookies: Dictionary of cookies for HTTP requests (default: None).
-        - headers: Dictionary of headers for HTTP requests (default: None).
-    output:
-        - pandas DataFrame: Contains timestamps as rows and stock tickers as columns, with their respective close prices.
-    '''
-    from datetime import datetime, timedelta
+    def timed(self, stage):
+        '''
+        Decorator that times every call of a function as `stage`.
+        '''
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
 
-    # Calculate period1 (1 year ago) and period2 (current time)
-    period2 = int(datetime.now().timestamp())  # Current timestamp
-    period1 = int((datetime.now() - timedelta(days=365)).timestamp())  # 1 year ago
-    interval = "1d"  # Granularity: 1 day
+    def snapshot(self):
+        '''
+        Returns all counters, gauges and timers as a JSON-serialisable dictionary.
+        '''
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+            timers = [
+                {"name": name, "labels": dict(labels), "count": count,
+                 "sum_seconds": round(total, 6), "max_seconds": round(peak, 6)}
+                for (name, labels), (count, total, peak) in sorted(self._timers.items())
+            ]
+        return {"started": self.started, "exported": time.time(), "counters": counters, "gauges": gauges,
+                "timers": timers}
 
-    all_data = []
+    def to_prometheus(self):
+        '''
+        Returns the metrics in the Prometheus text exposition format (string).
+        '''
+        def label_text(labels):
+            if not labels:
+                return ""
+            escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                       for k, v in labels.items())
+            return "{" + ",".join(escaped) + "}"
 
-    for link in links:
-        try:
-            # Extract the ticker symbol
-            ticker = link.split('/')[-2]
-            print(f"Fetching data for {ticker}...")
+        snapshot = self.snapshot()
+        lines = []
+        for name in dict.fromkeys(c["name"] for c in snapshot["counters"]):
+            lines.append(f"# TYPE {metrics_prefix}_{name}_total counter")
+            for c in snapshot["counters"]:
+                if c["name"] == name:
+                    lines.append(f"{metrics_prefix}_{name}_total{label_text(c['labels'])} {c['value']}")
+        for name in dict.fromkeys(g["name"] for g in snapshot["gauges"]):
+            lines.append(f"# TYPE {metrics_prefix}_{name} gauge")
+            for g in snapshot["gauges"]:
+                if g["name"] == name:
+                    lines.append(f"{metrics_prefix}_{name}{label_text(g['labels'])} {g['value']}")
+        for name in dict.fromkeys(t["name"] for t in snapshot["timers"]):
+            lines.append(f"# TYPE {metrics_prefix}_{name} summary")
+            for t in snapshot["timers"]:
+                if t["name"] == name:
+                    labels = label_text(t["labels"])
+                    lines.append(f"{metrics_prefix}_{name}_count{labels} {t['count']}")
+                    lines.append(f"{metrics_prefix}_{name}_sum{labels} {t['sum_seconds']}")
+            lines.append(f"# TYPE {metrics_prefix}_{name}_max gauge")
+            for t in snapshot["timers"]:
+                if t["name"] == name:
+                    lines.append(f"{metrics_prefix}_{name}_max{label_text(t['labels'])} {t['max_seconds']}")
+        return "\n".join(lines) + "\n"
 
-            # Fetch data for the ticker
-            timestamps, close_prices = fetch_stock_data(
-                ticker, period1, period2, interval, cookies, headers
-            )
-            
-            if timestamps is not None and close_prices is not None:
-                print(f"Fetched {len(close_prices)} daily close prices for {ticker}.")
-                
-                # Create a DataFrame for this ticker
-                symbol_df = pd.DataFrame({"timestamp": timestamps[-100:], ticker: close_prices[-100:]})
-                all_data.append(symbol_df)
-            else:
-                print(f"Warning: No data available for {ticker}.")
-        except Exception as e:
-            print(f"Error processing {link}: {e}")
+    def export(self, path, file_format=None):
+        '''
+        Writes the metrics to a file, replacing it atomically so live readers never see partial output.
+        input:
+            - path: Output file path (string).
+            - file_format: "json" or "prometheus" (default: None, "prometheus" for .prom/.txt paths, else "json").
+        '''
+        if file_format is None:
+            file_format = "prometheus" if path.endswith((".prom", ".txt")) else "json"
+        text = self.to_prometheus() if file_format == "prometheus" else json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
 
-    # Deduplicate tickers
-    unique_tickers = {df.columns[1]: df for df in all_data}
-    all_data = list(unique_tickers.values())
 
-    # Merge all data on "timestamp" using a full outer join
-    merged_data = pd.DataFrame()
-    for df in all_data:
-        if merged_data.empty:
-            merged_data = df
-        else:
-            merged_data = pd.merge(merged_data, df, on="timestamp", how="outer")
+# Registry used by all instrumented functions
+metrics = MetricsRegistry()
 
-    # Sort by timestamp
-    merged_data = merged_data.sort_values(by="timestamp").reset_index(drop=True)
 
-    return merged_data
+class MetricsExporter:
+    '''
+    Rewrites a metrics file every `interval` seconds while a run is in progress,
+    and once more when stopped.
+    input:
+        - path: Output file path (string), see `MetricsRegistry.export`.
+        - interval: Seconds between exports (default: 10).
+        - registry: `MetricsRegistry` to export (default: None, the module-level `metrics`).
+    '''
 
+    def __init__(self, path, interval=10.0, registry=None):
+        self.path = path
+        self.interval = interval
+        self.registry = registry if registry is not None else metrics
+        self._stop = threading.Event()
+        self._thread = None
 
-# In[13]:
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.registry.export(self.path)
 
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
 
-# Fetch stock data for a single ticker
-def fetch_stock_data(ticker, period1, period2, interval="1d", cookies=None, headers=None):
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.registry.export(self.path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+@contextmanager
+def observed_run(metrics_file=None, metrics_interval=None, json_logs=False):
     '''
-    Fetches stock price data (timestamps and close prices) for a single ticker from Yahoo Finance.
+    Sets up logging for a run and exports the metrics when it ends.
     input:
-        - ticker: Stock ticker symbol (string).
-        - period1: Start timestamp (int, in seconds since epoch).
-        - period2: End timestamp (int, in seconds since epoch).
-        - interval: Data granularity (string, e.g., "1d", "1h").
-        - cookies: Dictionary of cookies for the HTTP request (default: None).
-        - headers: Dictionary of headers for the HTTP request (default: None).
+        - metrics_file: Metrics output path, JSON or Prometheus text by extension (default: None, no export).
+        - metrics_interval: Also export every this many seconds during the run (default: None, only at the end).
+        - json_logs: Log JSON lines when no handler is configured yet (default: False).
     output:
-        - Tuple of two lists:
-            1. timestamps: List of datetime objects.
-            2. close_prices: List of float values representing close prices.
-        - Returns (None, None) if an error occurs.
+        - Yields the module-level `metrics` registry, reset for this run.
     '''
-    base_url = "https://query1.finance.yahoo.com/v8/finance/chart/"
-    query_url = (
-        f"{base_url}{ticker}?period1={period1}&period2={period2}"
-        f"&interval={interval}&includePrePost=true&events=div%7Csplit%7Cearn&lang=en-US&region=US"
-    )
-    
+    if all(isinstance(handler, logging.NullHandler) for handler in logger.handlers):
+        configure_logging(json_logs=json_logs)
+    metrics.reset()
+    exporter = MetricsExporter(metrics_file, metrics_interval).start() if metrics_file and metrics_interval else None
+    start = time.perf_counter()
     try:
-        response = requests.get(query_url, cookies=cookies, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Extract timestamps and close prices
-        timestamps = data['chart']['result'][0]['timestamp']
-        close_prices = data['chart']['result'][0]['indicators']['quote'][0]['close']
-        
-        # Convert timestamps to datetime
-        timestamps = pd.to_datetime(timestamps, unit='s')
+        yield metrics
+    finally:
+        metrics.observe("run_seconds", time.perf_counter() - start)
+        if exporter is not None:
+            exporter.stop()
+        elif metrics_file:
+            metrics.export(metrics_file)
+        if metrics_file:
+            log_event("metrics_exported", f"Metrics written to {metrics_file}", path=metrics_file)
 
-        return timestamps, close_prices
-    except Exception as e:
-        print(f"Error fetching data for {ticker}: {e}")
-        return None, None
 
+# ## 1.2 Retry Scheduling
 
-# In[14]:
+# In[ ]:
 
 
-# Save extracted links to CSV, excluding links with invalid tickers
-def save_links_to_csv(links, filename="extracted_links.csv"):
+def backoff_delay(attempt, base=retry_base_delay, cap=retry_max_delay, rng=random):
     '''
-    Saves extracted stock quote links to a CSV file.
+    Returns the delay before a retry: exponential backoff with full jitter.
     input:
-        - links: List of valid stock quote links (strings).
-        - filename: Output file path (string) for the CSV file (default: "extracted_links.csv").
+        - attempt: Number of the failed attempt, starting at 0 (int).
+        - base: Delay in seconds after the first failure, before jitter (default: 0.5).
+        - cap: Upper bound in seconds (default: 30.0).
+        - rng: Source of the jitter with a `uniform` method (default: the random module).
     output:
-        - None. Saves the links to the specified CSV file.
+        - Delay in seconds (float), uniform between 0 and min(cap, base * 2 ** attempt).
     '''
-    with open(filename, mode="w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(["Link"])  # Write header
-        for link in links:
-            writer.writerow([link])
-    
-    print(f"Filtered links saved to {filename}")
-
-
-# In[15]:
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
 
 
-# Save the aggregated data to CSV
-def save_data_to_csv(data, filename="stock_data.csv"):
+def is_retryable_error(error):
     '''
-    Saves a pandas DataFrame containing stock data to a CSV file.
+    Classifies an exception from a page or chart request.
     input:
-        - data: pandas DataFrame with stock data.
-        - filename: Output file path (string) for the CSV file (default: "stock_data.csv").
+        - error: Exception raised by the request.
     output:
-        - None. Saves the DataFrame to the specified file.
+        - True for transient failures (connection errors, timeouts, 408, 429 and 5xx responses),
+          False for errors a retry cannot fix (other 4xx responses, unexpected payloads).
     '''
-    data.to_csv(filename, index=False)
-    print(f"Stock data saved to {filename}")
+    if isinstance(error, requests.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status in (408, 429) or status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError))
 
 
-# ## 5. Main Workflow
+class CircuitBreaker:
+    '''
+    Failure-rate circuit breaker for one host. It opens when at least `failure_rate` of the last
+    `window` calls failed, holds back calls for `cooldown` seconds, then lets a single probe
+    through: a successful probe closes it again, a failed probe reopens it.
+    '''
+    probe_wait = 1.0  # Seconds other calls wait while the probe is in flight
 
-# In[16]:
+    def __init__(self, host=None, window=20, min_calls=10, failure_rate=0.5, cooldown=30.0, clock=time.monotonic):
+        '''
+        input:
+            - host: Host name, used in logs and metrics (default: None).
+            - window: Number of most recent calls the failure rate is taken over (default: 20).
+            - min_calls: Calls needed in the window before the breaker can open (default: 10).
+            - failure_rate: Fraction of failed calls that opens the breaker (default: 0.5).
+            - cooldown: Seconds the breaker stays open before a probe (default: 30.0).
+            - clock: Function returning the current time in seconds (default: time.monotonic).
+        '''
+        self.host = host
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = "closed"
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
 
+    def allow(self):
+        '''
+        Asks whether a call may go ahead.
+        output:
+            - 0.0 if it may, otherwise the seconds to wait before asking again (float).
+        '''
+        with self._lock:
+            if self.state == "closed":
+                return 0.0
+            if self.state == "open":
+                remaining = self._opened_at + self.cooldown - self.clock()
+                if remaining > 0:
+                    return remaining
+                self.state = "half_open"
+            if self._probing:
+                return self.probe_wait
+            self._probing = True
+            return 0.0
 
-# Main function to handle navigation
-def main():
+    def record(self, success):
+        '''
+        Records the outcome of an allowed call (True for success).
+        '''
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+                if success:
+                    self.state = "closed"
+                    self._outcomes.clear()
+                    log_event("circuit_closed", f"Circuit for {self.host} closed", host=self.host)
+                else:
+                    self._open()
+                return
+            if self.state == "open":
+                return  # A call admitted before the breaker opened
+
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open()
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = self.clock()
+        metrics.inc("circuit_opened", host=self.host)
+        log_event("circuit_open", f"Too many failures for {self.host}, pausing requests for {self.cooldown:.0f}s",
+                  logging.WARNING, host=self.host, cooldown=self.cooldown)
+
+
+class RetryScheduler:
     '''
-    Main workflow that orchestrates web scraping, data extraction, and saving.
+    Retries the failed items of a run (pages or tickers) instead of the whole run. An item that
+    fails with a retryable error goes back on the queue after `backoff_delay`, and the worker
+    takes the next item meanwhile; other errors and exhausted retries only fail that item.
+    Items of a host whose `CircuitBreaker` is open are re-queued until it lets calls through.
     input:
-        - None.
-    output:
-        - None. Executes the end-to-end process of scraping, extracting, and saving stock data.
+        - max_attempts: Attempts per item (default: 4).
+        - base_delay, max_delay: Backoff parameters, see `backoff_delay` (default: 0.5 and 30.0).
+        - breaker_options: Keyword arguments for every host's `CircuitBreaker` (default: None).
+        - seed: Seed of the jitter (default: None).
     '''
-    print("Navigating to Yahoo Finance homepage...")
-    driver.get(base_url)
-    time.sleep(2)
-    
-    # Handle cookies if they exist
-    if load_cookies(driver, cookie_file_path):
-        print("Cookies loaded successfully.")
-        driver.refresh()
-    else:
-        print("No cookies found. Accepting cookies manually.")
-        try:
-            accept_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accept all')]"))
-            )
-            accept_button.click()
-            time.sleep(2)
-            save_cookies(driver, cookie_file_path)
-            print("Cookies accepted and saved.")
-        except Exception as e:
-            print("Error handling cookies:", e)
-    
-    # Navigate to Basic Materials sector
-    print("Navigating to Basic Materials sector...")
-    driver.get(sectors_url)
-    time.sleep(2)
-    
-    # Navigate to each industry and collect company links
-    #navigate_to_industry()
-    gather_industry_names(driver)
-    updated_urls = generate_urls()
 
-    print("List of updated URLs for the first 10 industries:")
-    for url in updated_urls:
-        print(url)
+    def __init__(self, max_attempts=retry_attempts, base_delay=retry_base_delay, max_delay=retry_max_delay,
+                 breaker_options=None, seed=None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_options = breaker_options or {}
+        self.breakers = {}
+        self.retried = 0
+        self.failed = {}  # item -> last exception, for items that were given up
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
 
-    # Extract quote links from each updated URL
-    print("Extracting /quote/.../ links from each industry page...")
-    extracted_links = retry_operation(extract_quote_links, retries=3, driver=driver, urls=updated_urls)
-    if not extracted_links:
-        print("Failed to extract links. Exiting.")
-        return
-        
-    print("Collected full quote links:") if extracted_links else print("Links could not be collected")
+    def breaker(self, host):
+        '''
+        Returns the circuit breaker of a host, creating it on first use.
+        '''
+        with self._lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(host, **self.breaker_options)
+            return self.breakers[host]
 
-    # Save the extracted links
-    save_links_to_csv(extracted_links)
-    print("Extraction and saving complete.")
-    
-    for link in extracted_links:
-        print(link)
+    def _failed(self, item, attempt, error, breaker, stage):
+        # Returns the delay before the next attempt, or None if the item is given up
+        retryable = is_retryable_error(error)
+        breaker.record(not retryable)  # a 404 or a bad payload says nothing about the host's health
+        if retryable and attempt + 1 < self.max_attempts:
+            with self._lock:
+                self.retried += 1
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay, self._random)
+            metrics.inc("retries", operation=stage)
+            log_event("retry_scheduled", f"Attempt {attempt + 1} for {item} failed: {error}; "
+                      f"retrying in {delay:.2f}s", logging.WARNING, item=str(item), stage=stage,
+                      attempt=attempt + 1, delay=round(delay, 3), error=str(error))
+            return delay
 
-    # Fetch stock data using Yahoo AJAX endpoint
-    print("Fetching stock data for all links...")
-    
-    # Define a fixed timestamp range
-    # Define the time range (6th November 2024 to 15th November 2024)
-    period1 = int(datetime(2024, 11, 6).timestamp())  # Start timestamp
-    period2 = int(datetime(2024, 11, 15).timestamp())  # End timestamp
-
-    # Define headers and cookies
-    cookies = {
-        "GUC": "AQABCAFnJy1nV0IgvASK&s=AQAAAJB-qKHi&g=ZyXotw",
-        "A1": "d=AQABBK3oJWcCEL768yJfkpdKJoPN52K9l3QFEgABCAEtJ2dXZ7u9b2UBAiAAAAcIpuglZ8iQvhs&S=AQAAAq11kqwbV-Cl4YdEYNtEpg8",
-        "A3": "d=AQABBK3oJWcCEL768yJfkpdKJoPN52K9l3QFEgABCAEtJ2dXZ7u9b2UBAiAAAAcIpuglZ8iQvhs&S=AQAAAq11kqwbV-Cl4YdEYNtEpg8",
-        "A1S": "d=AQABBK3oJWcCEL768yJfkpdKJoPN52K9l3QFEgABCAEtJ2dXZ7u9b2UBAiAAAAcIpuglZ8iQvhs&S=AQAAAq11kqwbV-Cl4YdEYNtEpg8",
-        "cmp": "t=1733097066&j=1&u=1---&v=54",
-        "EuConsent": "CQHdjMAQHdjMAAOACKENBRFgAAAAAAAAACiQAAAAAAAA",
-        "PRF": "t=LIN%252BGC%253DF",
-    }
-    
-    headers = {
-        "accept": "*/*",
-        "accept-encoding": "gzip, deflate, br, zstd",
-        "accept-language": "de-DE,de;q=0.9,en-US;q=0.8,en;q=0.7",
-        "user-agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/130.0.0.0 Safari/537.36",
-    }
-
-    # Fetch and save stock data
-    stock_data = fetch_all_tickers_data(extracted_links, cookies=cookies, headers=headers)
-    save_data_to_csv(stock_data)
-    print("Data fetching and saving complete.")
+        with self._lock:
+            self.failed[item] = error
+        metrics.inc("errors", stage=stage)
+        log_event("retry_failed", f"Giving up on {item} after {attempt + 1} attempts: {error}", logging.ERROR,
+                  item=str(item), stage=stage, attempts=attempt + 1, retryable=retryable, error=str(error))
+        return None
+
+    async def run(self, items, call, workers=max_concurrent_requests, host=None, stage="item", on_failure=None):
+        '''
+        Processes items with `workers` concurrent coroutines.
+        input:
+            - items: List of items (hashable, e.g. links).
+            - call: Coroutine function called with one item; returns its result or raises.
+            - workers: Number of items in progress at once (default: 8).
+            - host: Function returning the host of an item, for the circuit breakers (default: None, one breaker).
+            - stage: Label of the work in logs and metrics, e.g. "fetch" (default: "item").
+            - on_failure: Function called with an item and its last exception when the item is
+              given up; its return value is used as the result (default: None, the result is None).
+        output:
+            - List of results in the order of `items`.
+        '''
+        results = [None] * len(items)
+        if not items:
+            return results
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Queue()
+        for index in range(len(items)):
+            ready.put_nowait((index, 0))
+        timers = []
+        remaining = len(items)
+        done = asyncio.Event()
+
+        def finish(index, value):
+            nonlocal remaining
+            results[index] = value
+            remaining -= 1
+            if remaining == 0:
+                done.set()
+
+        async def worker():
+            while True:
+                index, attempt = await ready.get()
+                item = items[index]
+                breaker = self.breaker(host(item) if host is not None else None)
+                wait_for = breaker.allow()
+                if wait_for > 0:
+                    # Not an attempt: the item waits for the breaker on the queue
+                    timers.append(loop.call_later(wait_for, ready.put_nowait, (index, attempt)))
+                    continue
+                try:
+                    value = await call(item)
+                except Exception as e:
+                    delay = self._failed(item, attempt, e, breaker, stage)
+                    if delay is not None:
+                        timers.append(loop.call_later(delay, ready.put_nowait, (index, attempt + 1)))
+                    else:
+                        finish(index, on_failure(item, e) if on_failure is not None else None)
+                else:
+                    breaker.record(True)
+                    finish(index, value)
+
+        tasks = [loop.create_task(worker()) for _ in range(max(1, min(workers, len(items))))]
+        try:
+            await done.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for timer in timers:
+                timer.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    def iterate(self, items, call, host=None, stage="item"):
+        '''
+        Synchronous, one-at-a-time version of `run` that yields results as they complete.
+        It only sleeps when every remaining item is waiting for its retry.
+        input:
+            - items, call, host, stage: As for `run`, with `call` a plain function.
+        output:
+            - Yields (item, result) pairs; the result is None for items that were given up.
+        '''
+        ready = deque((index, 0) for index in range(len(items)))
+        delayed = []  # heap of (ready_at, sequence, index, attempt)
+        sequence = itertools.count()
+        while ready or delayed:
+            now = time.monotonic()
+            while delayed and delayed[0][0] <= now:
+                _, _, index, attempt = heapq.heappop(delayed)
+                ready.append((index, attempt))
+            if not ready:
+                time.sleep(delayed[0][0] - now)
+                continue
+
+            index, attempt = ready.popleft()
+            item = items[index]
+            breaker = self.breaker(host(item) if host is not None else None)
+            wait_for = breaker.allow()
+            if wait_for > 0:
+                heapq.heappush(delayed, (now + wait_for, next(sequence), index, attempt))
+                continue
+            try:
+                value = call(item)
+            except Exception as e:
+                delay = self._failed(item, attempt, e, breaker, stage)
+                if delay is not None:
+                    heapq.heappush(delayed, (time.monotonic() + delay, next(sequence), index, attempt + 1))
+                else:
+                    yield item, None
+            else:
+                breaker.record(True)
+                yield item, value
+
+
+# ## 2. Cookie Management
+
+# In[7]:
+
+
+# Save cookies function
+def save_cookies(driver, path):
+    '''
+    Save browser cookies to a file for session reuse.
+    input:
+        - driver: Selenium WebDriver instance.
+        - path: File path (string) to save the cookies (e.g., "cookies.pkl").
+    output:
+        - None. Saves cookies to the specified file.
+    '''
+    with open(path, "wb") as file:
+        pickle.dump(driver.get_cookies(), file)
+
+
+# In[8]:
+
+
+# Load cookies function with domain check
+def load_cookies(driver, path):
+    '''
+    Load browser cookies from a file to restore a session.
+    input:
+        - driver: Selenium WebDriver instance.
+        - path: File path (string) from which cookies are loaded (e.g., "cookies.pkl").
+    output:
+        - Boolean: True if cookies are loaded successfully, False otherwise.
+    '''
+    try:
+        with open(path, "rb") as file:
+            cookies = pickle.load(file)
+            for cookie in cookies:
+                if "domain" in cookie and cookie["domain"] in driver.current_url:
+                    driver.add_cookie(cookie)
+            return True
+    except FileNotFoundError:
+        return False
+
+
+# In[ ]:
+
+
+# Open the homepage and restore or accept the consent cookies
+def open_browser_session(driver):
+    '''
+    Prepares the browser session by loading saved cookies or accepting the consent dialog.
+    input:
+        - driver: Selenium WebDriver instance.
+    output:
+        - None. Leaves the driver on the Yahoo Finance homepage with consent cookies set.
+    '''
+    log_event("browser_session", "Navigating to Yahoo Finance homepage...", url=base_url)
+    with metrics.timer("browser_navigation", item=base_url):
+        driver.get(base_url)
+        wait_for_document_ready(driver)
+
+    # Handle cookies if they exist
+    if load_cookies(driver, cookie_file_path):
+        log_event("cookies_loaded", "Cookies loaded successfully.", path=cookie_file_path)
+        driver.refresh()
+    else:
+        log_event("cookies_missing", "No cookies found. Accepting cookies manually.", path=cookie_file_path)
+        try:
+            accept_button = WebDriverWait(driver, 5).until(
+                EC.element_to_be_clickable((By.XPATH, "//button[contains(text(), 'Accept all')]"))
+            )
+            accept_button.click()
+            # The consent dialog is replaced by the homepage once the choice is stored
+            WebDriverWait(driver, page_ready_timeout).until(EC.staleness_of(accept_button))
+            save_cookies(driver, cookie_file_path)
+            log_event("cookies_saved", "Cookies accepted and saved.", path=cookie_file_path)
+        except Exception as e:
+            log_event("cookies_error", f"Error handling cookies: {e}", logging.ERROR, error=str(e))
+
+
+# ## 2.1 Session Bootstrap
+
+# In[ ]:
+
+
+# Responses of the query endpoints when the cookies or the crumb are missing or expired
+invalid_session_markers = ("Invalid Crumb", "Invalid Cookie", "Unauthorized")
+
+
+def is_invalid_session(response):
+    '''
+    Checks whether a response rejects the request for lack of a valid session.
+    input:
+        - response: requests.Response.
+    output:
+        - True for 401 responses and 400/403 responses naming an invalid crumb or cookie.
+    '''
+    if response.status_code == 401:
+        return True
+    if response.status_code in (400, 403):
+        text = response.text[:500]
+        return any(marker in text for marker in invalid_session_markers)
+    return False
+
+
+class SessionManager:
+    '''
+    Provides the consent cookies and crumb for the HTTP requests, used in place of a requests.Session.
+    A saved session is reused until it expires. Otherwise the cookies are bootstrapped over plain
+    HTTP, and the browser from `driver_factory` is only started when that yields none, e.g. behind
+    the EU consent page. Responses that reject the session trigger one refresh and a retry.
+    input:
+        - session: requests.Session that performs the requests.
+        - path: JSON file the cookies, crumb and expiry are kept in (default: "yahoo_session.json").
+        - ttl: Longest time a bootstrapped session is reused (default: 12 hours).
+        - driver_factory: Function returning a WebDriver for the consent dialog, e.g. `get_driver`
+          (default: None, never start a browser).
+    '''
+
+    def __init__(self, session, path=session_file, ttl=session_ttl, driver_factory=None):
+        self.session = session
+        self.path = path
+        self.ttl = ttl
+        self.driver_factory = driver_factory
+        self.crumb = None
+        self.expires = None
+        self.source = None  # "file", "http" or "browser"
+        self._generation = 0  # bumped on every bootstrap, so concurrent refreshes only run once
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        '''
+        Makes sure the wrapped session carries cookies, loading or bootstrapping them once.
+        '''
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                if not self._load():
+                    self._bootstrap()
+                self._ready = True
+
+    def refresh(self, generation=None):
+        '''
+        Bootstraps a new session, unless another thread already did since `generation`.
+        '''
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self.session.cookies.clear()
+            self.crumb = None
+            self._bootstrap()
+            self._ready = True
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if state.get("expires", 0) <= time.time():
+            log_event("session_expired", f"Saved session in {self.path} has expired", path=self.path)
+            return False
+
+        for cookie in state["cookies"]:
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""),
+                                     path=cookie.get("path", "/"))
+        self.crumb = state.get("crumb")
+        self.expires = state["expires"]
+        self.source = "file"
+        metrics.inc("session_bootstraps", source="file")
+        log_event("session_loaded", f"Reusing the session saved in {self.path}", path=self.path,
+                  cookies=len(state["cookies"]), crumb=bool(self.crumb))
+        return True
+
+    def _bootstrap(self):
+        self._generation += 1
+        source = "http" if self._bootstrap_http() else None
+        if source is None and self.driver_factory is not None:
+            source = "browser" if self._bootstrap_browser() else None
+        if source is None:
+            metrics.inc("errors", stage="session_bootstrap")
+            log_event("session_unavailable", "No session cookies could be obtained, continuing without.",
+                      logging.WARNING)
+            return
+
+        self.crumb = self._request_crumb()
+        self.source = source
+        metrics.inc("session_bootstraps", source=source)
+        self._save()
+        log_event("session_bootstrapped", f"Bootstrapped a session over {source}", source=source,
+                  cookies=len(self.session.cookies), crumb=bool(self.crumb))
+
+    def _bootstrap_http(self):
+        try:
+            response = self.session.get(session_bootstrap_url, timeout=request_timeout)
+        except requests.RequestException as e:
+            log_event("session_http_error", f"HTTP session bootstrap failed: {e}", logging.WARNING, error=str(e))
+            return False
+        # The bootstrap page answers 404 but sets the cookie; a consent redirect sets none
+        return len(self.session.cookies) > 0 and "consent." not in response.url
+
+    def _bootstrap_browser(self):
+        driver = self.driver_factory()
+        open_browser_session(driver)
+        for cookie in driver.get_cookies():
+            self.session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""),
+                                     path=cookie.get("path", "/"))
+        return len(self.session.cookies) > 0
+
+    def _request_crumb(self):
+        try:
+            response = self.session.get(crumb_url, timeout=request_timeout)
+        except requests.RequestException:
+            return None
+        crumb = response.text.strip()
+        # Anything else than a short token is an error page
+        if response.status_code != 200 or not re.fullmatch(r"[^\s<>{}]{1,64}", crumb):
+            return None
+        return crumb
+
+    def _save(self):
+        expires = time.time() + self.ttl.total_seconds()
+        cookies = []
+        for cookie in self.session.cookies:
+            if cookie.expires:
+                expires = min(expires, cookie.expires)
+            cookies.append({"name": cookie.name, "value": cookie.value, "domain": cookie.domain,
+                            "path": cookie.path})
+        self.expires = expires
+
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"cookies": cookies, "crumb": self.crumb, "expires": expires, "source": self.source}, file)
+        os.replace(temp_path, self.path)
+
+    def _with_crumb(self, url, params):
+        # The crumb is only sent to the query endpoints
+        if not self.crumb or urlparse(url).netloc not in (urlparse(chart_base_url).netloc,
+                                                           urlparse(spark_base_url).netloc):
+            return params
+        return dict(params or {}, crumb=self.crumb)
+
+    def get(self, url, params=None, **kwargs):
+        '''
+        Sends a GET request with the managed session, refreshing it once if the response rejects it.
+        input:
+            - url, params, **kwargs: As for `requests.Session.get`.
+        output:
+            - requests.Response.
+        '''
+        self.ensure()
+        generation = self._generation
+        response = self.session.get(url, params=self._with_crumb(url, params), **kwargs)
+        if not is_invalid_session(response):
+            return response
+
+        metrics.inc("session_refreshes")
+        log_event("session_invalid", f"Session rejected with {response.status_code}, refreshing it.",
+                  logging.WARNING, url=url, status=response.status_code)
+        self.refresh(generation)
+        return self.session.get(url, params=self._with_crumb(url, params), **kwargs)
+
+    def close(self):
+        '''
+        Closes the wrapped session.
+        '''
+        self.session.close()
+
+
+# ## 3. Frontend: Industry and Quote Link Extraction
+
+# In[9]:
+
+
+# Initialize an empty list to hold industry names
+industry_names = []
+
+def gather_industry_names(driver, cache=None):
+    '''
+    Collects the names of industries listed on the Yahoo Finance sector page.
+    input:
+        - driver: Selenium WebDriver instance, already on the sector page.
+        - cache: Optional `DiscoveryCache`; fresh cached names are used without loading the page,
+          newly collected names are cached (default: None).
+    output:
+        - None. Populates the global list `industry_names` with extracted industry names.
+    '''
+    global industry_names
+    cached = cache.fresh(sectors_url, "names") if cache is not None else None
+    if cached:
+        industry_names = cached
+        log_event("industry_names", f"Collected industry names: {industry_names}", names=industry_names)
+        return
+
+    # Reload sectors page if not on it
+    if driver.current_url != sectors_url:
+        log_event("browser_navigation", "Returning to sectors page...", url=sectors_url)
+        with metrics.timer("browser_navigation", item=sectors_url):
+            driver.get(sectors_url)
+            wait_for_industry_table(driver)
+
+    # Select industry rows after page load
+    industry_rows = driver.find_elements(By.CSS_SELECTOR, "tr.yf-k3njn8")
+    log_event("industries_found", f"Found {len(industry_rows)} industries.", count=len(industry_rows))
+
+    # Extract and clean names of the first 10 industries
+    industry_names = [
+        row.find_element(By.CSS_SELECTOR, "td.name").text for row in industry_rows[2:len(industry_rows)]#2:
+    ]
+    log_event("industry_names", f"Collected industry names: {industry_names}", names=industry_names)
+    if cache is not None and industry_names:
+        cache.store(sectors_url, industry_names, "names")
+
+
+# In[10]:
+
+
+def generate_urls():
+    '''
+    Generates URLs for industries based on their names.
+    input:
+        - None. Uses the global list `industry_names` (populated by `gather_industry_names`).
+    output:
+        - List of URLs (strings) pointing to individual industry pages.
+    '''
+    # Generate URLs using industry names, replacing spaces with dashes and removing '&'
+    updated_urls = [industry_url(sectors_url, name) for name in industry_names]
+    return updated_urls
+
+
+def industry_url(sector_url, name):
+    '''
+    Builds the URL of an industry page from its sector URL and industry name.
+    input:
+        - sector_url: URL of the sector page (string), ending with a slash.
+        - name: Industry name as shown on the sector page (string).
+    output:
+        - URL (string) of the industry page.
+    '''
+    return sector_url + name.lower().replace('&', '').replace(' ', '-').replace('--', '-') + '/'
+
+
+# In[11]:
+
+
+# Function to extract "/quote/.../" hrefs from each URL in the list
+def extract_quote_links(driver, urls, in_browser=False, journal=None, cache=None):
+    '''
+    Extracts valid stock quote links from Yahoo Finance industry pages.
+    input:
+        - driver: Selenium WebDriver instance.
+        - urls: List of industry page URLs (strings).
+        - in_browser: Collect the hrefs with one script call instead of parsing
+          `driver.page_source` with BeautifulSoup (default: False).
+        - journal: Optional `CheckpointJournal`; pages it lists as completed are not opened again,
+          newly completed pages are recorded (default: None).
+        - cache: Optional `DiscoveryCache`; pages with fresh cached links are not opened, the links
+          of newly opened pages are cached (default: None).
+    output:
+        - List of valid stock quote links (strings) filtered for uppercase tickers only.
+    '''
+    quote_links = []  # List to hold fully qualified extracted links
+
+    for index, url in enumerate(urls):
+        resumed = journal.page_links(url) if journal is not None else None
+        if resumed is None and cache is not None:
+            resumed = cache.fresh(url)
+        if resumed is not None:
+            quote_links.extend(resumed)
+            continue
+
+        log_event("page_open", f"Accessing URL {index + 1}/{len(urls)}: {url}", url=url)
+        with metrics.timer("browser_navigation", item=url):
+            driver.get(url)
+            wait_for_industry_page(driver)
+
+        with metrics.timer("link_extract", item=url):
+            if in_browser:
+                matched_links = collect_quote_links_in_browser(driver)
+            else:
+                matched_links = parse_quote_links(driver.page_source)
+        quote_links.extend(matched_links)
+        if journal is not None:
+            journal.record_page(url, matched_links)
+        if cache is not None and matched_links:
+            cache.store(url, matched_links)
+
+        metrics.inc("quote_links", len(matched_links), source="browser")
+        log_event("links_extracted", f"Extracted {len(matched_links)} links from {url}", url=url,
+                  links=len(matched_links))
+
+    return quote_links
+
+
+# In[ ]:
+
+
+# Valid quote hrefs look like "/quote/<...>/" and contain an uppercase-only ticker segment
+quote_href_pattern = re.compile(r"^(?=.*/quote/[A-Z]+(?:/|$))/quote/.+/$")
+
+# Collects candidate quote hrefs inside the browser, as written in the markup
+quote_href_script = """
+return Array.from(document.querySelectorAll('a[href^="/quote/"]'), a => a.getAttribute('href'));
+"""
+
+
+def filter_quote_hrefs(hrefs, limit=10):
+    '''
+    Filters candidate hrefs down to valid stock quote links in a single compiled pass.
+    input:
+        - hrefs: Iterable of href attribute values (strings).
+        - limit: Maximum number of links to return (int or None for no limit, default: 10).
+    output:
+        - List of fully qualified quote links (strings) filtered for uppercase tickers only.
+    '''
+    matched_links = []
+    for href in hrefs:
+        if href and quote_href_pattern.match(href):
+            matched_links.append(urljoin(base_url, href))  # Prepend base URL
+
+            # Stop after collecting the first 10 links
+            if limit is not None and len(matched_links) >= limit:
+                break
+    return matched_links
+
+
+@metrics.timed("html_parse")
+def parse_quote_links(html, limit=10):
+    '''
+    Parses valid stock quote links out of an industry page.
+    input:
+        - html: HTML source of an industry page (string).
+        - limit: Maximum number of links to return (int or None for no limit, default: 10).
+    output:
+        - List of valid stock quote links (strings) filtered for uppercase tickers only.
+    '''
+    # Parse the page source with BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    return filter_quote_hrefs((link['href'] for link in soup.find_all('a', href=True)), limit)
+
+
+def collect_quote_links_in_browser(driver, limit=10):
+    '''
+    Collects valid stock quote links from the page currently loaded in the browser
+    with one script call, without transferring and re-parsing the page source.
+    input:
+        - driver: Selenium WebDriver instance on an industry page.
+        - limit: Maximum number of links to return (int, default: 10).
+    output:
+        - List of valid stock quote links (strings) filtered for uppercase tickers only.
+    '''
+    return filter_quote_hrefs(driver.execute_script(quote_href_script) or [], limit)
+
+
+@metrics.timed("html_parse")
+def parse_industry_names(html):
+    '''
+    Parses industry names out of a sector page, mirroring `gather_industry_names`.
+    input:
+        - html: HTML source of a sector page (string).
+    output:
+        - List of industry names (strings), empty if the page does not contain the industry table.
+    '''
+    soup = BeautifulSoup(html, 'html.parser')
+    industry_rows = soup.select("tr.yf-k3njn8")
+
+    # The first two rows are the table header and the sector total
+    names = []
+    for row in industry_rows[2:]:
+        cell = row.select_one("td.name")
+        if cell is not None:
+            names.append(cell.get_text(strip=True))
+    return names
+
+
+# ## 3.1 Browser-free Discovery
+
+# In[ ]:
+
+
+# Accept header for page requests; the session defaults target the JSON API
+html_headers = {"accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8"}
+
+
+def fetch_page_html(url, session=None, raise_errors=False):
+    '''
+    Downloads the static HTML of a Yahoo Finance page without a browser.
+    input:
+        - url: Page URL (string).
+        - session: requests.Session from `create_http_session` (default: None).
+        - raise_errors: Raise request errors instead of returning None, for `RetryScheduler` (default: False).
+    output:
+        - HTML source (string), or None if the request fails.
+    '''
+    http = session if session is not None else requests
+    try:
+        with metrics.timer("page_fetch", item=url):
+            response = http.get(url, headers=html_headers, timeout=request_timeout)
+        metrics.inc("http_responses", endpoint="page", status=response.status_code)
+        response.raise_for_status()
+        return response.text
+    except Exception as e:
+        if raise_errors:
+            raise
+        metrics.inc("errors", stage="page_fetch")
+        log_event("page_error", f"Error fetching {url}: {e}", logging.ERROR, url=url, error=str(e))
+        return None
+
+
+def gather_industry_names_http(session=None, cache=None):
+    '''
+    Collects the industry names from the static sector page HTML.
+    input:
+        - session: requests.Session from `create_http_session` (default: None).
+        - cache: Optional `DiscoveryCache`; the page is only requested after the TTL, and only
+          parsed again if it changed (default: None).
+    output:
+        - List of industry names (strings). Also populates the global list `industry_names`
+          when names are found, like `gather_industry_names`.
+    '''
+    global industry_names
+    if cache is not None:
+        names, html = cache.fetch_page(sectors_url, session, kind="names")
+    else:
+        names, html = None, fetch_page_html(sectors_url, session)
+    if names is None:
+        names = parse_industry_names(html) if html else []
+        if cache is not None and names:
+            cache.store(sectors_url, names, "names")
+    log_event("industries_found", f"Found {len(names)} industries in static HTML.", count=len(names))
+    if names:
+        industry_names = names
+        log_event("industry_names", f"Collected industry names: {industry_names}", names=industry_names)
+    return names
+
+
+def extract_quote_links_http(urls, session=None, fallback=None, journal=None, cache=None):
+    '''
+    Extracts valid stock quote links from the static HTML of industry pages.
+    input:
+        - urls: List of industry page URLs (strings).
+        - session: requests.Session from `create_http_session` (default: None).
+        - fallback: Optional function called with a URL whose static HTML has no quote links;
+          returns the links for that URL, e.g. from Selenium (default: None).
+        - journal: Optional `CheckpointJournal` of completed pages, see `extract_quote_links` (default: None).
+        - cache: Optional `DiscoveryCache` of the pages' links, see `iter_quote_links_http` (default: None).
+    output:
+        - List of valid stock quote links (strings) filtered for uppercase tickers only.
+    '''
+    return list(iter_quote_links_http(urls, session, fallback, journal, cache=cache))
+
+
+def iter_quote_links_http(urls, session=None, fallback=None, journal=None, retry=None, cache=None):
+    '''
+    Generator version of `extract_quote_links_http` that yields links page by page.
+    input:
+        - urls: List of industry page URLs (strings).
+        - session: requests.Session from `create_http_session` (default: None).
+        - fallback: Optional function called with a URL whose static HTML has no quote links (default: None).
+        - journal: Optional `CheckpointJournal` of completed pages, see `extract_quote_links` (default: None).
+        - retry: `RetryScheduler` for the page requests; a failed page is retried later while the
+          next pages are fetched (default: None, a new one).
+        - cache: Optional `DiscoveryCache`; pages cached within the TTL are not requested, older ones
+          are requested conditionally and only parsed again if they changed (default: None).
+    output:
+        - Yields valid stock quote links (strings) as soon as their page is parsed.
+    '''
+    retry = retry if retry is not None else RetryScheduler()
+
+    open_urls = []
+    for url in urls:
+        resumed = journal.page_links(url) if journal is not None else None
+        if resumed is None and cache is not None:
+            resumed = cache.fresh(url)
+        if resumed is not None:
+            yield from resumed
+        else:
+            open_urls.append(url)
+
+    fetched = itertools.count(1)
+
+    def fetch(url):
+        log_event("page_open", f"Fetching URL {next(fetched)}/{len(open_urls)}: {url}", url=url)
+        if cache is not None:
+            return cache.fetch_page(url, session, raise_errors=True)
+        return None, fetch_page_html(url, session, raise_errors=True)
+
+    for url, result in retry.iterate(open_urls, fetch, host=lambda url: urlparse(url).netloc, stage="page_fetch"):
+        cached, html = result if result is not None else (None, None)
+        if cached is not None:
+            matched_links = cached
+        else:
+            matched_links = parse_quote_links(html) if html else []
+
+            if not matched_links and fallback is not None:
+                log_event("browser_fallback", f"No quote links in static HTML of {url}, falling back to the browser.",
+                          logging.WARNING, url=url)
+                metrics.inc("browser_fallbacks")
+                matched_links = fallback(url)
+
+            # Cached with the static page's validators, so an unchanged page needs no browser next time
+            if cache is not None and matched_links:
+                cache.store(url, matched_links)
+
+        # A failed download without fallback is left open for the next run
+        if journal is not None and (result is not None or fallback is not None):
+            journal.record_page(url, matched_links)
+
+        metrics.inc("quote_links", len(matched_links), source="http")
+        log_event("links_extracted", f"Extracted {len(matched_links)} links from {url}", url=url,
+                  links=len(matched_links))
+        yield from matched_links
+
+
+def discover_quote_links(session=None, fallback_driver=None, driver_factory=None, journal=None, cache=None):
+    '''
+    Discovers industry pages and their quote links over plain HTTP, using Selenium
+    only for pages whose static HTML lacks the data.
+    input:
+        - session: requests.Session from `create_http_session` (default: None).
+        - fallback_driver: Selenium WebDriver instance used as fallback (default: None, no fallback).
+        - driver_factory: Function returning the fallback WebDriver, only called if the fallback is
+          needed, e.g. `get_driver` (default: None).
+        - journal: Optional `CheckpointJournal` of completed industry pages (default: None).
+        - cache: Optional `DiscoveryCache` of the sector and industry pages (default: None).
+    output:
+        - List of valid stock quote links (strings).
+    '''
+    return list(iter_quote_links(session, fallback_driver, driver_factory, journal, cache))
+
+
+def iter_quote_links(session=None, fallback_driver=None, driver_factory=None, journal=None, cache=None):
+    '''
+    Generator version of `discover_quote_links`, so that fetching can start
+    while later industry pages are still being discovered.
+    input:
+        - session: requests.Session from `create_http_session` (default: None).
+        - fallback_driver: Selenium WebDriver instance used as fallback (default: None, no fallback).
+        - driver_factory: Function returning the fallback WebDriver, only called if needed (default: None).
+        - journal: Optional `CheckpointJournal` of completed industry pages (default: None).
+        - cache: Optional `DiscoveryCache` of the sector and industry pages (default: None).
+    output:
+        - Yields valid stock quote links (strings).
+    '''
+    browser_ready = False
+    has_fallback = fallback_driver is not None or driver_factory is not None
+
+    def browser():
+        # Start the browser and do the homepage and cookie round trip only once, and only if the fallback is needed
+        nonlocal browser_ready, fallback_driver
+        if not browser_ready:
+            if fallback_driver is None:
+                fallback_driver = driver_factory()
+            open_browser_session(fallback_driver)
+            browser_ready = True
+        return fallback_driver
+
+    if not gather_industry_names_http(session, cache):
+        if not has_fallback:
+            return
+        log_event("browser_fallback", "Industry table missing from static HTML, falling back to the browser.",
+                  logging.WARNING, url=sectors_url)
+        browser().get(sectors_url)
+        wait_for_industry_table(fallback_driver)
+        gather_industry_names(fallback_driver, cache)
+
+    updated_urls = generate_urls()
+    log_event("industry_urls", "List of industry URLs:\n" + "\n".join(updated_urls),
+              urls=updated_urls)
+
+    def fallback(url):
+        # Reads an industry page whose static HTML has no quote links in the browser
+        return extract_quote_links(browser(), [url], in_browser=True)
+
+    yield from iter_quote_links_http(updated_urls, session, fallback if has_fallback else None, journal, cache=cache)
+
+
+# ## 3.2 Page Readiness and Parallel Browsers
+
+# In[ ]:
+
+
+def wait_for_document_ready(driver, timeout=page_ready_timeout):
+    '''
+    Waits until the browser reports that the current document has finished loading.
+    input:
+        - driver: Selenium WebDriver instance.
+        - timeout: Maximum wait in seconds (default: 15).
+    output:
+        - Boolean: True if the document became ready, False on timeout.
+    '''
+    from selenium.common.exceptions import TimeoutException
+
+    try:
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_dom_stable(driver, timeout=page_ready_timeout, settle=0.5, poll=0.1):
+    '''
+    Waits until the number of links on the page stops changing, i.e. rendering has settled.
+    input:
+        - driver: Selenium WebDriver instance.
+        - timeout: Maximum wait in seconds (default: 15).
+        - settle: Seconds the link count must stay unchanged (default: 0.5).
+        - poll: Seconds between checks (default: 0.1).
+    output:
+        - Boolean: True if the DOM settled, False on timeout.
+    '''
+    from selenium.common.exceptions import TimeoutException
+
+    state = {"count": None, "since": time.monotonic()}
+
+    def settled(d):
+        count = d.execute_script("return document.getElementsByTagName('a').length")
+        now = time.monotonic()
+        if count != state["count"]:
+            state["count"], state["since"] = count, now
+            return False
+        return now - state["since"] >= settle
+
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=poll).until(settled)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_for_industry_table(driver, timeout=page_ready_timeout):
+    '''
+    Waits until the industry table of a sector page is rendered and stable.
+    input:
+        - driver: Selenium WebDriver instance on a sector page.
+        - timeout: Maximum wait in seconds (default: 15).
+    output:
+        - Boolean: True if the table is ready, False on timeout.
+    '''
+    from selenium.common.exceptions import TimeoutException
+
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "tr.yf-k3njn8"))
+        )
+    except TimeoutException:
+        return False
+    return wait_for_dom_stable(driver, timeout)
+
+
+def wait_for_industry_page(driver, timeout=page_ready_timeout):
+    '''
+    Waits until an industry page shows quote links and has stopped rendering.
+    input:
+        - driver: Selenium WebDriver instance on an industry page.
+        - timeout: Maximum wait in seconds (default: 15).
+    output:
+        - Boolean: True if the page is ready, False on timeout.
+    '''
+    from selenium.common.exceptions import TimeoutException
+
+    deadline = time.monotonic() + timeout
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, "a[href*='/quote/']"))
+        )
+    except TimeoutException:
+        log_event("page_timeout", f"Timed out after {timeout}s waiting for quote links.", logging.WARNING,
+                  timeout=timeout)
+        return False
+    return wait_for_dom_stable(driver, max(deadline - time.monotonic(), 0.5))
+
+
+# In[ ]:
+
+
+class WebDriverPool:
+    '''
+    A fixed-size pool of headless Chrome drivers that share one cookie bootstrap
+    and render industry pages in parallel.
+    input:
+        - size: Number of browsers (default: 4).
+        - driver_factory: Function returning a new WebDriver (default: `create_driver`).
+        - timeout: Page readiness timeout in seconds (default: 15).
+        - in_browser: Collect links with one script call instead of parsing the page source (default: True).
+    '''
+
+    def __init__(self, size=driver_pool_size, driver_factory=create_driver, timeout=page_ready_timeout,
+                 in_browser=True):
+        self.size = max(1, int(size))
+        self.driver_factory = driver_factory
+        self.timeout = timeout
+        self.in_browser = in_browser
+        self.page_ready_latency = {}  # URL -> seconds from navigation until the page was ready
+        self._drivers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def start(self):
+        '''
+        Starts the browsers. The first one accepts the consent dialog and saves the cookies,
+        the others load them from `cookie_file_path`.
+        '''
+        first = self.driver_factory()
+        open_browser_session(first)
+        self._add(first)
+
+        def start_one(_):
+            new_driver = self.driver_factory()
+            open_browser_session(new_driver)
+            self._add(new_driver)
+
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            list(executor.map(start_one, range(self.size - 1)))
+        return self
+
+    def _add(self, new_driver):
+        with self._lock:
+            self._drivers.append(new_driver)
+        self._idle.put(new_driver)
+
+    @contextmanager
+    def lease(self):
+        '''
+        Borrows an idle driver for the duration of a `with` block.
+        '''
+        leased = self._idle.get()
+        try:
+            yield leased
+        finally:
+            self._idle.put(leased)
+
+    def _extract_one(self, url, journal=None, cache=None):
+        resumed = journal.page_links(url) if journal is not None else None
+        if resumed is None and cache is not None:
+            resumed = cache.fresh(url)
+        if resumed is not None:
+            return resumed
+
+        with self.lease() as leased:
+            start = time.perf_counter()
+            leased.get(url)
+            ready = wait_for_industry_page(leased, self.timeout)
+            latency = time.perf_counter() - start
+            with metrics.timer("link_extract", item=url):
+                if self.in_browser:
+                    matched_links = collect_quote_links_in_browser(leased)
+                else:
+                    matched_links = parse_quote_links(leased.page_source)
+
+        self.page_ready_latency[url] = latency
+        if journal is not None:
+            journal.record_page(url, matched_links)
+        if cache is not None and matched_links:
+            cache.store(url, matched_links)
+        metrics.observe("stage_seconds", latency, stage="browser_navigation")
+        metrics.inc("quote_links", len(matched_links), source="browser")
+        status = "ready" if ready else "timed out"
+        log_event("links_extracted", f"Extracted {len(matched_links)} links from {url} ({status} after {latency:.2f}s)",
+                  url=url, links=len(matched_links), ready=ready, latency=round(latency, 3))
+        return matched_links
+
+    def extract_quote_links(self, urls, journal=None, cache=None):
+        '''
+        Extracts valid stock quote links from industry pages using all browsers in parallel.
+        input:
+            - urls: List of industry page URLs (strings).
+            - journal: Optional `CheckpointJournal` of completed pages, see `extract_quote_links` (default: None).
+            - cache: Optional `DiscoveryCache` of the pages' links, see `extract_quote_links` (default: None).
+        output:
+            - List of valid stock quote links (strings), in the order of `urls`.
+        '''
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            results = list(executor.map(lambda url: self._extract_one(url, journal, cache), urls))
+        return [link for matched_links in results for link in matched_links]
+
+    def latency_summary(self):
+        '''
+        Summarizes page-ready latencies to help tune the pool size.
+        output:
+            - Dictionary with count, mean, p50, p95 and max latency in seconds.
+        '''
+        latencies = sorted(self.page_ready_latency.values())
+        if not latencies:
+            return {"count": 0}
+        return {
+            "count": len(latencies),
+            "mean": sum(latencies) / len(latencies),
+            "p50": latencies[int(0.50 * (len(latencies) - 1))],
+            "p95": latencies[int(0.95 * (len(latencies) - 1))],
+            "max": latencies[-1],
+        }
+
+    def close(self):
+        '''
+        Quits all browsers in the pool.
+        '''
+        with self._lock:
+            drivers, self._drivers = self._drivers, []
+        for pooled in drivers:
+            try:
+                pooled.quit()
+            except Exception as e:
+                log_event("browser_close_error", f"Error closing browser: {e}", logging.ERROR, error=str(e))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ## 3.3 Market-wide Crawl
+
+# In[ ]:
+
+
+sectors_root_url = "https://finance.yahoo.com/sectors/"
+
+# Slugs of all sector pages on Yahoo Finance
+sector_slugs = [
+    "basic-materials", "communication-services", "consumer-cyclical", "consumer-defensive",
+    "energy", "financial-services", "healthcare", "industrials", "real-estate", "technology",
+    "utilities",
+]
+
+crawl_rate_per_host = 2.0  # Sustained page requests per second and host
+crawl_burst = 4  # Requests a host may receive back to back before pacing kicks in
+
+
+class TokenBucket:
+    '''
+    Thread-safe token bucket: allows `capacity` requests at once and `rate` requests
+    per second on average.
+    input:
+        - rate: Tokens added per second (float).
+        - capacity: Maximum number of stored tokens (float).
+    '''
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self):
+        '''
+        Takes a token if one is available.
+        output:
+            - 0.0 if a token was taken, otherwise the seconds until the next token is available.
+        '''
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        '''
+        Blocks exactly as long as needed to take a token.
+        '''
+        while True:
+            wait_time = self.try_acquire()
+            if wait_time == 0.0:
+                return
+            time.sleep(wait_time)
+
+
+class HostRateLimiter:
+    '''
+    Keeps one `TokenBucket` per host so that every host is paced independently.
+    input:
+        - rate: Requests per second and host (default: 2.0).
+        - burst: Bucket capacity per host (default: 4).
+    '''
+
+    def __init__(self, rate=crawl_rate_per_host, burst=crawl_burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate, self.burst)
+            return self._buckets[host]
+
+    def acquire(self, url):
+        '''
+        Blocks until a request to the host of `url` is allowed.
+        '''
+        self.bucket(url).acquire()
+
+
+class CrawlFrontier:
+    '''
+    Queue of pages still to crawl, with set-based deduplication of page URLs and tickers.
+    Each entry is a (kind, url, payload) tuple, where kind is "sector" or "industry" and the
+    payload of an industry result page is (industry URL, page number).
+    '''
+
+    def __init__(self):
+        self._queue = deque()
+        self.seen_urls = set()
+        self.tickers = {}  # ticker -> canonical quote link, in discovery order
+
+    def add_page(self, kind, url, payload=None):
+        '''
+        Queues a page unless it was queued before.
+        output:
+            - Boolean: True if the page is new.
+        '''
+        if url in self.seen_urls:
+            return False
+        self.seen_urls.add(url)
+        self._queue.append((kind, url, payload))
+        return True
+
+    def add_links(self, links):
+        '''
+        Records quote links, keeping one canonical link per ticker.
+        output:
+            - Number of tickers that were new.
+        '''
+        new = 0
+        for link in links:
+            ticker = urlparse(link).path.split('/')[2]
+            if ticker not in self.tickers:
+                self.tickers[ticker] = f"{base_url}quote/{ticker}/"
+                new += 1
+        return new
+
+    def pop(self):
+        return self._queue.popleft()
+
+    def __len__(self):
+        return len(self._queue)
+
+
+@metrics.timed("html_parse")
+def parse_industry_urls(html, sector_url):
+    '''
+    Finds the industry pages linked from a sector page.
+    input:
+        - html: HTML source of a sector page (string).
+        - sector_url: URL of the sector page (string).
+    output:
+        - List of industry page URLs (strings), built from the industry table and from
+          explicit /sectors/<sector>/<industry>/ links.
+    '''
+    urls = [industry_url(sector_url, name) for name in parse_industry_names(html)]
+    sector_path = urlparse(sector_url).path
+    for link in BeautifulSoup(html, 'html.parser').find_all('a', href=True):
+        path = urlparse(urljoin(sector_url, link['href'])).path
+        if path.startswith(sector_path) and path.count('/') == sector_path.count('/') + 1 and path.endswith('/'):
+            urls.append(urljoin(base_url, path))
+    return list(dict.fromkeys(urls))
+
+
+def paged_url(url, start, count):
+    '''
+    Returns the URL of the result page that starts at `start`. The count is sent for the first
+    page too, since the site's default page size is smaller and the next page starts at `count`.
+    '''
+    return f"{url}?start={start}&count={count}"
+
+
+def crawl_market(session=None, sectors=None, workers=4, rate=crawl_rate_per_host, burst=crawl_burst,
+                 page_size=100, max_pages=20, cache=None):
+    '''
+    Crawls all sector pages, their industry pages and every result page of each industry,
+    pacing requests per host with token buckets instead of fixed sleeps.
+    input:
+        - session: requests.Session from `create_http_session` (default: None).
+        - sectors: Sector slugs to seed (default: None, all of `sector_slugs`).
+        - workers: Number of pages fetched concurrently (default: 4).
+        - rate: Sustained requests per second and host (default: 2.0).
+        - burst: Token bucket capacity per host (default: 4).
+        - page_size: Number of companies requested per industry result page (default: 100).
+        - max_pages: Maximum number of result pages per industry (default: 20).
+        - cache: Optional `DiscoveryCache` of the industry URLs and quote links of every page (default: None).
+    output:
+        - List of canonical quote links (strings), one per ticker.
+    '''
+    frontier = CrawlFrontier()
+    limiter = HostRateLimiter(rate, burst)
+    for slug in sectors or sector_slugs:
+        frontier.add_page("sector", f"{sectors_root_url}{slug}/")
+
+    def visit(kind, url, payload):
+        # Sector pages are cached with their industry URLs, result pages with all their quote links
+        cache_kind = "industries" if kind == "sector" else "results"
+        cached = cache.fresh(url, cache_kind) if cache is not None else None
+        if cached is not None:
+            return kind, url, payload, cached
+
+        limiter.acquire(url)
+        if cache is not None:
+            cached, html = cache.fetch_page(url, session, kind=cache_kind)
+            if cached is not None:
+                return kind, url, payload, cached
+        else:
+            html = fetch_page_html(url, session)
+        if not html:
+            return kind, url, payload, []
+        if kind == "sector":
+            found = parse_industry_urls(html, url)
+        else:
+            found = parse_quote_links(html, limit=None)
+        if cache is not None and found:
+            cache.store(url, found, cache_kind)
+        return kind, url, payload, found
+
+    workers = max(1, int(workers))
+    pending = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while frontier or pending:
+            while frontier and len(pending) < workers:
+                pending.add(executor.submit(visit, *frontier.pop()))
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    kind, url, payload, found = future.result()
+                except Exception as e:
+                    metrics.inc("errors", stage="crawl")
+                    log_event("crawl_error", f"Error crawling page: {e}", logging.ERROR, error=str(e))
+                    continue
+
+                if kind == "sector":
+                    new_pages = sum(frontier.add_page("industry", paged_url(industry, 0, page_size), (industry, 0))
+                                    for industry in found)
+                    log_event("industries_found", f"Found {len(found)} industries ({new_pages} new) on {url}",
+                              url=url, count=len(found), new=new_pages)
+                    continue
+
+                industry, page = payload
+                new_tickers = frontier.add_links(found)
+                metrics.inc("quote_links", new_tickers, source="crawl")
+                log_event("tickers_found", f"Found {new_tickers} new tickers on page {page + 1} of {industry}",
+                          url=industry, page=page + 1, new=new_tickers)
+                # Keep paging while result pages bring new tickers
+                if new_tickers and page + 1 < max_pages:
+                    next_url = paged_url(industry, (page + 1) * page_size, page_size)
+                    frontier.add_page("industry", next_url, (industry, page + 1))
+
+    log_event("crawl_complete", f"Crawl complete: {len(frontier.seen_urls)} pages, {len(frontier.tickers)} tickers.",
+              pages=len(frontier.seen_urls), tickers=len(frontier.tickers))
+    return list(frontier.tickers.values())
+
+
+# ## 3.4 Discovery Cache
+
+# In[ ]:
+
+
+class DiscoveryCache:
+    '''
+    SQLite cache of what discovery extracted from each sector and industry page: the industry
+    names or quote links, the time the page was fetched, its ETag and Last-Modified validators
+    and a hash of its HTML. Within the TTL a page is not requested at all; after it, the page is
+    requested conditionally and only parsed again if the server or the hash says it changed.
+    Every change of a page's extracted items is recorded with the items added and removed.
+    Entries are keyed by page URL and kind of items, since one page can be read for different
+    items: "names" (industry names of a sector page), "quotes" (quote links of an industry page),
+    or for the market crawl "industries" (industry URLs of a sector page) and "results" (every
+    quote link of an industry result page).
+    input:
+        - path: SQLite database file (default: "discovery_cache.sqlite").
+        - ttl: Age below which a cached page is used without a request (timedelta, default: 24 hours).
+        - clock: Function returning the current time in seconds (default: time.time).
+    '''
+
+    def __init__(self, path=discovery_cache_file, ttl=discovery_ttl, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._pending = {}  # (kind, url) -> validators of a downloaded page until its items are stored
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            if "kind" not in {row[1] for row in self._db.execute("PRAGMA table_info(pages)")}:
+                # Caches written before entries had a kind are dropped and rebuilt on the next lookups
+                self._db.execute("DROP TABLE IF EXISTS pages")
+                self._db.execute("DROP TABLE IF EXISTS changes")
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages (kind TEXT, url TEXT, items TEXT, etag TEXT, "
+                             "last_modified TEXT, content_hash TEXT, fetched_at REAL, checked_at REAL, "
+                             "PRIMARY KEY (kind, url))")
+            self._db.execute("CREATE TABLE IF NOT EXISTS changes (kind TEXT, url TEXT, changed_at REAL, added TEXT, "
+                             "removed TEXT)")
+
+    def entry(self, url, kind="quotes"):
+        '''
+        Returns the cached entry of a page as a dictionary, or None if the page is not cached.
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT items, etag, last_modified, content_hash, fetched_at, checked_at "
+                                   "FROM pages WHERE kind = ? AND url = ?", (kind, url)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("items", "etag", "last_modified", "content_hash", "fetched_at", "checked_at"),
+                        (json.loads(row[0]),) + row[1:]))
+
+    def fresh(self, url, kind="quotes"):
+        '''
+        Returns the cached items of a page checked within the TTL, or None if it has to be requested.
+        '''
+        entry = self.entry(url, kind)
+        if entry is None or self.clock() - entry["checked_at"] > self.ttl.total_seconds():
+            return None
+        metrics.inc("discovery_cache", result="fresh")
+        log_event("discovery_cached", f"Using cached {kind} of {url}", logging.DEBUG, url=url, kind=kind)
+        return entry["items"]
+
+    def fetch_page(self, url, session=None, raise_errors=False, kind="quotes"):
+        '''
+        Returns a page's cached items if it is fresh or unchanged, otherwise its new HTML.
+        After parsing new HTML, pass the items to `store` so they are cached with the page's validators.
+        input:
+            - url: Page URL (string).
+            - session, raise_errors: As for `fetch_page_html`.
+            - kind: Kind of items read from the page, see the class (default: "quotes").
+        output:
+            - Tuple (items, html): (list, None) for a fresh or unchanged page, (None, string) for a
+              new or changed page, and (None, None) if the request fails.
+        '''
+        items = self.fresh(url, kind)
+        if items is not None:
+            return items, None
+
+        entry = self.entry(url, kind)
+        headers = dict(html_headers)
+        if entry is not None and entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry is not None and entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        http = session if session is not None else requests
+        try:
+            with metrics.timer("page_fetch", item=url):
+                response = http.get(url, headers=headers, timeout=request_timeout)
+            metrics.inc("http_responses", endpoint="page", status=response.status_code)
+            if response.status_code == 304 and entry is not None:
+                self._touch(kind, url, entry["etag"], entry["last_modified"], entry["content_hash"])
+                metrics.inc("discovery_cache", result="not_modified")
+                return entry["items"], None
+            response.raise_for_status()
+        except Exception as e:
+            if raise_errors:
+                raise
+            metrics.inc("errors", stage="page_fetch")
+            log_event("page_error", f"Error fetching {url}: {e}", logging.ERROR, url=url, error=str(e))
+            return None, None
+
+        html = response.text
+        validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                      hashlib.sha256(html.encode("utf-8")).hexdigest())
+        if entry is not None and entry["content_hash"] == validators[2]:
+            # Same bytes as last time, so the parsed items are the same too
+            self._touch(kind, url, *validators)
+            metrics.inc("discovery_cache", result="unchanged")
+            return entry["items"], None
+
+        with self._lock:
+            self._pending[kind, url] = validators
+        metrics.inc("discovery_cache", result="changed" if entry is not None else "new")
+        return None, html
+
+    def store(self, url, items, kind="quotes"):
+        '''
+        Caches the items extracted from a page and records a change if they differ from the cached ones.
+        input:
+            - url: Page URL (string).
+            - items: Industry names, industry URLs or quote links found on the page (list of strings).
+            - kind: Kind of the items, see the class (default: "quotes").
+        output:
+            - Dictionary with the "added" and "removed" items (lists of strings).
+        '''
+        items = list(items)
+        previous = self.entry(url, kind)
+        with self._lock:
+            etag, last_modified, content_hash = self._pending.pop((kind, url), (None, None, None))
+        now = self.clock()
+        old = previous["items"] if previous is not None else []
+        old_set, new_set = set(old), set(items)
+        change = {"added": [i for i in items if i not in old_set], "removed": [i for i in old if i not in new_set]}
+
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (kind, url, json.dumps(items), etag, last_modified, content_hash, now, now))
+            if previous is not None and (change["added"] or change["removed"]):
+                self._db.execute("INSERT INTO changes VALUES (?, ?, ?, ?, ?)",
+                                 (kind, url, now, json.dumps(change["added"]), json.dumps(change["removed"])))
+        if previous is not None and (change["added"] or change["removed"]):
+            metrics.inc("discovery_changes")
+            log_event("discovery_changed", f"{url} changed: {len(change['added'])} added, "
+                      f"{len(change['removed'])} removed", url=url, kind=kind, **change)
+        return change
+
+    def _touch(self, kind, url, etag, last_modified, content_hash):
+        # Confirms an unchanged page, so its TTL starts again
+        with self._lock, self._db:
+            self._db.execute("UPDATE pages SET etag = ?, last_modified = ?, content_hash = ?, checked_at = ? "
+                             "WHERE kind = ? AND url = ?", (etag, last_modified, content_hash, self.clock(), kind, url))
+
+    def changes(self, since=None):
+        '''
+        Returns the recorded changes, oldest first.
+        input:
+            - since: Only changes at or after this time (seconds since epoch) (default: None, all).
+        output:
+            - List of dictionaries with "kind", "url", "changed_at", "added" and "removed".
+        '''
+        with self._lock:
+            rows = self._db.execute("SELECT kind, url, changed_at, added, removed FROM changes WHERE changed_at >= ? "
+                                    "ORDER BY changed_at, rowid", (since or 0,)).fetchall()
+        return [{"kind": kind, "url": url, "changed_at": changed_at, "added": json.loads(added),
+                 "removed": json.loads(removed)} for kind, url, changed_at, added, removed in rows]
+
+    def invalidate(self, url=None):
+        '''
+        Makes one page, or every page, due for a conditional request on the next lookup.
+        '''
+        with self._lock, self._db:
+            if url is None:
+                self._db.execute("UPDATE pages SET checked_at = 0")
+            else:
+                self._db.execute("UPDATE pages SET checked_at = 0 WHERE url = ?", (url,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ## 4. Backend: Data Fetching and Storage
+
+# In[12]:
+
+
+def fetch_all_tickers_data(links, cookies=None, headers=None, max_concurrency=max_concurrent_requests, session=None,
+                           snap_to=None, period1=None, period2=None, interval="1d", cache=None, incremental=False,
+                           max_bars=100, fetch_mode="chart", journal=None, retry=None):
+    '''
+    Fetches stock price data for multiple tickers and aligns it by timestamps.
+    Synchronous wrapper around `fetch_all_tickers_data_async`.
+    input:
+        - links: List of stock quote links (strings).
+        - cookies: Dictionary of cookies for HTTP requests (default: None).
+        - headers: Dictionary of headers for HTTP requests (default: None).
+        - max_concurrency: Maximum number of chart requests in flight at once (default: 8).
+        - session: Shared requests.Session from `create_http_session`, optionally wrapped in `AdaptiveConcurrency`
+          (default: None, one connection per request).
+        - snap_to: Optional pandas frequency (string, e.g., "D") to bucket timestamps into before aligning (default: None).
+        - period1: Start timestamp (int, seconds since epoch) (default: None, one year ago).
+        - period2: End timestamp (int, seconds since epoch) (default: None, now).
+        - interval: Data granularity (string, e.g., "1d", "1h") (default: "1d").
+        - cache: Optional `ChartCache` that stores every fetched bar (default: None).
+        - incremental: Only request bars newer than each ticker's cached watermark (default: False).
+        - max_bars: Number of most recent bars kept per ticker (default: 100).
+        - fetch_mode: "chart" for one chart request per ticker, "batch" to request up to 20 symbols
+          per spark request and fall back to chart requests for omitted symbols, or "auto" to batch
+          whenever there is more than one ticker (default: "chart").
+        - journal: Optional `CheckpointJournal`; tickers it lists as completed are not requested again
+          and every newly finished ticker is recorded (default: None).
+        - retry: `RetryScheduler` for the per-ticker chart requests (default: None, a new one).
+    output:
+        - pandas DataFrame: Contains timestamps as rows and stock tickers as columns, with their respective close prices.
+    '''
+    return run_coroutine(fetch_all_tickers_data_async(
+        links, cookies=cookies, headers=headers, max_concurrency=max_concurrency, session=session,
+        snap_to=snap_to, period1=period1, period2=period2, interval=interval, cache=cache,
+        incremental=incremental, max_bars=max_bars, fetch_mode=fetch_mode, journal=journal, retry=retry,
+    ))
+
+
+@metrics.timed("align")
+def align_ticker_series(all_data, snap_to=None, index=None):
+    '''
+    Aligns per-ticker DataFrames on a common timestamp index in a single pass.
+    input:
+        - all_data: List of DataFrames with a "timestamp" column and one ticker column each.
+        - snap_to: Optional pandas frequency (string, e.g., "D") to floor timestamps to, so that
+          bars with different open times on the same trading day share one row (default: None).
+        - index: Optional calendar of timestamps to align on instead of the union of all timestamps (default: None).
+    output:
+        - pandas DataFrame: Timestamps as rows and tickers as columns, sorted by timestamp.
+    '''
+    # Deduplicate tickers, the last frame for a ticker wins
+    unique_tickers = {df.columns[1]: df for df in all_data}
+
+    columns = []
+    for ticker, df in unique_tickers.items():
+        timestamps = pd.DatetimeIndex(df["timestamp"])
+        if snap_to:
+            timestamps = timestamps.floor(snap_to)
+        timestamps = timestamps.to_numpy(dtype="datetime64[ns]")
+        values = np.asarray(df[ticker], dtype="float64")
+
+        # Collapse bars that fall into the same bucket, keeping the latest one
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, values = timestamps[order], values[order]
+        last = np.append(timestamps[1:] != timestamps[:-1], True)
+        columns.append((ticker, timestamps[last], values[last]))
+
+    if index is None:
+        # Union of all timestamps, computed once instead of growing a frame merge by merge
+        if columns:
+            index = np.unique(np.concatenate([timestamps for _, timestamps, _ in columns]))
+        else:
+            index = np.array([], dtype="datetime64[ns]")
+    else:
+        index = pd.DatetimeIndex(index)
+        if snap_to:
+            index = index.floor(snap_to)
+        index = np.unique(index.to_numpy(dtype="datetime64[ns]"))
+
+    # Allocate the final matrix once and place each ticker's values at their row positions
+    matrix = np.full((len(index), len(columns)), np.nan)
+    for position, (_, timestamps, values) in enumerate(columns):
+        rows = np.searchsorted(index, timestamps)
+        present = rows < len(index)
+        present[present] = index[rows[present]] == timestamps[present]
+        matrix[rows[present], position] = values[present]
+
+    aligned = pd.DataFrame(matrix, columns=[ticker for ticker, _, _ in columns])
+    aligned.insert(0, "timestamp", index)
+    return aligned
+
+
+def run_coroutine(coro):
+    '''
+    Runs a coroutine to completion from synchronous code.
+    input:
+        - coro: Coroutine object to execute.
+    output:
+        - The value returned by the coroutine.
+    '''
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # An event loop is already running (e.g. inside Jupyter), so use a helper thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
+# In[13]:
+
+
+# Fetch stock data for a single ticker
+def fetch_stock_data(ticker, period1, period2, interval="1d", cookies=None, headers=None, session=None,
+                     raise_errors=False):
+    '''
+    Fetches stock price data (timestamps and close prices) for a single ticker from Yahoo Finance.
+    input:
+        - ticker: Stock ticker symbol (string).
+        - period1: Start timestamp (int, in seconds since epoch).
+        - period2: End timestamp (int, in seconds since epoch).
+        - interval: Data granularity (string, e.g., "1d", "1h").
+        - cookies: Dictionary of cookies for the HTTP request (default: None).
+        - headers: Dictionary of headers for the HTTP request (default: None).
+        - session: requests.Session from `create_http_session` to reuse connections (default: None).
+        - raise_errors: Raise errors instead of returning (None, None), for `RetryScheduler` (default: False).
+    output:
+        - Tuple of two lists:
+            1. timestamps: List of datetime objects.
+            2. close_prices: List of float values representing close prices.
+        - Returns (None, None) if an error occurs.
+    '''
+    try:
+        data = request_chart(ticker, period1, period2, interval, cookies, headers, session)
+
+        # Extract timestamps and close prices
+        timestamps = data['chart']['result'][0]['timestamp']
+        close_prices = data['chart']['result'][0]['indicators']['quote'][0]['close']
+        
+        # Convert timestamps to datetime
+        timestamps = pd.to_datetime(timestamps, unit='s')
+
+        return timestamps, close_prices
+    except Exception as e:
+        if raise_errors:
+            raise
+        metrics.inc("errors", stage="chart_fetch")
+        log_event("chart_error", f"Error fetching data for {ticker}: {e}", logging.ERROR, ticker=ticker, error=str(e))
+        return None, None
+
+
+# In[ ]:
+
+
+# Fields of the chart response; adjclose is only present for daily and longer intervals
+chart_price_fields = ("open", "high", "low", "close", "adjclose")
+chart_fields = chart_price_fields + ("volume",)
+
+
+def request_chart(ticker, period1, period2, interval="1d", cookies=None, headers=None, session=None):
+    '''
+    Requests the raw chart JSON for a single ticker from Yahoo Finance.
+    input:
+        - ticker, period1, period2, interval, cookies, headers, session: As for `fetch_stock_data`.
+    output:
+        - Dictionary with the decoded chart response. Raises on HTTP errors.
+    '''
+    query_url = (
+        f"{chart_base_url}{ticker}?period1={period1}&period2={period2}"
+        f"&interval={interval}&includePrePost=true&events=div%7Csplit%7Cearn&lang=en-US&region=US"
+    )
+    http = session if session is not None else requests
+    with metrics.timer("chart_fetch", item=ticker):
+        response = http.get(query_url, cookies=cookies, headers=headers, timeout=request_timeout)
+    metrics.inc("http_responses", endpoint="chart", status=response.status_code)
+    response.raise_for_status()
+    with metrics.timer("json_decode"):
+        return response.json()
+
+
+def parse_chart_arrays(data, fields=chart_fields, price_dtype="float32"):
+    '''
+    Extracts bars from a chart response into compact NumPy arrays.
+    input:
+        - data: Decoded chart response (dictionary).
+        - fields: Fields to keep, any of "open", "high", "low", "close", "adjclose", "volume"
+          (default: all).
+        - price_dtype: NumPy dtype of the price arrays (default: "float32").
+    output:
+        - Dictionary of arrays: "timestamp" (int64 seconds since epoch), the price fields
+          (`price_dtype`, NaN where Yahoo has no value) and "volume" (int64, 0 where missing).
+    '''
+    unknown = set(fields) - set(chart_fields)
+    if unknown:
+        raise ValueError(f"Unknown chart fields: {sorted(unknown)}")
+
+    result = data['chart']['result'][0]
+    timestamps = np.asarray(result.get('timestamp', []), dtype="int64")
+    indicators = result.get('indicators', {})
+    quote = (indicators.get('quote') or [{}])[0]
+
+    arrays = {"timestamp": timestamps}
+    for field in fields:
+        if field == "adjclose":
+            values = (indicators.get('adjclose') or [{}])[0].get('adjclose')
+        else:
+            values = quote.get(field)
+        if values is None:
+            values = [None] * len(timestamps)
+
+        if field == "volume":
+            arrays[field] = np.array([0 if v is None else v for v in values], dtype="int64")
+        else:
+            # float() of None is not defined, but NumPy maps None to NaN for float dtypes
+            arrays[field] = np.array(values, dtype="float64").astype(price_dtype, copy=False)
+    return arrays
+
+
+def fetch_chart_arrays(ticker, period1, period2, interval="1d", fields=chart_fields, cookies=None, headers=None,
+                       session=None, price_dtype="float32"):
+    '''
+    Fetches OHLCV and adjusted-close bars for a single ticker as compact NumPy arrays.
+    input:
+        - ticker, period1, period2, interval, cookies, headers, session: As for `fetch_stock_data`.
+        - fields: Fields to keep (default: all of `chart_fields`).
+        - price_dtype: NumPy dtype of the price arrays (default: "float32").
+    output:
+        - Dictionary of arrays as returned by `parse_chart_arrays`, or None if an error occurs.
+    '''
+    try:
+        data = request_chart(ticker, period1, period2, interval, cookies, headers, session)
+        return parse_chart_arrays(data, fields, price_dtype)
+    except Exception as e:
+        metrics.inc("errors", stage="chart_fetch")
+        log_event("chart_error", f"Error fetching data for {ticker}: {e}", logging.ERROR, ticker=ticker, error=str(e))
+        return None
+
+
+def fetch_ohlcv_data(links, period1=None, period2=None, interval="1d", fields=chart_fields, cookies=None,
+                     headers=None, session=None, max_concurrency=max_concurrent_requests, price_dtype="float32"):
+    '''
+    Fetches OHLCV bars for multiple tickers into one frame, laid out like `yfinance.download`.
+    input:
+        - links: List of stock quote links or plain ticker symbols (strings).
+        - period1: Start timestamp (int, seconds since epoch) (default: None, one year ago).
+        - period2: End timestamp (int, seconds since epoch) (default: None, now).
+        - interval: Data granularity (string, e.g., "1d", "1h") (default: "1d").
+        - fields: Fields to keep (default: all of `chart_fields`).
+        - cookies, headers, session: As for `fetch_stock_data`.
+        - max_concurrency: Maximum number of chart requests in flight at once (default: 8).
+        - price_dtype: NumPy dtype of the price columns (default: "float32").
+    output:
+        - pandas DataFrame indexed by UTC timestamp with (field, ticker) column pairs.
+    '''
+    period1, period2 = default_period(period1, period2)
+    tickers = list(dict.fromkeys(link.rstrip('/').split('/')[-1] for link in links))
+
+    def fetch(ticker):
+        return fetch_chart_arrays(
+            ticker, period1, period2, interval, fields, cookies, headers, session, price_dtype
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, int(max_concurrency))) as executor:
+        results = list(executor.map(fetch, tickers))
+
+    frames = {}
+    for ticker, arrays in zip(tickers, results):
+        if arrays is None or len(arrays["timestamp"]) == 0:
+            metrics.inc("tickers", result="missing")
+            log_event("ticker_missing", f"Warning: No data available for {ticker}.", logging.WARNING, ticker=ticker)
+            continue
+        metrics.inc("tickers", result="fetched")
+        index = pd.to_datetime(arrays["timestamp"], unit="s", utc=True)
+        frames[ticker] = pd.DataFrame({field: arrays[field] for field in fields}, index=index)
+
+    if not frames:
+        return pd.DataFrame(columns=pd.MultiIndex.from_tuples([], names=["field", "ticker"]))
+
+    data = pd.concat(frames, axis=1, names=["ticker", "field"]).swaplevel(axis=1)
+    data = data.sort_index().reindex(columns=pd.MultiIndex.from_product([list(fields), list(frames)]))
+    data.columns.names = ["field", "ticker"]
+    data.index.name = "timestamp"
+    return data
+
+
+# In[ ]:
+
+
+spark_base_url = "https://query1.finance.yahoo.com/v7/finance/spark"
+spark_batch_limit = 20  # Maximum number of symbols Yahoo accepts per spark request
+
+# Ranges accepted by the spark endpoint, with their length in days
+spark_ranges = [
+    ("1d", 1), ("5d", 5), ("1mo", 31), ("3mo", 92), ("6mo", 183),
+    ("1y", 366), ("2y", 731), ("5y", 1827), ("10y", 3653),
+]
+
+
+def batch_symbols(symbols, limit=spark_batch_limit):
+    '''
+    Splits symbols into the fewest batches allowed by `limit`, with sizes as even as possible.
+    input:
+        - symbols: List of ticker symbols (strings).
+        - limit: Maximum batch size (int, default: 20).
+    output:
+        - List of symbol lists.
+    '''
+    if not symbols:
+        return []
+    n_batches = -(-len(symbols) // limit)
+    size = -(-len(symbols) // n_batches)
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+def spark_range(period1, now=None):
+    '''
+    Picks the shortest spark range (counted back from now) that still covers `period1`.
+    input:
+        - period1: Start timestamp (int, seconds since epoch).
+        - now: Current timestamp (int, default: None, the current time).
+    output:
+        - Range string, e.g. "1y".
+    '''
+    now = time.time() if now is None else now
+    days = (now - period1) / 86400
+    for name, length in spark_ranges:
+        if days <= length:
+            return name
+    return "max"
+
+
+def parse_spark_response(data):
+    '''
+    Extracts the close series of every symbol in a spark response.
+    input:
+        - data: Decoded spark response (dictionary).
+    output:
+        - Dictionary: symbol -> (epoch timestamps as int64 array, list of close prices).
+          Symbols without bars are left out.
+    '''
+    series = {}
+    for item in (data.get('spark') or {}).get('result') or []:
+        try:
+            result = item['response'][0]
+            timestamps = result['timestamp']
+            close_prices = result['indicators']['quote'][0]['close']
+        except (KeyError, IndexError, TypeError):
+            continue
+        if timestamps:
+            series[item['symbol']] = (np.asarray(timestamps, dtype="int64"), close_prices)
+    return series
+
+
+def fetch_spark_batch(symbols, period1, period2, interval="1d", cookies=None, headers=None, session=None):
+    '''
+    Fetches close prices for several symbols with one spark request.
+    input:
+        - symbols: List of ticker symbols (strings), at most `spark_batch_limit`.
+        - period1, period2, interval, cookies, headers, session: As for `fetch_stock_data`.
+    output:
+        - Dictionary: symbol -> (timestamps as datetimes, close prices) within period1..period2,
+          for the symbols present in the response. Empty if the request fails.
+    '''
+    params = {"symbols": ",".join(symbols), "range": spark_range(period1), "interval": interval}
+    http = session if session is not None else requests
+    try:
+        with metrics.timer("spark_fetch", item=params["symbols"]):
+            response = http.get(spark_base_url, params=params, cookies=cookies, headers=headers, timeout=request_timeout)
+        metrics.inc("http_responses", endpoint="spark", status=response.status_code)
+        response.raise_for_status()
+        with metrics.timer("json_decode"):
+            data = response.json()
+        series = parse_spark_response(data)
+    except Exception as e:
+        metrics.inc("errors", stage="spark_fetch")
+        log_event("batch_error", f"Error fetching batch {params['symbols']}: {e}", logging.ERROR,
+                  symbols=symbols, error=str(e))
+        return {}
+
+    batch = {}
+    for symbol, (epochs, close_prices) in series.items():
+        in_range = (epochs >= period1) & (epochs <= period2)
+        batch[symbol] = (
+            pd.to_datetime(epochs[in_range], unit="s"),
+            [price for price, keep in zip(close_prices, in_range) if keep],
+        )
+    return batch
+
+
+# In[ ]:
+
+
+def fetch_ticker_frame(ticker, period1, period2, interval="1d", cookies=None, headers=None, session=None,
+                       cache=None, incremental=False, max_bars=100, prefetched=None, raise_errors=False):
+    '''
+    Fetches the close prices of one ticker, optionally through the chart cache.
+    input:
+        - ticker: Stock ticker symbol (string).
+        - period1: Start timestamp (int, in seconds since epoch).
+        - period2: End timestamp (int, in seconds since epoch).
+        - interval: Data granularity (string, e.g., "1d", "1h") (default: "1d").
+        - cookies: Dictionary of cookies for the HTTP request (default: None).
+        - headers: Dictionary of headers for the HTTP request (default: None).
+        - session: requests.Session from `create_http_session` (default: None).
+        - cache: Optional `ChartCache` that stores every fetched bar (default: None).
+        - incremental: Only request bars from the cached watermark on (default: False).
+        - max_bars: Number of most recent bars to return (default: 100).
+        - prefetched: Optional (timestamps, close_prices) already fetched by a batch request;
+          no chart request is made when given (default: None).
+        - raise_errors: Raise chart request errors instead of treating them as missing data (default: False).
+    output:
+        - pandas DataFrame with a "timestamp" column and one column named after the ticker,
+          or None if no data is available.
+    '''
+    cached = cache.load(ticker, interval) if cache is not None else None
+
+    start = period1
+    if incremental and cached is not None:
+        # Request the watermark bar again, it may have been fetched before the session closed
+        start = max(period1, cached["watermark"])
+
+    if prefetched is not None:
+        timestamps, close_prices = prefetched
+    else:
+        log_event("chart_fetch", f"Fetching data for {ticker}...", logging.DEBUG, ticker=ticker)
+        timestamps, close_prices = fetch_stock_data(ticker, start, period2, interval, cookies, headers, session,
+                                                    raise_errors)
+
+    if timestamps is None or close_prices is None:
+        if cached is None:
+            metrics.inc("tickers", result="missing")
+            log_event("ticker_missing", f"Warning: No data available for {ticker}.", logging.WARNING, ticker=ticker)
+            return None
+        metrics.inc("tickers", result="cached")
+        log_event("ticker_cached", f"Warning: No new data for {ticker}, using cached bars.", logging.WARNING,
+                  ticker=ticker)
+        timestamps, close_prices = [], []
+    else:
+        metrics.inc("tickers", result="fetched")
+        metrics.inc("bars", len(close_prices), interval=interval)
+        log_event("ticker_fetched", f"Fetched {len(close_prices)} {interval} close prices for {ticker}.",
+                  ticker=ticker, bars=len(close_prices), interval=interval, batch=prefetched is not None)
+
+    if cache is not None:
+        cached = cache.update(ticker, interval, to_epoch_seconds(timestamps), close_prices)
+        epochs = np.asarray(cached["timestamps"], dtype="int64")
+        in_range = (epochs >= period1) & (epochs <= period2)
+        timestamps = pd.to_datetime(epochs[in_range], unit="s")
+        close_prices = np.asarray(cached["close"], dtype="float64")[in_range]
+
+    # Create a DataFrame for this ticker
+    return pd.DataFrame({"timestamp": timestamps[-max_bars:], ticker: close_prices[-max_bars:]})
+
+
+async def fetch_all_tickers_data_async(links, cookies=None, headers=None, max_concurrency=max_concurrent_requests, session=None,
+                                       snap_to=None, period1=None, period2=None, interval="1d", cache=None,
+                                       incremental=False, max_bars=100, fetch_mode="chart", journal=None,
+                                       retry=None):
+    '''
+    Fetches stock price data for multiple tickers concurrently and aligns it by timestamps.
+    input:
+        - links: List of stock quote links (strings).
+        - cookies: Dictionary of cookies for HTTP requests (default: None).
+        - headers: Dictionary of headers for HTTP requests (default: None).
+        - max_concurrency: Maximum number of chart requests in flight at once (default: 8).
+        - session: Shared requests.Session from `create_http_session`, optionally wrapped in `AdaptiveConcurrency`
+          (default: None, one connection per request).
+        - snap_to: Optional pandas frequency (string, e.g., "D") to bucket timestamps into before aligning (default: None).
+        - period1: Start timestamp (int, seconds since epoch) (default: None, one year ago).
+        - period2: End timestamp (int, seconds since epoch) (default: None, now).
+        - interval: Data granularity (string, e.g., "1d", "1h") (default: "1d").
+        - cache: Optional `ChartCache` that stores every fetched bar (default: None).
+        - incremental: Only request bars newer than each ticker's cached watermark (default: False).
+        - max_bars: Number of most recent bars kept per ticker (default: 100).
+        - fetch_mode: "chart" for one chart request per ticker, "batch" to request up to 20 symbols
+          per spark request and fall back to chart requests for omitted symbols, or "auto" to batch
+          whenever there is more than one ticker (default: "chart").
+        - journal: Optional `CheckpointJournal` of completed tickers, see `fetch_all_tickers_data` (default: None).
+        - retry: `RetryScheduler` for the per-ticker chart requests; failed tickers are re-queued
+          with backoff while the others go ahead (default: None, a new one).
+    output:
+        - pandas DataFrame: Contains timestamps as rows and stock tickers as columns, with their respective close prices.
+    '''
+    period1, period2 = default_period(period1, period2)
+
+    max_concurrency = max(1, int(max_concurrency))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    loop = asyncio.get_running_loop()
+    retry = retry if retry is not None else RetryScheduler()
+
+    async def fetch_batch(symbols, batch_start, executor):
+        async with semaphore:
+            return await loop.run_in_executor(
+                executor, fetch_spark_batch, symbols, batch_start, period2, interval, cookies, headers, session
+            )
+
+    async def fetch_one(link, executor, prefetched):
+        # Extract the ticker symbol
+        ticker = link.split('/')[-2]
+        if ticker in completed:
+            return completed[ticker]
+
+        # The fetch blocks on the network, so run it on a worker thread
+        frame = await loop.run_in_executor(
+            executor, fetch_ticker_frame, ticker, period1, period2, interval, cookies, headers,
+            session, cache, incremental, max_bars, prefetched.get(ticker), True
+        )
+        if journal is not None:
+            journal.record_ticker(ticker, frame)
+        return frame
+
+    def give_up(link, error):
+        # Handled like a response without data, so cached bars are still returned. Only tickers
+        # that failed for good are journaled; transient failures are tried again on resume.
+        ticker = link.split('/')[-2]
+        frame = fetch_ticker_frame(ticker, period1, period2, interval, cache=cache, incremental=incremental,
+                                   max_bars=max_bars, prefetched=(None, None))
+        if journal is not None and not is_retryable_error(error):
+            journal.record_ticker(ticker, frame)
+        return frame
+
+    tickers = list(dict.fromkeys(link.split('/')[-2] for link in links))
+
+    # Tickers finished by an interrupted earlier run are taken from the journal
+    completed = journal.completed_tickers(tickers) if journal is not None else {}
+    tickers = [t for t in tickers if t not in completed]
+    use_batch = bool(tickers) and (fetch_mode == "batch" or (fetch_mode == "auto" and len(tickers) > 1))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        prefetched = {}
+        if use_batch:
+            # Incremental runs only need the range back to the oldest watermark
+            batch_start = period1
+            if incremental and cache is not None:
+                watermarks = [(cache.load(t, interval) or {}).get("watermark") for t in tickers]
+                if all(watermarks):
+                    batch_start = max(period1, min(watermarks))
+
+            batches = batch_symbols(tickers)
+            log_event("batch_fetch", f"Fetching {len(tickers)} tickers in {len(batches)} batch requests...",
+                      tickers=len(tickers), batches=len(batches))
+            for batch_result in await asyncio.gather(*(fetch_batch(b, batch_start, executor) for b in batches)):
+                prefetched.update(batch_result)
+            if len(prefetched) < len(tickers):
+                log_event("batch_missing", f"{len(tickers) - len(prefetched)} tickers missing from batch responses, "
+                          "fetching them one by one.", missing=len(tickers) - len(prefetched))
+
+        chart_host = urlparse(chart_base_url).netloc
+        results = await retry.run(
+            links, lambda link: fetch_one(link, executor, prefetched), workers=max_concurrency,
+            host=lambda link: chart_host, stage="fetch", on_failure=give_up,
+        )
+
+    if cache is not None:
+        cache.evict()
+
+    # Keep the order of `links` so that duplicate tickers resolve as before
+    all_data = [df for df in results if df is not None]
+
+    return align_ticker_series(all_data, snap_to=snap_to)
+
+
+# In[ ]:
+
+
+def default_period(period1=None, period2=None):
+    '''
+    Fills in missing period bounds with the default window: the year up to now.
+    input:
+        - period1: Start timestamp (int, seconds since epoch) or None.
+        - period2: End timestamp (int, seconds since epoch) or None.
+    output:
+        - Tuple (period1, period2) of ints.
+    '''
+    if period2 is None:
+        period2 = int(datetime.now().timestamp())  # Current timestamp
+    if period1 is None:
+        period1 = int((datetime.fromtimestamp(period2) - timedelta(days=365)).timestamp())  # 1 year earlier
+    return period1, period2
+
+
+def to_epoch_seconds(timestamps):
+    '''
+    Converts timestamps to integer seconds since the epoch.
+    input:
+        - timestamps: Sequence of datetime-like values.
+    output:
+        - NumPy int64 array of seconds since epoch.
+    '''
+    if len(timestamps) == 0:
+        return np.array([], dtype="int64")
+    return pd.DatetimeIndex(timestamps).to_numpy(dtype="datetime64[s]").astype("int64")
+
+
+class ChartCache:
+    '''
+    Persistent per-ticker cache of fetched chart bars, keyed by ticker and interval.
+    Each entry is a JSON file holding the bars, the timestamp of the newest bar
+    (the watermark for incremental requests) and the time it was last fetched.
+    input:
+        - cache_dir: Directory for the cache files (default: "chart_cache").
+        - ttl: Entries not refreshed for this long are evicted (timedelta, default: 30 days).
+        - max_bytes: Total cache size above which the least recently fetched entries are evicted (default: 256 MiB).
+    '''
+
+    def __init__(self, cache_dir=chart_cache_dir, ttl=timedelta(days=30), max_bytes=256 * 2**20):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def path(self, ticker, interval):
+        '''
+        Returns the file path of a ticker's entry.
+        '''
+        return os.path.join(self.cache_dir, interval, quote(ticker, safe="") + ".json")
+
+    def load(self, ticker, interval):
+        '''
+        Loads a ticker's cached entry.
+        output:
+            - Dictionary with "timestamps", "close", "watermark" and "fetched_at", or None if not cached.
+        '''
+        try:
+            with open(self.path(ticker, interval), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def update(self, ticker, interval, timestamps, close_prices):
+        '''
+        Merges newly fetched bars into a ticker's entry; fetched bars replace cached bars
+        with the same timestamp.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - interval: Data granularity (string).
+            - timestamps: Bar timestamps in seconds since epoch (sequence of ints).
+            - close_prices: Close prices matching `timestamps` (sequence of floats or None).
+        output:
+            - The updated entry (dictionary).
+        '''
+        bars = {}
+        entry = self.load(ticker, interval)
+        if entry is not None:
+            bars.update(zip(entry["timestamps"], entry["close"]))
+        bars.update(zip((int(t) for t in timestamps), (_json_float(c) for c in close_prices)))
+
+        ordered = sorted(bars)
+        entry = {
+            "ticker": ticker,
+            "interval": interval,
+            "timestamps": ordered,
+            "close": [bars[t] for t in ordered],
+            "watermark": ordered[-1] if ordered else None,
+            "fetched_at": int(time.time()),
+        }
+
+        # Write to a temporary file first so a crash never leaves a truncated entry
+        path = self.path(ticker, interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(temp_path, path)
+        return entry
+
+    def evict(self, now=None):
+        '''
+        Removes entries older than the TTL, then the least recently fetched entries
+        until the cache fits into `max_bytes`.
+        output:
+            - List of removed file paths.
+        '''
+        now = time.time() if now is None else now
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+        removed = []
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in sorted(entries):
+            if now - mtime > self.ttl.total_seconds() or total > self.max_bytes:
+                os.remove(path)
+                removed.append(path)
+                total -= size
+        return removed
+
+
+def _json_float(value):
+    # JSON has no NaN, missing prices are stored as null
+    return None if value is None or value != value else float(value)
+
+
+# In[14]:
+
+
+# Save extracted links to CSV, excluding links with invalid tickers
+@metrics.timed("csv_write")
+def save_links_to_csv(links, filename="extracted_links.csv"):
+    '''
+    Saves extracted stock quote links to a CSV file.
+    input:
+        - links: List of valid stock quote links (strings).
+        - filename: Output file path (string) for the CSV file (default: "extracted_links.csv").
+    output:
+        - None. Saves the links to the specified CSV file.
+    '''
+    with open(filename, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Link"])  # Write header
+        for link in links:
+            writer.writerow([link])
     
-    # Close the driver
-    print("Script complete. Closing the browser.")
-    driver.quit()
+    log_event("links_saved", f"Filtered links saved to {filename}", path=filename)
+
+
+def load_links_from_csv(filename="extracted_links.csv"):
+    '''
+    Reads quote links written by `save_links_to_csv` or `tee_links_to_csv`.
+    input:
+        - filename: Links CSV file path (string) (default: "extracted_links.csv").
+    output:
+        - List of stock quote links (strings), in file order.
+    '''
+    with open(filename, newline="", encoding="utf-8") as file:
+        rows = csv.reader(file)
+        next(rows, None)  # Skip header
+        return [row[0] for row in rows if row and row[0]]
+
+
+# In[15]:
+
+
+# Save the aggregated data to CSV
+@metrics.timed("csv_write")
+def save_data_to_csv(data, filename="stock_data.csv"):
+    '''
+    Saves a pandas DataFrame containing stock data to a CSV file.
+    input:
+        - data: pandas DataFrame with stock data.
+        - filename: Output file path (string) for the CSV file (default: "stock_data.csv").
+    output:
+        - None. Saves the DataFrame to the specified file.
+    '''
+    data.to_csv(filename, index=False)
+    log_event("data_saved", f"Stock data saved to {filename}", path=filename, rows=len(data))
+
+
+# In[ ]:
+
+
+def _import_pyarrow():
+    # pyarrow is only needed for the columnar backend, so import it on first use
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.feather
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("The columnar backend requires pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def _partition_file(root, month, file_format):
+    extension = "parquet" if file_format == "parquet" else "arrow"
+    return os.path.join(root, f"month={month}", f"part-0.{extension}")
+
+
+def _read_partition(path, file_format):
+    pa = _import_pyarrow()
+    if file_format == "parquet":
+        return pa.parquet.read_table(path).to_pandas()
+    return pa.feather.read_table(path).to_pandas()
+
+
+# Save the aggregated data to month-partitioned Parquet or Arrow files
+@metrics.timed("columnar_write")
+def save_data_to_columnar(data, root="stock_data", file_format="parquet", price_dtype="float32"):
+    '''
+    Appends a pandas DataFrame containing stock data to a month-partitioned columnar dataset.
+    Rows are merged into the existing partition of their month: new prices replace stored
+    prices with the same timestamp, and new tickers are added as columns.
+    input:
+        - data: pandas DataFrame with a "timestamp" column and one price column per ticker.
+        - root: Dataset directory (string) (default: "stock_data").
+        - file_format: "parquet" (compressed) or "arrow" (uncompressed Arrow IPC, zero-copy when
+          memory-mapped) (default: "parquet").
+        - price_dtype: Storage type of the price columns, "float32" or "float64" (default: "float32").
+    output:
+        - List of written partition file paths.
+    '''
+    if file_format not in ("parquet", "arrow"):
+        raise ValueError(f"Unsupported columnar format: {file_format}")
+    pa = _import_pyarrow()
+
+    frame = data.copy()
+    frame["timestamp"] = pd.to_datetime(frame["timestamp"]).astype("datetime64[ns]")
+    months = frame["timestamp"].dt.strftime("%Y-%m")
+
+    written = []
+    for month, part in frame.groupby(months):
+        path = _partition_file(root, month, file_format)
+        part = part.set_index("timestamp")
+
+        if os.path.exists(path):
+            existing = _read_partition(path, file_format).set_index("timestamp")
+            columns = list(existing.columns) + [c for c in part.columns if c not in existing.columns]
+            part = part.combine_first(existing)[columns]
+
+        part = part.sort_index().astype(price_dtype).reset_index()
+        table = pa.Table.from_pandas(part, preserve_index=False)
+
+        # Write next to the partition and swap it in, so readers never see a partial file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        if file_format == "parquet":
+            pa.parquet.write_table(table, temp_path, compression="zstd")
+        else:
+            pa.feather.write_feather(table, temp_path, compression="uncompressed")
+        os.replace(temp_path, path)
+        written.append(path)
+
+    log_event("data_saved", f"Stock data saved to {root} ({len(written)} {file_format} partitions)",
+              path=root, partitions=len(written), file_format=file_format)
+    return written
+
+
+@metrics.timed("columnar_read")
+def load_data_from_columnar(root="stock_data", tickers=None, start=None, end=None, file_format="parquet",
+                            memory_map=True):
+    '''
+    Loads selected tickers and dates from a dataset written by `save_data_to_columnar`,
+    reading only the needed partitions and columns.
+    input:
+        - root: Dataset directory (string) (default: "stock_data").
+        - tickers: List of tickers to load (default: None, all tickers).
+        - start: First timestamp to include (datetime-like) (default: None).
+        - end: Last timestamp to include (datetime-like) (default: None).
+        - file_format: "parquet" or "arrow" (default: "parquet").
+        - memory_map: Memory-map the files instead of reading them into buffers (default: True).
+    output:
+        - pandas DataFrame with a "timestamp" column and the selected ticker columns, sorted by timestamp.
+    '''
+    pa = _import_pyarrow()
+    ds = pa.dataset
+
+    dataset_format = "parquet" if file_format == "parquet" else "ipc"
+    partitioning = ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+    filesystem = pa.fs.LocalFileSystem(use_mmap=memory_map)
+    dataset = ds.dataset(root, format=dataset_format, partitioning=partitioning, filesystem=filesystem)
+
+    # Partitions written in different runs can hold different tickers
+    fragments = list(dataset.get_fragments())
+    if not fragments:
+        return pd.DataFrame(columns=["timestamp"] + list(tickers or []))
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in fragments] + [partitioning.schema])
+    dataset = ds.dataset(root, format=dataset_format, partitioning=partitioning, filesystem=filesystem,
+                         schema=schema)
+
+    available = [name for name in schema.names if name not in ("timestamp", "month")]
+    selected = available if tickers is None else [t for t in tickers if t in available]
+
+    # Month bounds prune whole partitions, timestamp bounds filter rows inside them
+    condition = None
+    for bound, op in ((start, "ge"), (end, "le")):
+        if bound is None:
+            continue
+        bound = pd.Timestamp(bound)
+        month = bound.strftime("%Y-%m")
+        if op == "ge":
+            clause = (ds.field("month") >= month) & (ds.field("timestamp") >= bound.to_datetime64())
+        else:
+            clause = (ds.field("month") <= month) & (ds.field("timestamp") <= bound.to_datetime64())
+        condition = clause if condition is None else condition & clause
+
+    table = dataset.to_table(columns=["timestamp"] + selected, filter=condition)
+    frame = table.to_pandas().sort_values("timestamp").reset_index(drop=True)
+
+    # Requested tickers that were never stored come back as empty columns
+    for ticker in tickers or []:
+        if ticker not in frame.columns:
+            frame[ticker] = np.nan
+    if tickers is not None:
+        frame = frame[["timestamp"] + list(tickers)]
+    return frame
+
+
+# ## 4.1 Streaming Pipeline
+
+# In[ ]:
+
+
+def iter_ticker_frames(links, window=max_concurrent_requests, period1=None, period2=None, interval="1d",
+                       cookies=None, headers=None, session=None, cache=None, incremental=False, max_bars=100):
+    '''
+    Fetches tickers with at most `window` requests in flight and yields each result as soon as it
+    completes. Links are pulled lazily, so `links` can be a discovery generator.
+    input:
+        - links: Iterable of stock quote links (strings).
+        - window: Maximum number of tickers being fetched at once (default: 8).
+        - period1, period2, interval, cookies, headers, session, cache, incremental, max_bars:
+          As for `fetch_all_tickers_data`.
+    output:
+        - Yields (ticker, DataFrame) tuples in completion order; each ticker at most once.
+    '''
+    period1, period2 = default_period(period1, period2)
+    window = max(1, int(window))
+    links = iter(links)
+    seen = set()
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=window) as executor:
+
+        def submit_next():
+            for link in links:
+                ticker = link.split('/')[-2]
+                if ticker in seen:
+                    continue
+                seen.add(ticker)
+                future = executor.submit(
+                    fetch_ticker_frame, ticker, period1, period2, interval, cookies, headers,
+                    session, cache, incremental, max_bars
+                )
+                pending[future] = link
+                return True
+            return False
+
+        while len(pending) < window and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                link = pending.pop(future)
+                try:
+                    frame = future.result()
+                except Exception as e:
+                    metrics.inc("errors", stage="fetch")
+                    log_event("fetch_error", f"Error processing {link}: {e}", logging.ERROR, url=link, error=str(e))
+                    frame = None
+                # Refill the window before handing the result to the consumer
+                submit_next()
+                if frame is not None:
+                    yield frame.columns[1], frame
+
+
+class LongCsvSink:
+    '''
+    Appends per-ticker series to a long-format CSV file (timestamp, ticker, close) and flushes
+    after every ticker, so completed tickers are on disk even if the run dies.
+    input:
+        - filename: Output file path (default: "stock_data_long.csv").
+        - append: Keep rows already in the file instead of starting a new one (default: False).
+    '''
+
+    def __init__(self, filename="stock_data_long.csv", append=False):
+        self.filename = filename
+        write_header = not (append and os.path.exists(filename) and os.path.getsize(filename) > 0)
+        self._file = open(filename, mode="a" if append else "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if write_header:
+            self._writer.writerow(["timestamp", "ticker", "close"])
+        self.tickers_written = 0
+
+    def write(self, ticker, frame):
+        '''
+        Writes one ticker's series and flushes it to disk.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - frame: DataFrame with a "timestamp" column and a column named after the ticker.
+        '''
+        with metrics.timer("csv_write", item=ticker):
+            timestamps = pd.DatetimeIndex(frame["timestamp"]).strftime("%Y-%m-%d %H:%M:%S")
+            self._writer.writerows(zip(timestamps, [ticker] * len(frame), frame[ticker].tolist()))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self.tickers_written += 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def load_long_csv(filename="stock_data_long.csv", snap_to=None):
+    '''
+    Builds the aligned wide frame from a long-format file written by `LongCsvSink`.
+    input:
+        - filename: Long-format CSV file path (default: "stock_data_long.csv").
+        - snap_to: Optional pandas frequency to bucket timestamps into (default: None).
+    output:
+        - pandas DataFrame: Timestamps as rows and tickers as columns.
+    '''
+    long_data = pd.read_csv(filename, parse_dates=["timestamp"], keep_default_na=False, na_values=[""])
+    frames = [
+        group[["timestamp", "close"]].rename(columns={"close": ticker})
+        for ticker, group in long_data.groupby("ticker", sort=False)
+    ]
+    return align_ticker_series(frames, snap_to=snap_to)
+
+
+def run_streaming_pipeline(links, filename="stock_data_long.csv", window=max_concurrent_requests, append=False,
+                           **fetch_options):
+    '''
+    Streams links through the fetcher into a `LongCsvSink`; memory holds only the in-flight window.
+    input:
+        - links: Iterable of stock quote links, e.g. `iter_quote_links(...)`.
+        - filename: Long-format CSV output path (default: "stock_data_long.csv").
+        - window: Maximum number of tickers being fetched at once (default: 8).
+        - append: Append to an existing output file (default: False).
+        - **fetch_options: Keyword arguments for `iter_ticker_frames` (period1, session, cache, ...).
+    output:
+        - Number of tickers written (int).
+    '''
+    with LongCsvSink(filename, append=append) as sink:
+        for ticker, frame in iter_ticker_frames(links, window=window, **fetch_options):
+            sink.write(ticker, frame)
+            log_event("rows_written", f"Wrote {len(frame)} rows for {ticker} to {filename}", ticker=ticker,
+                      rows=len(frame), path=filename)
+    log_event("stream_complete", f"Streamed {sink.tickers_written} tickers to {filename}",
+              tickers=sink.tickers_written, path=filename)
+    return sink.tickers_written
+
+
+def tee_links_to_csv(links, filename="extracted_links.csv"):
+    '''
+    Passes links through unchanged while appending each one to a links CSV file.
+    input:
+        - links: Iterable of stock quote links (strings).
+        - filename: Output file path (default: "extracted_links.csv").
+    output:
+        - Yields the links.
+    '''
+    with open(filename, mode="w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Link"])  # Write header
+        for link in links:
+            writer.writerow([link])
+            file.flush()
+            yield link
+
+
+# ## 4.2 Checkpoint Journal
+
+# In[ ]:
+
+
+def _encode_bars(frame, ticker):
+    # JSON of a `fetch_ticker_frame` result: epoch seconds and close prices
+    return json.dumps({
+        "t": to_epoch_seconds(frame["timestamp"]).tolist(),
+        "c": [_json_float(value) for value in frame[ticker]],
+    })
+
+
+def _decode_bars(bars, ticker):
+    bars = json.loads(bars)
+    return pd.DataFrame({
+        "timestamp": pd.to_datetime(np.asarray(bars["t"], dtype="int64"), unit="s"),
+        ticker: np.asarray(bars["c"], dtype="float64"),
+    })
+
+
+class CheckpointJournal:
+    '''
+    SQLite journal of the industry pages and tickers a run has completed, so an interrupted
+    run can be resumed without requesting them again. Every entry is committed as soon as
+    it is recorded; the journal is safe to share between worker threads.
+    input:
+        - path: SQLite database file (default: "run_journal.sqlite").
+        - resume: Keep the entries of the previous run; otherwise the journal starts empty (default: False).
+    '''
+
+    def __init__(self, path=journal_file, resume=False):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, links TEXT, completed_at REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS tickers (ticker TEXT PRIMARY KEY, status TEXT, "
+                             "bars TEXT, completed_at REAL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        if not resume:
+            self.reset()
+        summary = self.summary()
+        log_event("journal_open", f"Checkpoint journal {path}: {summary['pages']} pages and "
+                  f"{summary['tickers']} tickers already completed", path=path, resume=resume, **summary)
+
+    def reset(self):
+        '''
+        Removes all entries, e.g. at the start of a fresh (not resumed) run.
+        '''
+        with self._lock, self._db:
+            for table in ("pages", "tickers", "meta"):
+                self._db.execute(f"DELETE FROM {table}")
+
+    def page_links(self, url):
+        '''
+        Returns the quote links recorded for a completed page, or None if the page is still open.
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT links FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        metrics.inc("journal_skips", kind="page")
+        log_event("page_resumed", f"Skipping completed page {url}", logging.DEBUG, url=url)
+        return json.loads(row[0])
+
+    def record_page(self, url, links):
+        '''
+        Marks an industry page as completed together with the quote links found on it.
+        '''
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?)", (url, json.dumps(list(links)), time.time()))
+
+    def completed_tickers(self, tickers):
+        '''
+        Returns the completed tickers among `tickers`.
+        input:
+            - tickers: Iterable of ticker symbols (strings).
+        output:
+            - Dictionary {ticker: DataFrame as returned by `fetch_ticker_frame`, or None for tickers without data}.
+        '''
+        wanted = set(tickers)
+        with self._lock:
+            rows = self._db.execute("SELECT ticker, status, bars FROM tickers").fetchall()
+
+        completed = {}
+        for ticker, status, bars in rows:
+            if ticker not in wanted:
+                continue
+            if status == "ok":
+                completed[ticker] = _decode_bars(bars, ticker)
+            else:
+                completed[ticker] = None
+        if completed:
+            metrics.inc("journal_skips", len(completed), kind="ticker")
+            log_event("tickers_resumed", f"Skipping {len(completed)} completed tickers", tickers=len(completed))
+        return completed
+
+    def record_ticker(self, ticker, frame):
+        '''
+        Marks a ticker as completed.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - frame: DataFrame from `fetch_ticker_frame`, or None if the ticker has no data.
+        '''
+        status, bars = ("missing", None) if frame is None else ("ok", _encode_bars(frame, ticker))
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO tickers VALUES (?, ?, ?, ?)", (ticker, status, bars, time.time()))
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def summary(self):
+        '''
+        Returns the number of completed pages and tickers.
+        '''
+        with self._lock:
+            pages = self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            tickers = self._db.execute("SELECT COUNT(*) FROM tickers").fetchone()[0]
+        return {"pages": pages, "tickers": tickers}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ## 4.3 Time-series Store
+
+# In[ ]:
+
+
+def _epoch_bound(value):
+    # Query bounds as epoch seconds; datetimes and date strings without a zone are UTC
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return int(timestamp.timestamp())
+
+
+class PriceStore:
+    '''
+    Embedded SQLite store of close prices in long format, one row per (ticker, interval, timestamp).
+    The rows are clustered on that key (a WITHOUT ROWID table), so the bars of one ticker and
+    date range are a single index range scan however many symbols and years the store holds.
+    Writes are idempotent upserts: storing the same run twice changes nothing, a newer price
+    for a stored timestamp replaces the old one.
+    input:
+        - path: SQLite database file (default: "prices.sqlite").
+    '''
+
+    def __init__(self, path=price_store_file):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS bars (ticker TEXT NOT NULL, interval TEXT NOT NULL, ts INTEGER NOT NULL, "
+                "close REAL, PRIMARY KEY (ticker, interval, ts)) WITHOUT ROWID"
+            )
+            # One row per series, so listing tickers and their ranges never scans the bars
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS series (ticker TEXT NOT NULL, interval TEXT NOT NULL, first_ts INTEGER, "
+                "last_ts INTEGER, PRIMARY KEY (ticker, interval)) WITHOUT ROWID"
+            )
+
+    def upsert(self, ticker, timestamps, close_prices, interval="1d"):
+        '''
+        Writes the bars of one ticker.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - timestamps: Sequence of datetime-like values.
+            - close_prices: Sequence of close prices; NaN and None are skipped.
+            - interval: Bar interval (default: "1d").
+        output:
+            - Number of bars written (int).
+        '''
+        return self.upsert_frame(pd.DataFrame({"timestamp": timestamps, ticker: close_prices}), interval)
+
+    @metrics.timed("store_write")
+    def upsert_frame(self, data, interval="1d"):
+        '''
+        Writes a wide frame as returned by `fetch_all_tickers_data`.
+        input:
+            - data: pandas DataFrame with a "timestamp" column and one close price column per ticker.
+            - interval: Bar interval (default: "1d").
+        output:
+            - Number of bars written (int).
+        '''
+        epochs = to_epoch_seconds(data["timestamp"])
+        rows, series = [], []
+        for ticker in data.columns[1:]:
+            values = np.asarray(data[ticker], dtype="float64")
+            present = ~np.isnan(values)
+            if not present.any():
+                continue
+            ticker_epochs = epochs[present]
+            rows.extend(zip(itertools.repeat(ticker), itertools.repeat(interval), ticker_epochs.tolist(),
+                            values[present].tolist()))
+            series.append((ticker, interval, int(ticker_epochs.min()), int(ticker_epochs.max())))
+
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO bars VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (ticker, interval, ts) DO UPDATE SET close = excluded.close", rows,
+            )
+            self._db.executemany(
+                "INSERT INTO series VALUES (?, ?, ?, ?) ON CONFLICT (ticker, interval) DO UPDATE SET "
+                "first_ts = min(first_ts, excluded.first_ts), last_ts = max(last_ts, excluded.last_ts)", series,
+            )
+        metrics.inc("store_rows", len(rows), interval=interval)
+        log_event("store_upsert", f"Upserted {len(rows)} bars of {len(series)} tickers into {self.path}",
+                  path=self.path, rows=len(rows), tickers=len(series), interval=interval)
+        return len(rows)
+
+    def tickers(self, interval="1d"):
+        '''
+        Returns the stored tickers of an interval (list of strings, sorted).
+        '''
+        with self._lock:
+            rows = self._db.execute("SELECT ticker FROM series WHERE interval = ? ORDER BY ticker", (interval,))
+            return [row[0] for row in rows]
+
+    def time_range(self, ticker, interval="1d"):
+        '''
+        Returns the first and last stored timestamp of a ticker as epoch seconds, or None if it has no bars.
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT first_ts, last_ts FROM series WHERE ticker = ? AND interval = ?",
+                                   (ticker, interval)).fetchone()
+        return tuple(row) if row else None
+
+    def get(self, ticker, timestamp, interval="1d"):
+        '''
+        Point lookup of one close price.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - timestamp: Bar timestamp (epoch seconds or datetime-like).
+            - interval: Bar interval (default: "1d").
+        output:
+            - Close price (float), or None if there is no bar at that timestamp.
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT close FROM bars WHERE ticker = ? AND interval = ? AND ts = ?",
+                                   (ticker, interval, _epoch_bound(timestamp))).fetchone()
+        return row[0] if row else None
+
+    def series(self, ticker, start=None, end=None, interval="1d"):
+        '''
+        Range lookup of one ticker.
+        input:
+            - ticker: Stock ticker symbol (string).
+            - start, end: Inclusive bounds (epoch seconds or datetime-like) (default: None, unbounded).
+            - interval: Bar interval (default: "1d").
+        output:
+            - pandas DataFrame with a "timestamp" column and a column named after the ticker.
+        '''
+        start, end = _epoch_bound(start), _epoch_bound(end)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT ts, close FROM bars WHERE ticker = ? AND interval = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (ticker, interval, -2**63 if start is None else start, 2**63 - 1 if end is None else end),
+            ).fetchall()
+        bars = np.array(rows, dtype="float64").reshape(-1, 2)
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(bars[:, 0].astype("int64"), unit="s"),
+            ticker: bars[:, 1],
+        })
+
+    @metrics.timed("store_query")
+    def query(self, tickers=None, start=None, end=None, interval="1d", snap_to=None):
+        '''
+        Returns the aligned wide frame of a ticker set and date range.
+        input:
+            - tickers: List of ticker symbols (default: None, all stored tickers of the interval).
+            - start, end: Inclusive bounds (epoch seconds or datetime-like) (default: None, unbounded).
+            - interval: Bar interval (default: "1d").
+            - snap_to: Optional pandas frequency to bucket timestamps into, see `align_ticker_series` (default: None).
+        output:
+            - pandas DataFrame: Timestamps as rows and the tickers with bars in the range as columns,
+              in the order of `tickers`.
+        '''
+        if tickers is None:
+            tickers = self.tickers(interval)
+        frames = [self.series(ticker, start, end, interval) for ticker in dict.fromkeys(tickers)]
+        return align_ticker_series([frame for frame in frames if len(frame)], snap_to=snap_to)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# ## 4.4 Chunked Intraday History
+
+# In[ ]:
+
+
+def intraday_windows(period1, period2, interval, now=None):
+    '''
+    Splits a time range into windows short enough for Yahoo to return every intraday bar.
+    The windows are cut in epoch seconds, so a DST change of the exchange cannot open a gap
+    between two of them, and consecutive windows overlap by one bar so a bar on a boundary
+    is never lost.
+    input:
+        - period1: Start timestamp (int, seconds since epoch).
+        - period2: End timestamp (int, seconds since epoch).
+        - interval: Intraday interval, a key of `intraday_intervals` (string, e.g., "1h", "5m").
+        - now: Current time (int, seconds since epoch) (default: None, the current time).
+    output:
+        - List of (start, end) tuples in seconds since epoch, oldest first. A range that starts
+          before the oldest bar Yahoo keeps for the interval is shortened to it.
+    '''
+    if interval not in intraday_intervals:
+        raise ValueError(f"Not an intraday interval: {interval}")
+    bar, span_days, lookback_days = intraday_intervals[interval]
+    now = int(time.time()) if now is None else now
+
+    # One bar inside the limit; Yahoo rejects a start exactly on it
+    earliest = now - lookback_days * 86400 + bar
+    if period1 < earliest:
+        log_event("intraday_clipped", f"Yahoo keeps {lookback_days} days of {interval} bars, starting the range at "
+                  f"{pd.to_datetime(earliest, unit='s'):%Y-%m-%d %H:%M} UTC.", logging.WARNING,
+                  interval=interval, requested=period1, start=earliest)
+        period1 = earliest
+
+    if period1 >= period2:
+        return []
+
+    # Each window starts one bar before the end of the previous one
+    span = span_days * 86400
+    starts = range(period1, max(period2 - bar, period1 + 1), span - bar)
+    return [(start, min(start + span, period2)) for start in starts]
+
+
+def fetch_intraday_chunk(ticker, start, end, interval, cookies=None, headers=None, session=None):
+    '''
+    Fetches the close prices of one ticker for one window of `intraday_windows`. Raises on errors, for `RetryScheduler`.
+    input:
+        - ticker: Stock ticker symbol (string).
+        - start, end: Window bounds (int, seconds since epoch).
+        - interval, cookies, headers, session: As for `fetch_stock_data`.
+    output:
+        - Tuple (int64 array of seconds since epoch, float64 array of close prices,
+          IANA time zone name of the exchange or None).
+    '''
+    data = request_chart(ticker, start, end, interval, cookies, headers, session)
+    arrays = parse_chart_arrays(data, fields=("close",), price_dtype="float64")
+    meta = data['chart']['result'][0].get('meta') or {}
+    return arrays["timestamp"], arrays["close"], meta.get("exchangeTimezoneName")
+
+
+def stitch_intraday_chunks(chunks):
+    '''
+    Joins the bars of consecutive windows into one series. Bars are matched on their UTC
+    timestamp, so the exchange's DST offset plays no part; a bar returned by two windows is
+    kept once, preferring the window that has a price for it, then the later window.
+    input:
+        - chunks: List of (timestamps, close_prices) pairs, timestamps in seconds since epoch, oldest window first.
+    output:
+        - Tuple (int64 timestamps, float64 close prices), sorted and without duplicates.
+    '''
+    if not chunks:
+        return np.array([], dtype="int64"), np.array([], dtype="float64")
+    epochs = np.concatenate([np.asarray(timestamps, dtype="int64") for timestamps, _ in chunks])
+    closes = np.concatenate([np.asarray(prices, dtype="float64") for _, prices in chunks])
+    window = np.repeat(np.arange(len(chunks)), [len(timestamps) for timestamps, _ in chunks])
+
+    # Sort by timestamp, then by having a price, then by window; the last row of each timestamp wins
+    order = np.lexsort((window, ~np.isnan(closes), epochs))
+    epochs, closes = epochs[order], closes[order]
+    last = np.append(epochs[1:] != epochs[:-1], True)
+    return epochs[last], closes[last]
+
+
+def to_exchange_time(timestamps, timezone):
+    '''
+    Converts UTC timestamps to the local time of an exchange. The offset of every bar comes
+    from the time zone database, not from the single `gmtoffset` of the chart metadata, so
+    bars before and after a DST change each get the right one.
+    input:
+        - timestamps: Naive UTC datetimes (e.g. a "timestamp" column) or seconds since epoch.
+        - timezone: IANA time zone name (string, e.g. "America/New_York").
+    output:
+        - Time zone aware pandas DatetimeIndex.
+    '''
+    timestamps = pd.Series(timestamps)
+    if pd.api.types.is_numeric_dtype(timestamps):
+        return pd.DatetimeIndex(pd.to_datetime(timestamps, unit="s", utc=True)).tz_convert(timezone)
+    return pd.DatetimeIndex(timestamps).tz_localize("UTC").tz_convert(timezone)
+
+
+def fetch_intraday_history(links, period1=None, period2=None, interval="1h", cookies=None, headers=None,
+                           session=None, max_concurrency=max_concurrent_requests, retry=None, now=None):
+    '''
+    Fetches long intraday histories: the range is split with `intraday_windows`, all windows
+    of all tickers are fetched concurrently and each ticker's windows are stitched back into
+    one series. Synchronous wrapper around `fetch_intraday_history_async`.
+    input:
+        - links: List of stock quote links or plain ticker symbols (strings).
+        - period1: Start timestamp (int, seconds since epoch) (default: None, one year ago).
+        - period2: End timestamp (int, seconds since epoch) (default: None, now).
+        - interval: Intraday interval, a key of `intraday_intervals` (default: "1h").
+        - cookies, headers, session: As for `fetch_stock_data`.
+        - max_concurrency: Maximum number of chart requests in flight at once (default: 8).
+        - retry: `RetryScheduler` for the window requests (default: None, a new one).
+        - now: Current time for the lookback limit, see `intraday_windows` (default: None).
+    output:
+        - pandas DataFrame: UTC timestamps as rows and tickers as columns with their close prices.
+          `attrs["exchange_timezones"]` maps each ticker to its exchange time zone, for `to_exchange_time`.
+    '''
+    return run_coroutine(fetch_intraday_history_async(
+        links, period1=period1, period2=period2, interval=interval, cookies=cookies, headers=headers,
+        session=session, max_concurrency=max_concurrency, retry=retry, now=now,
+    ))
+
+
+async def fetch_intraday_history_async(links, period1=None, period2=None, interval="1h", cookies=None, headers=None,
+                                       session=None, max_concurrency=max_concurrent_requests, retry=None, now=None):
+    '''
+    Fetches long intraday histories concurrently, see `fetch_intraday_history`.
+    A window that fails for good leaves a gap in its ticker's series, the other windows are kept.
+    '''
+    period1, period2 = default_period(period1, period2)
+    windows = intraday_windows(period1, period2, interval, now)
+    tickers = list(dict.fromkeys(link.rstrip('/').split('/')[-1] for link in links))
+    items = [(ticker, start, end) for ticker in tickers for start, end in windows]
+
+    max_concurrency = max(1, int(max_concurrency))
+    loop = asyncio.get_running_loop()
+    retry = retry if retry is not None else RetryScheduler()
+    chart_host = urlparse(chart_base_url).netloc
+    log_event("intraday_fetch", f"Fetching {interval} bars of {len(tickers)} tickers in {len(items)} windows...",
+              interval=interval, tickers=len(tickers), windows=len(windows))
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        async def fetch(item):
+            ticker, start, end = item
+            return await loop.run_in_executor(
+                executor, fetch_intraday_chunk, ticker, start, end, interval, cookies, headers, session
+            )
+
+        results = await retry.run(items, fetch, workers=max_concurrency, host=lambda item: chart_host,
+                                  stage="intraday")
+
+    chunks = {ticker: [] for ticker in tickers}
+    timezones = {}
+    for (ticker, start, end), result in zip(items, results):
+        if result is None:
+            metrics.inc("intraday_gaps")
+            log_event("intraday_gap", f"Window {pd.to_datetime(start, unit='s')} - {pd.to_datetime(end, unit='s')} "
+                      f"of {ticker} failed, its bars are missing.", logging.WARNING, ticker=ticker, start=start, end=end)
+            continue
+        epochs, closes, timezone = result
+        chunks[ticker].append((epochs, closes))
+        timezones[ticker] = timezone or timezones.get(ticker)
+
+    all_data = []
+    for ticker in tickers:
+        epochs, closes = stitch_intraday_chunks(chunks[ticker])
+        in_range = (epochs >= period1) & (epochs <= period2)
+        epochs, closes = epochs[in_range], closes[in_range]
+        if len(epochs) == 0:
+            metrics.inc("tickers", result="missing")
+            log_event("ticker_missing", f"Warning: No data available for {ticker}.", logging.WARNING, ticker=ticker)
+            continue
+        metrics.inc("tickers", result="fetched")
+        metrics.inc("bars", len(epochs), interval=interval)
+        log_event("ticker_fetched", f"Fetched {len(epochs)} {interval} close prices for {ticker}.",
+                  ticker=ticker, bars=len(epochs), interval=interval, windows=len(chunks[ticker]))
+        all_data.append(pd.DataFrame({"timestamp": pd.to_datetime(epochs, unit="s"), ticker: closes}))
+
+    data = align_ticker_series(all_data)
+    data.attrs["exchange_timezones"] = {ticker: timezones.get(ticker) for ticker in data.columns[1:]}
+    return data
+
+
+# ## 5. Main Workflow
+
+# In[16]:
+
+
+def discover_links(session, discovery="auto", browser_workers=1, journal=None, cache=None):
+    '''
+    Runs link discovery; the browser is only started when the chosen mode needs it.
+    input:
+        - session: requests.Session from `create_http_session`.
+        - discovery: "auto" to read industry pages over HTTP with Selenium as fallback,
+          "browser" to always render them with Selenium, "market" to crawl all sectors
+          over HTTP (default: "auto").
+        - browser_workers: Number of parallel browsers for the "browser" mode (default: 1).
+        - journal: Optional `CheckpointJournal`; completed industry pages are not loaded again (default: None).
+        - cache: Optional `DiscoveryCache`; pages discovered within its TTL are not loaded again (default: None).
+    output:
+        - List of stock quote links (strings), None if discovery failed.
+    '''
+    if discovery == "browser":
+        driver = get_driver()
+        open_browser_session(driver)
+
+        # Navigate to Basic Materials sector; with a cache, `gather_industry_names` navigates only if needed
+        if cache is None:
+            log_event("browser_navigation", "Navigating to Basic Materials sector...", url=sectors_url)
+            with metrics.timer("browser_navigation", item=sectors_url):
+                driver.get(sectors_url)
+                wait_for_industry_table(driver)
+
+        # Navigate to each industry and collect company links
+        #navigate_to_industry()
+        gather_industry_names(driver, cache)
+        updated_urls = generate_urls()
+
+        log_event("industry_urls", "List of industry URLs:\n" + "\n".join(updated_urls),
+                  urls=updated_urls)
+
+        # Extract quote links from each updated URL
+        log_event("discovery", "Extracting /quote/.../ links from each industry page...", mode=discovery)
+        if browser_workers > 1:
+            with WebDriverPool(browser_workers) as pool:
+                extracted_links = retry_operation(pool.extract_quote_links, retries=3, urls=updated_urls,
+                                                  journal=journal, cache=cache)
+                log_event("page_ready_latency", f"Page-ready latency (s): {pool.latency_summary()}",
+                          **pool.latency_summary())
+        else:
+            extracted_links = retry_operation(
+                extract_quote_links, retries=3, driver=driver, urls=updated_urls, in_browser=True, journal=journal,
+                cache=cache,
+            )
+    elif discovery == "market":
+        # Crawl every sector, industry and result page instead of the first page of one sector
+        log_event("discovery", "Crawling all sectors for /quote/.../ links...", mode=discovery)
+        extracted_links = crawl_market(session, cache=cache)
+    else:
+        # Read the static HTML and only start the browser where it lacks the data
+        log_event("discovery", "Extracting /quote/.../ links from static industry pages...", mode=discovery)
+        extracted_links = retry_operation(
+            discover_quote_links, retries=3, session=session, driver_factory=get_driver, journal=journal, cache=cache
+        )
+    return extracted_links
+
+
+def fetch_and_save(links, session, incremental=False, days=365, fetch_mode="auto", filename="stock_data.csv",
+                   columnar=True, journal=None, store=price_store_file, interval="1d"):
+    '''
+    Fetches close prices for the links and saves them as CSV and columnar dataset.
+    input:
+        - links: List of stock quote links (strings).
+        - session: requests.Session from `create_http_session`; wrapped in `AdaptiveConcurrency`.
+        - incremental: Keep fetched bars in the on-disk `ChartCache` and only request new ones (default: False).
+        - days: Length of the requested history in days, up to now (default: 365).
+        - fetch_mode: As for `fetch_all_tickers_data` (default: "auto").
+        - filename: Output CSV file path (default: "stock_data.csv").
+        - columnar: Also write the Parquet dataset with `save_data_to_columnar` (default: True).
+        - journal: Optional `CheckpointJournal`; completed tickers are not requested again and a resumed
+          run keeps the time range of the interrupted one (default: None).
+        - store: `PriceStore` file the prices are upserted into, so history accumulates across runs
+          (default: "prices.sqlite"; None to skip).
+        - interval: Bar interval (default: "1d"). Intraday intervals are fetched in windows with
+          `fetch_intraday_history`; the chart cache and per-ticker journaling do not apply to them.
+    output:
+        - pandas DataFrame with the aligned close prices.
+    '''
+    # Fetch stock data using Yahoo AJAX endpoint
+    log_event("fetch", "Fetching stock data for all links...", links=len(links))
+
+    # Define the time range (the last `days` days up to now)
+    period2 = int(datetime.now().timestamp())  # End timestamp
+    period1 = int((datetime.now() - timedelta(days=days)).timestamp())  # Start timestamp
+    if journal is not None:
+        # Resumed tickers and newly fetched ones have to cover the same range
+        period1, period2 = journal.get_meta("period", [period1, period2])
+        journal.set_meta("period", [period1, period2])
+
+    # Fetch and save stock data; incremental runs only request bars newer than the cache
+    cache = ChartCache() if incremental else None
+    # Grow the number of requests in flight until Yahoo starts throttling, then back off
+    controller = AdaptiveConcurrency(session)
+    if interval in intraday_intervals:
+        stock_data = fetch_intraday_history(links, period1, period2, interval, session=controller,
+                                            max_concurrency=controller.max_limit)
+    else:
+        stock_data = fetch_all_tickers_data(
+            links, session=controller, max_concurrency=controller.max_limit, period1=period1, period2=period2,
+            interval=interval, cache=cache, incremental=incremental, fetch_mode=fetch_mode, journal=journal,
+        )
+    log_event("chart_requests", f"Chart request metrics: {controller.metrics()}", **controller.metrics())
+    save_data_to_csv(stock_data, filename)
+    if columnar:
+        save_data_to_columnar(stock_data)
+    if store:
+        with PriceStore(store) as prices:
+            prices.upsert_frame(stock_data, interval)
+    log_event("complete", "Data fetching and saving complete.")
+    return stock_data
+
+
+# Main function to handle navigation
+def main(discovery="auto", browser_workers=1, incremental=False, metrics_file="run_metrics.json",
+         metrics_interval=None, json_logs=False, resume=False, journal_path=journal_file,
+         discovery_cache_path=discovery_cache_file):
+    '''
+    Main workflow that orchestrates web scraping, data extraction, and saving.
+    input:
+        - discovery: "auto", "browser" or "market", see `discover_links` (default: "auto").
+        - browser_workers: Number of parallel browsers for the "browser" mode (default: 1).
+        - incremental: Keep fetched bars in the on-disk `ChartCache` and only request new ones (default: False).
+        - metrics_file: Per-stage metrics written at the end of the run, Prometheus text for
+          .prom/.txt paths, otherwise JSON (default: "run_metrics.json"; None to skip).
+        - metrics_interval: Also rewrite `metrics_file` every this many seconds (default: None).
+        - json_logs: Log JSON lines instead of plain messages (default: False).
+        - resume: Continue an interrupted run, skipping the pages and tickers in the journal (default: False).
+        - journal_path: Checkpoint journal file (default: "run_journal.sqlite").
+        - discovery_cache_path: `DiscoveryCache` file; pages discovered within its TTL are not loaded
+          again (default: "discovery_cache.sqlite"; None to discover every page).
+    output:
+        - None. Executes the end-to-end process of scraping, extracting, and saving stock data.
+    '''
+    with observed_run(metrics_file, metrics_interval, json_logs):
+        # One pooled session for discovery and chart requests, carrying the default cookies and headers
+        session = SessionManager(
+            create_http_session(headers=default_headers, max_connections_per_host=max_adaptive_requests),
+            driver_factory=get_driver,
+        )
+        journal = CheckpointJournal(journal_path, resume=resume)
+        discovery_cache = DiscoveryCache(discovery_cache_path) if discovery_cache_path else None
+        try:
+            extracted_links = discover_links(session, discovery, browser_workers, journal=journal,
+                                             cache=discovery_cache)
+            if not extracted_links:
+                log_event("no_links", "Failed to extract links. Exiting.", logging.ERROR)
+                return
+
+            # Save the extracted links
+            save_links_to_csv(extracted_links)
+            log_event("links_collected", "Collected full quote links:\n" + "\n".join(extracted_links),
+                      links=len(extracted_links))
+
+            fetch_and_save(extracted_links, session, incremental=incremental, journal=journal)
+        finally:
+            session.close()
+            journal.close()
+            if discovery_cache is not None:
+                discovery_cache.close()
+
+            # Close the driver
+            log_event("shutdown", "Script complete. Closing the browser.")
+            close_driver()
+
+
+# In[ ]:
+
+
+def main_streaming(incremental=False, metrics_file="run_metrics.json", metrics_interval=None, json_logs=False,
+                   discovery_cache_path=discovery_cache_file):
+    '''
+    Streaming variant of `main`: chart fetches start while industry pages are still being
+    discovered, and every ticker is written to disk as soon as it arrives.
+    input:
+        - incremental: Keep fetched bars in the on-disk `ChartCache` and only request new ones (default: False).
+        - metrics_file, metrics_interval, json_logs, discovery_cache_path: As for `main`.
+    output:
+        - None. Writes "extracted_links.csv", "stock_data_long.csv" and the aligned "stock_data.csv".
+    '''
+    with observed_run(metrics_file, metrics_interval, json_logs):
+        session = SessionManager(
+            create_http_session(headers=default_headers, max_connections_per_host=max_adaptive_requests),
+            driver_factory=get_driver,
+        )
+        period1, period2 = default_period()
+        cache = ChartCache() if incremental else None
+        controller = AdaptiveConcurrency(session)
+        discovery_cache = DiscoveryCache(discovery_cache_path) if discovery_cache_path else None
+        try:
+            links = tee_links_to_csv(iter_quote_links(session, driver_factory=get_driver, cache=discovery_cache))
+            written = run_streaming_pipeline(
+                links, window=controller.max_limit, period1=period1, period2=period2, session=controller, cache=cache,
+                incremental=incremental,
+            )
+            log_event("chart_requests", f"Chart request metrics: {controller.metrics()}", **controller.metrics())
+
+            # The aligned wide frame is built from disk once all tickers are in
+            if written:
+                stock_data = load_long_csv()
+                save_data_to_csv(stock_data)
+                save_data_to_columnar(stock_data)
+                with PriceStore() as prices:
+                    prices.upsert_frame(stock_data)
+        finally:
+            controller.close()
+            if discovery_cache is not None:
+                discovery_cache.close()
+
+            log_event("shutdown", "Script complete. Closing the browser.")
+            close_driver()
+
+
+# ## 5.1 Sharded Execution
+
+# In[ ]:
+
+
+class WorkQueue:
+    '''
+    Durable SQLite queue of industry pages and tickers, shared by the worker processes of a sharded
+    run. Workers lease items for `lease_seconds`; an item whose worker died is leased again once
+    its lease has expired. By default the queue is in WAL mode, whose shared-memory index only
+    works for workers on one host. With `shared`, it uses a rollback journal and plain file locks
+    instead, so workers on several hosts can share the file on storage with working locks (an
+    NFS or SMB share with locking enabled); every process of a run has to open it the same way.
+    input:
+        - path: SQLite database file (default: "work_queue.sqlite").
+        - shared: The file is shared by workers on several hosts (default: False).
+    '''
+
+    def __init__(self, path=work_queue_file, shared=False):
+        self.path = path
+        self.shared = shared
+        # Autocommit; leases and completions take the write lock with BEGIN IMMEDIATE
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        if shared:
+            self._db.execute("PRAGMA journal_mode=DELETE")
+            self._db.execute("PRAGMA synchronous=FULL")
+        else:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS items (id INTEGER PRIMARY KEY, kind TEXT, key TEXT, "
+            "state TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, owner TEXT, lease_expires REAL, "
+            "not_before REAL DEFAULT 0, result TEXT, error TEXT, UNIQUE (kind, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS items_state ON items (state, not_before)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    @contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def reset(self):
+        '''
+        Removes all items and settings, before a new run is enqueued.
+        '''
+        with self._transaction():
+            self._db.execute("DELETE FROM items")
+            self._db.execute("DELETE FROM meta")
+
+    def put(self, kind, keys):
+        '''
+        Adds items; keys already in the queue are ignored.
+        input:
+            - kind: "page" for industry page URLs, "ticker" for quote links.
+            - keys: Iterable of URLs (strings).
+        output:
+            - Number of items added (int).
+        '''
+        with self._transaction():
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO items (kind, key) VALUES (?, ?)", ((kind, key) for key in keys))
+            return self._db.total_changes - before
+
+    def lease(self, owner, limit=1, lease_seconds=300, max_attempts=retry_attempts):
+        '''
+        Leases up to `limit` items that are pending or whose lease has expired; pages come first,
+        since they add tickers. An item whose lease expired after its last attempt, e.g. because it
+        crashes every worker, is marked failed instead.
+        input:
+            - owner: Worker id (string).
+            - limit: Maximum number of items (default: 1).
+            - lease_seconds: Time the worker has to complete an item (default: 300).
+            - max_attempts: Attempts before an item with an expired lease is marked failed (default: 4).
+        output:
+            - List of dictionaries with "id", "kind", "key" and "attempts".
+        '''
+        now = time.time()
+        with self._transaction():
+            self._db.execute(
+                "UPDATE items SET state = 'failed', error = 'Lease expired after ' || attempts || ' attempts' "
+                "WHERE state = 'leased' AND lease_expires <= ? AND attempts >= ?", (now, max_attempts),
+            )
+            rows = self._db.execute(
+                "SELECT id, kind, key, attempts FROM items WHERE (state = 'pending' AND not_before <= ?) "
+                "OR (state = 'leased' AND lease_expires <= ?) ORDER BY kind = 'ticker', id LIMIT ?",
+                (now, now, limit),
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE items SET state = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                ((owner, now + lease_seconds, row[0]) for row in rows),
+            )
+        return [{"id": row[0], "kind": row[1], "key": row[2], "attempts": row[3] + 1} for row in rows]
+
+    def complete(self, item, owner, result=None, tickers=()):
+        '''
+        Marks a leased item as done and adds the tickers found on a page.
+        input:
+            - item: Dictionary from `lease`.
+            - owner: Worker id that leased the item (string).
+            - result: Result stored with the item (string, e.g. JSON) (default: None).
+            - tickers: Quote links to enqueue (default: none).
+        output:
+            - False if the lease was lost to another worker in the meantime, True otherwise.
+        '''
+        with self._transaction():
+            updated = self._db.execute(
+                "UPDATE items SET state = 'done', result = ?, error = NULL WHERE id = ? AND owner = ? "
+                "AND state = 'leased'", (result, item["id"], owner),
+            ).rowcount
+            if updated:
+                self._db.executemany("INSERT OR IGNORE INTO items (kind, key) VALUES ('ticker', ?)",
+                                     ((link,) for link in tickers))
+        return bool(updated)
+
+    def fail(self, item, owner, error, retryable=True, max_attempts=retry_attempts):
+        '''
+        Returns a failed item to the queue after a backoff, or marks it failed for good.
+        input:
+            - item: Dictionary from `lease`.
+            - owner: Worker id that leased the item (string).
+            - error: The exception.
+            - retryable: Whether another attempt may succeed, see `is_retryable_error` (default: True).
+            - max_attempts: Attempts before the item is marked failed (default: 4).
+        '''
+        retry = retryable and item["attempts"] < max_attempts
+        not_before = time.time() + backoff_delay(item["attempts"] - 1) if retry else 0
+        with self._transaction():
+            self._db.execute(
+                "UPDATE items SET state = ?, not_before = ?, error = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                ("pending" if retry else "failed", not_before, str(error), item["id"], owner),
+            )
+
+    def remaining(self):
+        '''
+        Returns the number of items that are pending or leased (int).
+        '''
+        return self._db.execute("SELECT COUNT(*) FROM items WHERE state IN ('pending', 'leased')").fetchone()[0]
+
+    def counts(self):
+        '''
+        Returns the number of items by kind and state, e.g. {"ticker": {"done": 58, "failed": 2}}.
+        '''
+        counts = {}
+        for kind, state, count in self._db.execute("SELECT kind, state, COUNT(*) FROM items GROUP BY kind, state"):
+            counts.setdefault(kind, {})[state] = count
+        return counts
+
+    def results(self, kind="ticker"):
+        '''
+        Returns (key, result) pairs of the completed items of a kind, in enqueue order.
+        '''
+        return self._db.execute(
+            "SELECT key, result FROM items WHERE kind = ? AND state = 'done' ORDER BY id", (kind,)
+        ).fetchall()
+
+    def get_meta(self, key, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set_meta(self, key, value):
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, json.dumps(value)))
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def enqueue_work(queue_path=work_queue_file, session=None, links=None, days=365, interval="1d", shared=False):
+    '''
+    Coordinator step of a sharded run: starts a new queue with the industry pages of the sector,
+    or with the given links, and the time range every worker fetches.
+    input:
+        - queue_path: `WorkQueue` file (default: "work_queue.sqlite").
+        - session: requests.Session or `SessionManager` for the sector page (default: None).
+        - links: Quote links to enqueue instead of discovering industry pages (default: None).
+        - days: Length of the requested history in days, up to now (default: 365).
+        - interval: Bar interval (default: "1d").
+        - shared: The queue is shared by workers on several hosts, see `WorkQueue` (default: False).
+    output:
+        - Number of items enqueued (int).
+    '''
+    with WorkQueue(queue_path, shared) as work:
+        work.reset()
+        period1, period2 = default_period(int((datetime.now() - timedelta(days=days)).timestamp()))
+        work.set_meta("period", [period1, period2])
+        work.set_meta("interval", interval)
+
+        if links is not None:
+            added = work.put("ticker", links)
+        elif gather_industry_names_http(session):
+            added = work.put("page", generate_urls())
+        else:
+            log_event("no_industries", "Industry table missing from the static sector page.", logging.ERROR,
+                      url=sectors_url)
+            added = 0
+    log_event("work_enqueued", f"Enqueued {added} items in {queue_path}", path=queue_path, items=added)
+    return added
+
+
+def process_work_item(item, session, period1, period2, interval="1d"):
+    '''
+    Processes one leased item; raises on errors so the queue can retry it.
+    input:
+        - item: Dictionary from `WorkQueue.lease`.
+        - session: requests.Session, `SessionManager` or `AdaptiveConcurrency`.
+        - period1, period2, interval: Time range and bar interval of the run.
+    output:
+        - Tuple (result, tickers): for pages no result and the quote links found, for tickers the
+          bars as JSON (None if the ticker has no data) and no links.
+    '''
+    if item["kind"] == "page":
+        links = parse_quote_links(fetch_page_html(item["key"], session, raise_errors=True))
+        if not links:
+            log_event("page_empty", f"No quote links in the static HTML of {item['key']}", logging.WARNING,
+                      url=item["key"])
+        metrics.inc("quote_links", len(links), source="http")
+        return None, links
+
+    ticker = item["key"].split('/')[-2]
+    frame = fetch_ticker_frame(ticker, period1, period2, interval, session=session, raise_errors=True)
+    return (None if frame is None else _encode_bars(frame, ticker)), ()
+
+
+def run_worker(queue_path=work_queue_file, worker_id=None, concurrency=max_concurrent_requests, session=None,
+               lease_seconds=300, poll_interval=0.2, max_attempts=retry_attempts, shared=False):
+    '''
+    Worker step of a sharded run: leases items and processes up to `concurrency` of them at once
+    until the queue is drained. Several workers, on one or (with `shared`) several hosts, can share a queue.
+    input:
+        - queue_path: `WorkQueue` file (default: "work_queue.sqlite").
+        - worker_id: Lease owner name (default: None, host name, process id and thread id).
+        - concurrency: Items in progress at once (default: 8).
+        - session: Session to use (default: None, a `SessionManager` that never starts a browser,
+          behind this worker's own `AdaptiveConcurrency`).
+        - lease_seconds: Lease duration per item (default: 300).
+        - poll_interval: Seconds between queue checks while other workers hold the remaining items (default: 0.2).
+        - max_attempts: Attempts per item before it is marked failed (default: 4).
+        - shared: The queue is shared by workers on several hosts, see `WorkQueue` (default: False).
+    output:
+        - Number of items this worker completed (int).
+    '''
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{threading.get_ident()}"
+    own_session = session is None
+    if own_session:
+        session = AdaptiveConcurrency(
+            SessionManager(create_http_session(headers=default_headers, max_connections_per_host=concurrency)),
+            max_limit=concurrency,
+        )
+
+    completed = 0
+    with WorkQueue(queue_path, shared) as work, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        period1, period2 = work.get_meta("period") or default_period()
+        interval = work.get_meta("interval", "1d")
+        log_event("worker_start", f"Worker {worker_id} started on {queue_path}", worker=worker_id, path=queue_path)
+
+        pending = {}
+        try:
+            while True:
+                if len(pending) < concurrency:
+                    for item in work.lease(worker_id, concurrency - len(pending), lease_seconds, max_attempts):
+                        future = executor.submit(process_work_item, item, session, period1, period2, interval)
+                        pending[future] = item
+                if not pending:
+                    if work.remaining() == 0:
+                        break
+                    # Other workers hold the rest; their pages may still add tickers
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(pending, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        result, tickers = future.result()
+                    except Exception as e:
+                        metrics.inc("errors", stage=f"{item['kind']}_work")
+                        log_event("work_failed", f"Attempt {item['attempts']} of {item['key']} failed: {e}",
+                                  logging.WARNING, worker=worker_id, item=item["key"], error=str(e))
+                        work.fail(item, worker_id, e, is_retryable_error(e), max_attempts)
+                    else:
+                        if work.complete(item, worker_id, result, tickers):
+                            completed += 1
+                            metrics.inc("work_items", kind=item["kind"])
+        finally:
+            if own_session:
+                session.close()
+
+    log_event("worker_done", f"Worker {worker_id} completed {completed} items", worker=worker_id, items=completed)
+    return completed
+
+
+def merge_work_queue(queue_path=work_queue_file, snap_to=None, shared=False):
+    '''
+    Merge step of a sharded run: aligns the bars of all completed tickers.
+    input:
+        - queue_path: `WorkQueue` file (default: "work_queue.sqlite").
+        - snap_to: Optional pandas frequency to bucket timestamps into (default: None).
+        - shared: The queue is shared by workers on several hosts, see `WorkQueue` (default: False).
+    output:
+        - pandas DataFrame: Timestamps as rows and tickers as columns, in enqueue order.
+    '''
+    with WorkQueue(queue_path, shared) as work:
+        counts = work.counts()
+        frames = [
+            _decode_bars(bars, link.split('/')[-2]) for link, bars in work.results("ticker") if bars is not None
+        ]
+    log_event("work_merged", f"Merging {len(frames)} tickers, queue state: {counts}", tickers=len(frames),
+              counts=counts)
+    return align_ticker_series(frames, snap_to=snap_to)
+
+
+def _worker_process(queue_path, worker_id, concurrency, log_level, json_logs):
+    # Entry point of a worker process started by `run_sharded`
+    configure_logging(log_level, json_logs=json_logs)
+    run_worker(queue_path, worker_id, concurrency)
+
+
+def run_sharded(workers=4, queue_path=work_queue_file, links=None, days=365, concurrency=max_concurrent_requests,
+                session=None):
+    '''
+    Runs the sharded mode on this host: enqueues the work, starts `workers` worker processes,
+    waits for them and merges their results.
+    input:
+        - workers: Number of worker processes (default: 4).
+        - queue_path: `WorkQueue` file (default: "work_queue.sqlite").
+        - links: Quote links to fetch instead of discovering industry pages (default: None).
+        - days: Length of the requested history in days (default: 365).
+        - concurrency: Items in progress per worker (default: 8).
+        - session: Session for the sector page; its saved cookies are reused by the workers (default: None).
+    output:
+        - pandas DataFrame with the aligned close prices.
+    '''
+    enqueue_work(queue_path, session, links=links, days=days)
+    if isinstance(session, SessionManager):
+        session.ensure()  # saves the session file once instead of bootstrapping in every worker
+
+    level = logger.getEffectiveLevel()
+    json_logs = any(isinstance(handler.formatter, JsonLogFormatter) for handler in logger.handlers)
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(queue_path, f"{socket.gethostname()}-w{index}",
+                                                              concurrency, level, json_logs))
+        for index in range(workers)
+    ]
+    with metrics.timer("sharded_work"):
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    return merge_work_queue(queue_path)
+
+
+# ## 5.2 Daemon Mode
+
+# In[ ]:
+
+
+def select_prices(data, tickers=None, start=None, end=None):
+    '''
+    Selects tickers and an inclusive time range from an aligned price frame.
+    input:
+        - data: pandas DataFrame with a "timestamp" column and one close price column per ticker.
+        - tickers: List of ticker symbols (default: None, all); unknown tickers are ignored.
+        - start, end: Inclusive bounds (datetime-like, UTC) (default: None, unbounded).
+    output:
+        - pandas DataFrame in the same layout.
+    '''
+    columns = list(data.columns[1:]) if tickers is None else [t for t in dict.fromkeys(tickers) if t in data.columns]
+    timestamps = data["timestamp"]
+    rows = np.ones(len(data), dtype=bool)
+    if start is not None:
+        rows &= (timestamps >= pd.Timestamp(start)).to_numpy()
+    if end is not None:
+        rows &= (timestamps <= pd.Timestamp(end)).to_numpy()
+    return data.loc[rows, ["timestamp"] + columns].reset_index(drop=True)
+
+
+class ScraperDaemon:
+    '''
+    Long-running mode that keeps the HTTP session, its cookies and crumb, the browser (if one
+    was needed), the concurrency controller and the discovered links alive between cycles.
+    Every `refresh_interval` it requests only the bars newer than the `ChartCache` watermarks,
+    and it serves the latest aligned prices, the stored history and the run metrics from memory
+    over a local HTTP API:
+        - GET /prices?tickers=A,B&start=...&end=...&format=json|csv: latest aligned close prices
+        - GET /history?tickers=...&start=...&end=...&interval=1d: range query on the `PriceStore`
+        - GET /status: refresh state; GET /metrics: Prometheus text; GET /metrics.json: JSON metrics
+        - POST /refresh: start a refresh cycle now
+    input:
+        - refresh_interval: Time between refreshes (timedelta, default: 15 minutes).
+        - days: Length of the served history in days, up to now (default: 365).
+        - interval: Bar interval (default: "1d"). An intraday range longer than one chart request
+          allows is backfilled once in windows with `fetch_intraday_history`; later cycles request
+          only the bars from each ticker's watermark on, like every other interval.
+        - fetch_mode: As for `fetch_all_tickers_data` (default: "auto").
+        - max_bars: Number of most recent bars kept per ticker (default: 100).
+        - discovery: Discovery mode, see `discover_links` (default: "auto").
+        - links: Quote links to refresh instead of discovering them (default: None).
+        - store: `PriceStore` file the new bars are upserted into (default: "prices.sqlite"; None to skip).
+        - discovery_cache: `DiscoveryCache`; links are discovered again once per cycle and only
+          changed pages are re-parsed (default: None, links are discovered once).
+        - session: Session to keep warm (default: None, a `SessionManager` with the browser as bootstrap fallback).
+        - chart_cache: `ChartCache` holding the bars between cycles (default: None, a new one).
+        - host, port: Address of the query API (default: "127.0.0.1" and 8765; port 0 picks a free port).
+    '''
+
+    def __init__(self, refresh_interval=daemon_refresh_interval, days=365, interval="1d", fetch_mode="auto",
+                 max_bars=100, discovery="auto", links=None, store=price_store_file, discovery_cache=None,
+                 session=None, chart_cache=None, host=daemon_host, port=daemon_port):
+        self.refresh_interval = refresh_interval
+        self.days = days
+        self.interval = interval
+        self.fetch_mode = fetch_mode
+        self.max_bars = max_bars
+        self.discovery = discovery
+        self.links = list(links) if links else None
+        self.static_links = links is not None
+        self.discovery_cache = discovery_cache
+        self.session = session if session is not None else SessionManager(
+            create_http_session(headers=default_headers, max_connections_per_host=max_adaptive_requests),
+            driver_factory=get_driver,
+        )
+        # One controller for all cycles, so the concurrency it learned is not lost between them
+        self.controller = AdaptiveConcurrency(self.session)
+        self.chart_cache = chart_cache if chart_cache is not None else ChartCache()
+        self.store = PriceStore(store) if store else None
+
+        self.data = pd.DataFrame({"timestamp": pd.DatetimeIndex([])})
+        self.cycles = 0
+        self.last_refresh = None
+        self.last_error = None
+        self._payloads = {}  # serialized `data` per format, built on first request after a refresh
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), _DaemonRequestHandler)
+        self._server.daemon_threads = True
+        self._server.scraper = self
+        self._server_thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def refresh(self):
+        '''
+        Runs one refresh cycle: rediscovers links if needed, fetches the new bars and swaps in the aligned frame.
+        output:
+            - The new aligned pandas DataFrame, or None if the cycle failed and the previous data is kept.
+        '''
+        start = time.perf_counter()
+        try:
+            if not self.static_links and (self.links is None or self.discovery_cache is not None):
+                links = discover_links(self.session, self.discovery, cache=self.discovery_cache)
+                if links:
+                    self.links = links
+            if not self.links:
+                raise RuntimeError("no quote links discovered")
+
+            period2 = int(time.time())
+            period1 = period2 - self.days * 86400
+            if self.interval in intraday_intervals:
+                self._backfill_intraday(period1, period2)
+            data = fetch_all_tickers_data(
+                self.links, session=self.controller, max_concurrency=self.controller.max_limit, period1=period1,
+                period2=period2, interval=self.interval, cache=self.chart_cache, incremental=True,
+                max_bars=self.max_bars, fetch_mode=self.fetch_mode,
+            )
+            if self.store is not None and len(data.columns) > 1:
+                self.store.upsert_frame(data, self.interval)
+        except Exception as e:
+            metrics.inc("errors", stage="daemon_refresh")
+            log_event("daemon_refresh_failed", f"Refresh failed, serving the previous data: {e}", logging.ERROR,
+                      error=str(e))
+            with self._lock:
+                self.last_error = str(e)
+            return None
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.data = data
+            self._payloads = {}
+            self.cycles += 1
+            self.last_refresh = time.time()
+            self.last_error = None
+        metrics.observe("stage_seconds", elapsed, stage="daemon_refresh")
+        metrics.set_gauge("daemon_last_refresh", self.last_refresh)
+        log_event("daemon_refreshed", f"Refresh {self.cycles} done in {elapsed:.2f}s: {len(data.columns) - 1} "
+                  f"tickers, {len(data)} rows", cycle=self.cycles, seconds=round(elapsed, 3),
+                  tickers=len(data.columns) - 1, rows=len(data))
+        return data
+
+    def _backfill_intraday(self, period1, period2):
+        # Tickers without cached bars, or whose watermark is older than one chart request reaches,
+        # are fetched in windows once; the cache watermarks then keep every later request to one window
+        span = intraday_intervals[self.interval][1] * 86400
+        starts = {}
+        for link in self.links:
+            ticker = link.rstrip('/').split('/')[-1]
+            cached = self.chart_cache.load(ticker, self.interval)
+            watermark = cached["watermark"] if cached is not None and cached["watermark"] is not None else period1
+            if period2 - max(period1, watermark) > span:
+                starts[link] = max(period1, watermark)
+        if not starts:
+            return
+
+        log_event("daemon_backfill", f"Backfilling {self.interval} bars of {len(starts)} tickers in windows",
+                  interval=self.interval, tickers=len(starts))
+        history = fetch_intraday_history(list(starts), min(starts.values()), period2, self.interval,
+                                         session=self.controller, max_concurrency=self.controller.max_limit)
+        epochs = to_epoch_seconds(history["timestamp"])
+        for ticker in history.columns[1:]:
+            closes = np.asarray(history[ticker], dtype="float64")
+            present = ~np.isnan(closes)
+            self.chart_cache.update(ticker, self.interval, epochs[present], closes[present])
+        if self.store is not None and len(history.columns) > 1:
+            self.store.upsert_frame(history, self.interval)
+
+    def status(self):
+        '''
+        Returns the refresh state as a JSON-serialisable dictionary.
+        '''
+        with self._lock:
+            data = self.data
+            return {
+                "cycles": self.cycles,
+                "last_refresh": self.last_refresh,
+                "next_refresh_in": self.refresh_interval.total_seconds() if self.last_refresh is None else
+                max(0.0, self.last_refresh + self.refresh_interval.total_seconds() - time.time()),
+                "last_error": self.last_error,
+                "links": len(self.links or []),
+                "tickers": len(data.columns) - 1,
+                "rows": len(data),
+                "interval": self.interval,
+                "concurrency": self.controller.metrics(),
+            }
+
+    def prices_payload(self, file_format="json", tickers=None, start=None, end=None):
+        '''
+        Serializes the latest prices. Unfiltered requests reuse the serialization of the current data.
+        output:
+            - bytes: JSON (`DataFrame.to_json` "split" layout with ISO timestamps) or CSV.
+        '''
+        with self._lock:
+            data = self.data
+            cached = self._payloads.get(file_format)
+        filtered = tickers is not None or start is not None or end is not None
+        if cached is not None and not filtered:
+            return cached
+
+        frame = select_prices(data, tickers, start, end) if filtered else data
+        if file_format == "csv":
+            payload = frame.to_csv(index=False).encode("utf-8")
+        else:
+            payload = frame.to_json(orient="split", index=False, date_format="iso").encode("utf-8")
+        if not filtered:
+            with self._lock:
+                if self.data is data:
+                    self._payloads[file_format] = payload
+        return payload
+
+    def request_refresh(self):
+        '''
+        Starts a refresh cycle as soon as the current one (if any) is done.
+        '''
+        self._wake.set()
+
+    def start_server(self):
+        '''
+        Starts the query API in a background thread.
+        '''
+        if self._server_thread is None:
+            self._server_thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+            self._server_thread.start()
+            log_event("daemon_listening", f"Query API listening on {self.url}", url=self.url)
+        return self
+
+    def run(self, cycles=None):
+        '''
+        Serves the query API and refreshes on schedule until `stop` is called.
+        input:
+            - cycles: Stop after this many refresh cycles (default: None, run until stopped).
+        '''
+        self.start_server()
+        done = 0
+        while not self._stop.is_set():
+            self.refresh()
+            done += 1
+            if cycles is not None and done >= cycles:
+                break
+            self._wake.wait(self.refresh_interval.total_seconds())
+            self._wake.clear()
+
+    def stop(self):
+        '''
+        Ends `run` after the current cycle.
+        '''
+        self._stop.set()
+        self._wake.set()
+
+    def close(self):
+        '''
+        Stops the query API and releases the warm resources.
+        '''
+        self.stop()
+        if self._server_thread is not None:
+            self._server.shutdown()
+        self._server.server_close()
+        self.session.close()
+        if self.store is not None:
+            self.store.close()
+        if self.discovery_cache is not None:
+            self.discovery_cache.close()
+        close_driver()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _DaemonRequestHandler(BaseHTTPRequestHandler):
+    # The query API of `ScraperDaemon`
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # headers and body go out as separate writes; don't hold the body back
+
+    def do_GET(self):
+        daemon = self.server.scraper
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        tickers = query["tickers"].split(",") if query.get("tickers") else None
+        try:
+            if url.path == "/prices":
+                file_format = query.get("format", "json")
+                body = daemon.prices_payload(file_format, tickers, query.get("start"), query.get("end"))
+                self._send(200, body, "text/csv" if file_format == "csv" else "application/json")
+            elif url.path == "/history":
+                if daemon.store is None:
+                    self._send_json(404, {"error": "no price store configured"})
+                    return
+                data = daemon.store.query(tickers, query.get("start"), query.get("end"),
+                                          query.get("interval", daemon.interval))
+                self._send(200, data.to_json(orient="split", index=False, date_format="iso").encode("utf-8"),
+                           "application/json")
+            elif url.path == "/status":
+                self._send_json(200, daemon.status())
+            elif url.path == "/metrics":
+                self._send(200, metrics.to_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+            elif url.path == "/metrics.json":
+                self._send_json(200, metrics.snapshot())
+            else:
+                self._send_json(404, {"error": f"unknown path {url.path}"})
+        except (ValueError, TypeError) as e:
+            self._send_json(400, {"error": str(e)})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/refresh":
+            self._send_json(404, {"error": "unknown path"})
+            return
+        self.server.scraper.request_refresh()
+        self._send_json(202, {"refresh": "scheduled"})
+
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload).encode("utf-8"), "application/json")
+
+    def _send(self, status, body, content_type):
+        metrics.inc("daemon_requests", path=urlparse(self.path).path, status=status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        log_event("daemon_request", format % args, logging.DEBUG)
+
+
+# In[ ]:
+
+
+def build_arg_parser():
+    '''
+    Builds the command line parser with the `discover`, `fetch`, `run-all`, `query` and `daemon` commands
+    and the `enqueue`, `work`, `merge` and `run-sharded` commands of the sharded mode. Without a
+    command `cli` runs `run-all`, as the script did before it had commands.
+    '''
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="mc1_scraper", description="Scrape Yahoo Finance quote links and prices.")
+    parser.add_argument("--metrics-file", default="run_metrics.json",
+                        help="metrics output, Prometheus text for .prom/.txt, otherwise JSON ('' to skip)")
+    parser.add_argument("--metrics-interval", type=float, default=None,
+                        help="also export metrics every N seconds during the run")
+    parser.add_argument("--json-logs", action="store_true", help="log JSON lines")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--session-file", default=session_file, help="cached consent cookies and crumb")
+    parser.add_argument("--journal", default=journal_file, help="checkpoint journal of completed pages and tickers")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run, skipping what the journal lists as completed")
+    parser.add_argument("--discovery-cache", default=discovery_cache_file,
+                        help="cache of discovered sector and industry pages ('' to discover every page)")
+    parser.add_argument("--discovery-ttl", type=float, default=discovery_ttl.total_seconds() / 3600,
+                        help="hours a cached page is used without requesting it")
+    commands = parser.add_subparsers(dest="command")
+
+    def add_discovery_options(command):
+        command.add_argument("--discovery", choices=["auto", "browser", "market"], default="auto")
+        command.add_argument("--browser-workers", type=int, default=1)
+
+    def add_fetch_options(command):
+        command.add_argument("--output", default="stock_data.csv")
+        command.add_argument("--days", type=int, default=365)
+        command.add_argument("--fetch-mode", choices=["chart", "batch", "auto"], default="auto")
+        command.add_argument("--incremental", action="store_true", help="only request bars newer than the chart cache")
+        command.add_argument("--no-columnar", dest="columnar", action="store_false",
+                             help="skip the Parquet dataset")
+        command.add_argument("--store", default=price_store_file, help="time-series store to upsert into ('' to skip)")
+        command.add_argument("--interval", default="1d",
+                             help="bar interval; intraday intervals (%s) are fetched in concurrent windows"
+                             % ", ".join(intraday_intervals))
+
+    discover = commands.add_parser("discover", help="collect quote links into a links CSV")
+    add_discovery_options(discover)
+    discover.add_argument("--links-file", default="extracted_links.csv")
+
+    fetch = commands.add_parser("fetch", help="fetch prices for the links in an existing links CSV, without a browser")
+    fetch.add_argument("--links-file", default="extracted_links.csv")
+    add_fetch_options(fetch)
+
+    run_all = commands.add_parser("run-all", help="discover links, then fetch their prices")
+    add_discovery_options(run_all)
+    run_all.add_argument("--links-file", default="extracted_links.csv")
+    add_fetch_options(run_all)
+
+    def add_queue_options(command, shared_storage=True):
+        command.add_argument("--queue", default=work_queue_file, help="shared work queue (SQLite file)")
+        if shared_storage:
+            command.add_argument("--shared-storage", action="store_true",
+                                 help="the queue is on storage shared by workers on several hosts (NFS/SMB with "
+                                      "locking); pass it to every enqueue, work and merge of the run")
+
+    def add_output_options(command):
+        command.add_argument("--output", default="stock_data.csv")
+        command.add_argument("--no-columnar", dest="columnar", action="store_false", help="skip the Parquet dataset")
+        command.add_argument("--store", default=price_store_file, help="time-series store to upsert into ('' to skip)")
+
+    enqueue = commands.add_parser("enqueue", help="start a sharded run: put industry pages or links on the queue")
+    add_queue_options(enqueue)
+    enqueue.add_argument("--links-file", default=None, help="enqueue these links instead of discovering pages")
+    enqueue.add_argument("--days", type=int, default=365)
+
+    work = commands.add_parser("work", help="process queue items until the queue is drained (on any host with "
+                                            "--shared-storage)")
+    add_queue_options(work)
+    work.add_argument("--worker-id", default=None)
+    work.add_argument("--concurrency", type=int, default=max_concurrent_requests)
+
+    merge = commands.add_parser("merge", help="align the results of a sharded run into the output files")
+    add_queue_options(merge)
+    add_output_options(merge)
+
+    run_sharded_command = commands.add_parser("run-sharded", help="enqueue, run worker processes here, then merge")
+    add_queue_options(run_sharded_command, shared_storage=False)
+    run_sharded_command.add_argument("--workers", type=int, default=4)
+    run_sharded_command.add_argument("--concurrency", type=int, default=max_concurrent_requests)
+    run_sharded_command.add_argument("--links-file", default=None, help="fetch these links instead of discovering pages")
+    run_sharded_command.add_argument("--days", type=int, default=365)
+    add_output_options(run_sharded_command)
+
+    query = commands.add_parser("query", help="write aligned prices from the time-series store to a CSV")
+    query.add_argument("--store", default=price_store_file)
+    query.add_argument("--tickers", nargs="+", default=None, help="default: all stored tickers")
+    query.add_argument("--start", default=None, help="first date, e.g. 2024-01-01")
+    query.add_argument("--end", default=None, help="last timestamp, e.g. 2024-12-31T23:59:59")
+    query.add_argument("--interval", default="1d")
+    query.add_argument("--output", default="stock_data_query.csv")
+
+    daemon = commands.add_parser("daemon", help="keep refreshing prices and serve them over a local HTTP API")
+    add_discovery_options(daemon)
+    daemon.add_argument("--links-file", default=None, help="refresh these links instead of discovering them")
+    daemon.add_argument("--host", default=daemon_host)
+    daemon.add_argument("--port", type=int, default=daemon_port)
+    daemon.add_argument("--refresh-minutes", type=float, default=daemon_refresh_interval.total_seconds() / 60)
+    daemon.add_argument("--days", type=int, default=365)
+    daemon.add_argument("--interval", default="1d")
+    daemon.add_argument("--fetch-mode", choices=["chart", "batch", "auto"], default="auto")
+    daemon.add_argument("--store", default=price_store_file, help="time-series store to upsert into ('' to skip)")
+    return parser
+
+
+def _sharded_cli(args):
+    # The sharded-mode commands of `cli`; workers never start a browser
+    links = load_links_from_csv(args.links_file) if getattr(args, "links_file", None) else None
+    if args.command == "work":
+        run_worker(args.queue, args.worker_id, args.concurrency, shared=args.shared_storage)
+        return 0
+
+    if args.command in ("enqueue", "run-sharded"):
+        session = SessionManager(create_http_session(headers=default_headers), path=args.session_file)
+        try:
+            if args.command == "enqueue":
+                return 0 if enqueue_work(args.queue, session, links=links, days=args.days,
+                                         shared=args.shared_storage) else 1
+            stock_data = run_sharded(args.workers, args.queue, links=links, days=args.days,
+                                     concurrency=args.concurrency, session=session)
+        finally:
+            session.close()
+    else:
+        stock_data = merge_work_queue(args.queue, shared=args.shared_storage)
+
+    save_data_to_csv(stock_data, args.output)
+    if args.columnar:
+        save_data_to_columnar(stock_data)
+    if args.store:
+        with PriceStore(args.store) as prices:
+            prices.upsert_frame(stock_data)
+    return 0 if len(stock_data.columns) > 1 else 1
+
+
+def _daemon_cli(args):
+    # The `daemon` command of `cli`; SIGTERM (e.g. `docker stop`) ends it like Ctrl+C
+    import signal
+
+    discovery_cache = None
+    if args.discovery_cache:
+        discovery_cache = DiscoveryCache(args.discovery_cache, ttl=timedelta(hours=args.discovery_ttl))
+    session = SessionManager(
+        create_http_session(headers=default_headers, max_connections_per_host=max_adaptive_requests),
+        path=args.session_file, driver_factory=get_driver,
+    )
+    daemon = ScraperDaemon(
+        refresh_interval=timedelta(minutes=args.refresh_minutes), days=args.days, interval=args.interval,
+        fetch_mode=args.fetch_mode, discovery=args.discovery,
+        links=load_links_from_csv(args.links_file) if args.links_file else None, store=args.store or None,
+        discovery_cache=discovery_cache, session=session, host=args.host, port=args.port,
+    )
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+    with daemon:
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            log_event("daemon_stopped", "Interrupted, shutting down.")
+    return 0
+
+
+def cli(argv=None):
+    '''
+    Command line entry point.
+    input:
+        - argv: Argument list (default: None, `sys.argv[1:]`).
+    output:
+        - Exit status (int): 0 on success, 1 if no links or no prices were obtained.
+    '''
+    parser = build_arg_parser()
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # Callers from before the commands, e.g. older Dockerfiles and scripts, run everything
+        args = parser.parse_args(argv + ["run-all"])
+    configure_logging(getattr(logging, args.log_level), json_logs=args.json_logs)
+
+    with observed_run(args.metrics_file or None, args.metrics_interval):
+        if args.command in ("enqueue", "work", "merge", "run-sharded"):
+            return _sharded_cli(args)
+        if args.command == "daemon":
+            return _daemon_cli(args)
+        if args.command == "query":
+            with PriceStore(args.store) as prices:
+                stock_data = prices.query(args.tickers, args.start, args.end, args.interval)
+            save_data_to_csv(stock_data, args.output)
+            return 0 if len(stock_data.columns) > 1 else 1
+
+        # `fetch` never starts a browser; without consent cookies it runs with what HTTP bootstrapping gets
+        session = SessionManager(
+            create_http_session(headers=default_headers, max_connections_per_host=max_adaptive_requests),
+            path=args.session_file, driver_factory=None if args.command == "fetch" else get_driver,
+        )
+        journal = CheckpointJournal(args.journal, resume=args.resume)
+        discovery_cache = None
+        if args.discovery_cache and args.command != "fetch":
+            discovery_cache = DiscoveryCache(args.discovery_cache, ttl=timedelta(hours=args.discovery_ttl))
+        try:
+            if args.command == "fetch":
+                links = load_links_from_csv(args.links_file)
+                log_event("links_loaded", f"Loaded {len(links)} links from {args.links_file}",
+                          path=args.links_file, links=len(links))
+            else:
+                links = discover_links(session, args.discovery, args.browser_workers, journal=journal,
+                                       cache=discovery_cache)
+                if links:
+                    save_links_to_csv(links, args.links_file)
+            if not links:
+                log_event("no_links", "Failed to extract links. Exiting.", logging.ERROR)
+                return 1
+            if args.command == "discover":
+                return 0
+
+            stock_data = fetch_and_save(links, session, incremental=args.incremental, days=args.days,
+                                        fetch_mode=args.fetch_mode, filename=args.output, columnar=args.columnar,
+                                        journal=journal, store=args.store or None, interval=args.interval)
+            return 0 if len(stock_data.columns) > 1 else 1
+        finally:
+            session.close()
+            journal.close()
+            if discovery_cache is not None:
+                discovery_cache.close()
+            close_driver()
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(cli())
 
 
 # In[ ]:
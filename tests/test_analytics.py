@@ -0,0 +1,145 @@
+# tests/test_analytics.py
+
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from src.mc1_analytics import (
+    price_matrix,
+    compute_returns,
+    window_gains,
+    top_k,
+    cross_correlation,
+    correlation_matrix,
+    top_correlations,
+    lead_lag_correlations,
+    leading_stocks,
+    influenced_by,
+    RollingCorrelation,
+)
+
+
+def make_prices(bars=120, tickers=8, seed=0, missing=0.05):
+    # Random walks in the wide format written by the scraper, with a few missing bars
+    rng = np.random.default_rng(seed)
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, tickers)), axis=0))
+    prices[rng.random(prices.shape) < missing] = np.nan
+    data = pd.DataFrame(prices, columns=[f"T{i}" for i in range(tickers)])
+    data.insert(0, "timestamp", pd.date_range("2024-01-01", periods=bars, freq="D"))
+    return data
+
+
+class TestReturnsAndGains(unittest.TestCase):
+
+    def test_returns_match_pandas(self):
+        """Test that simple and log returns match pandas on the price columns."""
+        data = make_prices()
+        prices = data.drop(columns="timestamp")
+        returns = compute_returns(data)
+        expected = (prices / prices.shift(1) - 1).iloc[1:].reset_index(drop=True)
+        pd.testing.assert_frame_equal(returns.drop(columns="timestamp"), expected)
+        self.assertEqual(list(returns["timestamp"]), list(data["timestamp"][1:]))
+
+        log_returns = compute_returns(prices.to_numpy(), kind="log")
+        np.testing.assert_allclose(log_returns, np.log(prices / prices.shift(1)).to_numpy()[1:])
+
+    def test_window_gains_and_top_k(self):
+        """Test window gains against the EDA first/last row computation and the top-k selection against nlargest."""
+        data = make_prices(missing=0)
+        window = data[(data["timestamp"] >= "2024-02-01") & (data["timestamp"] <= "2024-03-15")]
+        prices = window.drop(columns="timestamp")
+        expected = (prices.iloc[-1] - prices.iloc[0]) / prices.iloc[0] * 100
+
+        gains = window_gains(data, "2024-02-01", "2024-03-15")
+        pd.testing.assert_series_equal(gains, expected, check_names=False)
+        pd.testing.assert_series_equal(top_k(gains, 3), expected.nlargest(3), check_names=False)
+        pd.testing.assert_series_equal(top_k(gains, 3, largest=False), expected.nsmallest(3), check_names=False)
+
+    def test_window_gains_skip_missing_edges(self):
+        """Test that a gain uses the first and last available price of each ticker."""
+        data = pd.DataFrame({
+            "timestamp": pd.date_range("2024-01-01", periods=4, freq="D"),
+            "A": [np.nan, 10.0, 12.0, np.nan],
+            "B": [np.nan] * 4,
+        })
+        gains = window_gains(data)
+        self.assertAlmostEqual(gains["A"], 20.0)
+        self.assertTrue(np.isnan(gains["B"]))
+
+
+class TestCorrelations(unittest.TestCase):
+
+    def test_correlation_matrix_matches_pandas(self):
+        """Test that the masked matrix computation equals DataFrame.corr with missing values."""
+        data = make_prices(missing=0.1)
+        returns = compute_returns(data)
+        expected = returns.drop(columns="timestamp").corr()
+        pd.testing.assert_frame_equal(correlation_matrix(returns), expected, atol=1e-10)
+
+    def test_top_correlations_match_full_sort(self):
+        """Test that the partial selection returns the pairs of the EDA unstack-and-sort approach."""
+        corr = correlation_matrix(compute_returns(make_prices(tickers=20, seed=3)))
+        pairs = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1)).stack()
+
+        top = top_correlations(corr, k=5)
+        expected = pairs.sort_values(ascending=False).head(5)
+        self.assertEqual(list(zip(top["Stock1"], top["Stock2"])), list(expected.index))
+        np.testing.assert_allclose(top["Correlation"], expected.to_numpy())
+
+        bottom = top_correlations(corr, k=5, sign="negative")
+        np.testing.assert_allclose(bottom["Correlation"], pairs.sort_values().head(5).to_numpy())
+        self.assertTrue((bottom["Correlation"] < 0).all())
+
+    def test_lead_lag_matches_shifted_corrwith(self):
+        """Test that every lag equals the EDA corrwith over a shifted frame, for every leading ticker."""
+        data = make_prices(bars=80, tickers=5, missing=0.05)
+        prices = data.drop(columns="timestamp")
+        lagged = lead_lag_correlations(data, lags=(1, 2, 5))
+        self.assertEqual(lagged.shape, (3, 5, 5))
+
+        for position, lag in enumerate((1, 2, 5)):
+            for i, leader in enumerate(prices.columns):
+                expected = prices.corrwith(prices[leader].shift(lag))
+                np.testing.assert_allclose(lagged[position, i], expected.to_numpy(), atol=1e-10)
+
+    def test_lead_lag_finds_planted_leader(self):
+        """Test that a ticker copied with a two-bar delay is reported as following its leader."""
+        rng = np.random.default_rng(7)
+        returns = rng.normal(size=(300, 6))
+        returns[2:, 4] = returns[:-2, 1] + rng.normal(scale=0.1, size=298)
+        tickers = [f"T{i}" for i in range(6)]
+
+        lagged = lead_lag_correlations(returns, lags=(1, 2))
+        self.assertEqual(influenced_by(lagged, tickers, "T1", k=1, lag_index=1).index[0], "T4")
+        self.assertEqual(leading_stocks(lagged, tickers, k=1, lag_index=1).index[0], "T1")
+
+
+class TestRollingCorrelation(unittest.TestCase):
+
+    def test_incremental_updates_match_recomputation(self):
+        """Test that bar-by-bar and batch updates equal a full recomputation over the window."""
+        data = make_prices(bars=150, tickers=6, missing=0.05)
+        _, tickers, prices = price_matrix(data)
+        rolling = RollingCorrelation(tickers, window=40)
+
+        rolling.update(data.iloc[:100])
+        for row in prices[100:]:
+            rolling.update(row)
+        expected = correlation_matrix(pd.DataFrame(compute_returns(prices)[-40:], columns=tickers))
+
+        self.assertEqual(rolling.returns().shape, (40, 6))
+        pd.testing.assert_frame_equal(rolling.corr(), expected, atol=1e-8)
+
+    def test_cross_correlation_batches(self):
+        """Test that leading batch dimensions are computed independently."""
+        rng = np.random.default_rng(1)
+        a = rng.normal(size=(3, 50, 4))
+        b = rng.normal(size=(3, 50, 2))
+        batched = cross_correlation(a, b)
+        for index in range(3):
+            np.testing.assert_allclose(batched[index], cross_correlation(a[index], b[index]))
+
+
+if __name__ == '__main__':
+    unittest.main()
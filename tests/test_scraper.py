@@ -1,6 +1,18 @@
 # tests/test_scraper.py
 
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+import requests
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, MagicMock
 from src.mc1_scraper import (
     save_cookies,
@@ -12,7 +24,66 @@ from src.mc1_scraper import (
     retry_operation,
     fetch_stock_data,
     fetch_all_tickers_data,
+    create_http_session,
+    align_ticker_series,
+    parse_industry_names,
+    gather_industry_names_http,
+    extract_quote_links_http,
+    discover_quote_links,
+    wait_for_dom_stable,
+    wait_for_industry_page,
+    WebDriverPool,
+    filter_quote_hrefs,
+    collect_quote_links_in_browser,
+    quote_href_script,
+    ChartCache,
+    save_data_to_columnar,
+    load_data_from_columnar,
+    iter_ticker_frames,
+    run_streaming_pipeline,
+    load_long_csv,
+    parse_chart_arrays,
+    fetch_ohlcv_data,
+    batch_symbols,
+    spark_range,
+    TokenBucket,
+    HostRateLimiter,
+    CrawlFrontier,
+    crawl_market,
+    AdaptiveConcurrency,
+    parse_retry_after,
+    MetricsRegistry,
+    JsonLogFormatter,
+    log_event,
+    logger,
+    metrics,
+    get_driver,
+    close_driver,
+    cli,
+    CheckpointJournal,
+    CircuitBreaker,
+    RetryScheduler,
+    is_retryable_error,
+    run_coroutine,
+    SessionManager,
+    WorkQueue,
+    enqueue_work,
+    run_worker,
+    merge_work_queue,
+    run_sharded,
+    PriceStore,
+    intraday_windows,
+    stitch_intraday_chunks,
+    to_exchange_time,
+    fetch_intraday_history,
+    DiscoveryCache,
+    ScraperDaemon,
+    select_prices,
 )
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from selenium.common.exceptions import NoSuchElementException
+import pandas as pd
 
 # Test suite for mc1_scraper.py
 class TestScraper(unittest.TestCase):
@@ -139,6 +210,1902 @@ class TestScraper(unittest.TestCase):
         result = retry_operation(mock_function, retries=2, delay=1)
         self.assertIsNone(result)
 
+
+# Local stand-in for the Yahoo chart endpoint, answering every ticker after a fixed delay
+class _SlowChartHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+    delay = 0.1
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.request_headers.append({k.lower(): v for k, v in self.headers.items()})
+        time.sleep(self.delay)
+        body = json.dumps({
+            "chart": {
+                "result": [{
+                    "timestamp": [1609459200, 1609545600],
+                    "indicators": {"quote": [{"close": [123.45, 125.67]}]},
+                }]
+            }
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_chart_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.connections = set()
+    server.request_headers = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v8/finance/chart/"
+
+
+class TestConcurrentFetch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, cls.chart_url = _start_chart_server(_SlowChartHandler)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _timed_fetch(self, n_tickers, max_concurrency):
+        links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(n_tickers)]
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url):
+            start = time.perf_counter()
+            data = fetch_all_tickers_data(links, max_concurrency=max_concurrency)
+            return time.perf_counter() - start, data
+
+    def test_concurrent_matches_sequential(self):
+        """
+        Test that concurrent fetching returns the same merged frame as sequential fetching.
+        """
+        _, sequential = self._timed_fetch(4, max_concurrency=1)
+        _, concurrent = self._timed_fetch(4, max_concurrency=4)
+        self.assertEqual(list(sequential.columns), ["timestamp", "T0", "T1", "T2", "T3"])
+        self.assertTrue(sequential.equals(concurrent))
+
+    def test_speedup_grows_with_tickers(self):
+        """
+        Test that the speedup over sequential fetching grows with the number of tickers.
+        """
+        speedups = []
+        for n_tickers in (2, 8):
+            sequential, _ = self._timed_fetch(n_tickers, max_concurrency=1)
+            concurrent, _ = self._timed_fetch(n_tickers, max_concurrency=n_tickers)
+            speedups.append(sequential / concurrent)
+        self.assertGreater(speedups[0], 1.2)
+        self.assertGreater(speedups[1], speedups[0] * 1.5)
+
+
+class _FastChartHandler(_SlowChartHandler):
+    delay = 0
+
+
+class TestHttpSession(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.chart_url = _start_chart_server(_FastChartHandler)
+        self.links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(6)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_session_reuses_connections(self):
+        """
+        Test that a shared session sends all sequential requests over one connection.
+        """
+        session = create_http_session({"A3": "cookie"}, {"user-agent": "test-agent"})
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url):
+            data = fetch_all_tickers_data(self.links, max_concurrency=1, session=session)
+        session.close()
+        self.assertEqual(len(data.columns), 7)
+        self.assertEqual(len(self.server.connections), 1)
+
+        headers = self.server.request_headers[0]
+        self.assertIn("gzip", headers["accept-encoding"])
+        self.assertEqual(headers["user-agent"], "test-agent")
+        self.assertIn("A3=cookie", headers["cookie"])
+
+    def test_session_caps_connections_per_host(self):
+        """
+        Test that concurrent requests never open more connections than the per-host cap.
+        """
+        session = create_http_session(max_connections_per_host=2)
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url):
+            data = fetch_all_tickers_data(self.links, max_concurrency=6, session=session)
+        session.close()
+        self.assertEqual(len(data.columns), 7)
+        self.assertLessEqual(len(self.server.connections), 2)
+
+
+class TestAlignment(unittest.TestCase):
+
+    def setUp(self):
+        # GOLD opens at 14:30 UTC, SLV at 13:30 UTC after the daylight saving switch
+        self.frames = [
+            pd.DataFrame({
+                "timestamp": pd.to_datetime(["2024-11-06 14:30", "2024-11-07 14:30"]),
+                "GOLD": [19.1, 19.4],
+            }),
+            pd.DataFrame({
+                "timestamp": pd.to_datetime(["2024-11-06 13:30", "2024-11-07 13:30", "2024-11-08 13:30"]),
+                "SLV": [28.0, 28.5, 27.9],
+            }),
+        ]
+
+    def test_matches_pairwise_outer_merge(self):
+        """
+        Test that single-pass alignment matches the pairwise outer-merge result.
+        """
+        expected = pd.merge(self.frames[0], self.frames[1], on="timestamp", how="outer")
+        expected = expected.sort_values(by="timestamp").reset_index(drop=True)
+        aligned = align_ticker_series(self.frames)
+        pd.testing.assert_frame_equal(aligned, expected, check_dtype=False)
+
+    def test_snap_to_trading_day(self):
+        """
+        Test that snapping to days removes the rows created by different open times.
+        """
+        aligned = align_ticker_series(self.frames, snap_to="D")
+        self.assertEqual(len(aligned), 3)
+        self.assertEqual(aligned["GOLD"].isna().sum(), 1)
+        self.assertAlmostEqual(aligned["SLV"].iloc[1], 28.5)
+
+    def test_calendar_index(self):
+        """
+        Test aligning on an explicit calendar index.
+        """
+        calendar = pd.date_range("2024-11-05", "2024-11-07", freq="D")
+        aligned = align_ticker_series(self.frames, snap_to="D", index=calendar)
+        self.assertEqual(list(aligned["timestamp"]), list(calendar))
+        self.assertTrue(aligned.iloc[0, 1:].isna().all())
+        self.assertAlmostEqual(aligned["GOLD"].iloc[2], 19.4)
+
+    def test_duplicate_tickers_keep_last(self):
+        """
+        Test that a repeated ticker keeps its last frame.
+        """
+        repeated = self.frames[0].assign(GOLD=[1.0, 2.0])
+        aligned = align_ticker_series(self.frames + [repeated])
+        self.assertEqual(list(aligned.columns), ["timestamp", "GOLD", "SLV"])
+        self.assertEqual(aligned["GOLD"].dropna().tolist(), [1.0, 2.0])
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def _read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as file:
+        return file.read()
+
+
+def _fixture_session(pages):
+    """
+    Builds a mock session that serves fixture HTML by URL suffix.
+    """
+    session = MagicMock()
+
+    def get(url, **kwargs):
+        response = MagicMock()
+        response.text = next(html for suffix, html in pages.items() if url.endswith(suffix))
+        return response
+
+    session.get.side_effect = get
+    return session
+
+
+class TestHttpDiscovery(unittest.TestCase):
+
+    def setUp(self):
+        self.sector_html = _read_fixture("sector_basic_materials.html")
+        self.gold_html = _read_fixture("industry_gold.html")
+        self.shell_html = _read_fixture("industry_shell.html")
+
+    def test_parse_industry_names(self):
+        """
+        Test parsing industry names from a saved sector page.
+        """
+        names = parse_industry_names(self.sector_html)
+        self.assertEqual(names[0], "Specialty Chemicals")
+        self.assertEqual(names[-1], "Paper & Paper Products")
+        self.assertEqual(len(names), 6)
+        self.assertEqual(parse_industry_names(self.shell_html), [])
+
+    def test_gather_industry_names_http(self):
+        """
+        Test that HTTP discovery populates the industry names used by generate_urls.
+        """
+        session = _fixture_session({"/basic-materials/": self.sector_html})
+        names = gather_industry_names_http(session)
+        urls = generate_urls()
+        self.assertEqual(len(urls), len(names))
+        self.assertIn("https://finance.yahoo.com/sectors/basic-materials/gold/", urls)
+        self.assertIn("https://finance.yahoo.com/sectors/basic-materials/paper-paper-products/", urls)
+
+    @patch("src.mc1_scraper.time.sleep")
+    @patch("selenium.webdriver.Chrome")
+    def test_http_links_match_browser_links(self, mock_driver, mock_sleep):
+        """
+        Test that static HTML extraction returns the same links as the Selenium path.
+        """
+        url = "https://finance.yahoo.com/sectors/basic-materials/gold/"
+        mock_driver.page_source = self.gold_html
+        browser_links = extract_quote_links(mock_driver, [url])
+        http_links = extract_quote_links_http([url], _fixture_session({"/gold/": self.gold_html}))
+        self.assertEqual(http_links, browser_links)
+        self.assertEqual(len(http_links), 10)
+        self.assertEqual(http_links[0], "https://finance.yahoo.com/quote/NEM/")
+
+    def test_fallback_when_static_html_lacks_links(self):
+        """
+        Test that pages without quote links in their static HTML use the fallback.
+        """
+        session = _fixture_session({"/gold/": self.gold_html, "/copper/": self.shell_html})
+        fallback = MagicMock(return_value=["https://finance.yahoo.com/quote/FCX/"])
+        links = extract_quote_links_http(
+            ["https://finance.yahoo.com/sectors/basic-materials/gold/",
+             "https://finance.yahoo.com/sectors/basic-materials/copper/"],
+            session,
+            fallback,
+        )
+        fallback.assert_called_once_with("https://finance.yahoo.com/sectors/basic-materials/copper/")
+        self.assertEqual(links[-1], "https://finance.yahoo.com/quote/FCX/")
+        self.assertEqual(len(links), 11)
+
+    def test_discovery_without_fallback_driver(self):
+        """
+        Test that discovery returns no links when the sector page lacks data and no driver is given.
+        """
+        session = _fixture_session({"/basic-materials/": self.shell_html})
+        self.assertEqual(discover_quote_links(session), [])
+
+
+class TestPageReadiness(unittest.TestCase):
+
+    def test_dom_stable_after_rendering_settles(self):
+        """
+        Test that the DOM counts as stable once the link count stops changing.
+        """
+        fake_driver = MagicMock()
+        fake_driver.execute_script.side_effect = [1, 5, 9] + [12] * 100
+        self.assertTrue(wait_for_dom_stable(fake_driver, timeout=5, settle=0.05, poll=0.01))
+
+    def test_dom_stable_times_out(self):
+        """
+        Test that a page that never settles times out instead of blocking.
+        """
+        fake_driver = MagicMock()
+        fake_driver.execute_script.side_effect = range(10**6)
+        self.assertFalse(wait_for_dom_stable(fake_driver, timeout=0.2, settle=0.05, poll=0.01))
+
+    def test_industry_page_without_links_times_out(self):
+        """
+        Test that an industry page without quote links reports not ready after the timeout.
+        """
+        fake_driver = MagicMock()
+        fake_driver.find_element.side_effect = NoSuchElementException()
+        start = time.perf_counter()
+        self.assertFalse(wait_for_industry_page(fake_driver, timeout=0.3))
+        self.assertLess(time.perf_counter() - start, 2)
+
+
+class TestWebDriverPool(unittest.TestCase):
+
+    @patch("src.mc1_scraper.open_browser_session")
+    def test_pool_extracts_in_parallel_and_reports_latency(self, mock_bootstrap):
+        """
+        Test that the pool renders pages on all drivers and records page-ready latency per URL.
+        """
+        gold_hrefs = [f"/quote/T{chr(65 + i)}/" for i in range(12)]
+        drivers = []
+
+        def factory():
+            fake_driver = MagicMock()
+            fake_driver.execute_script.side_effect = (
+                lambda script: gold_hrefs if script == quote_href_script else 14
+            )
+            fake_driver.get.side_effect = lambda url: time.sleep(0.2)
+            drivers.append(fake_driver)
+            return fake_driver
+
+        urls = [f"https://finance.yahoo.com/sectors/basic-materials/industry-{i}/" for i in range(4)]
+        with WebDriverPool(size=4, driver_factory=factory) as pool:
+            start = time.perf_counter()
+            links = pool.extract_quote_links(urls)
+            elapsed = time.perf_counter() - start
+            summary = pool.latency_summary()
+
+        self.assertEqual(len(drivers), 4)
+        self.assertEqual(mock_bootstrap.call_count, 4)
+        self.assertEqual(len(links), 40)
+        self.assertEqual(set(pool.page_ready_latency), set(urls))
+        self.assertEqual(summary["count"], 4)
+        # Four 0.2s navigations plus a 0.5s settle each would take 2.8s sequentially
+        self.assertLess(elapsed, 1.8)
+        for fake_driver in drivers:
+            fake_driver.quit.assert_called_once()
+
+
+class TestInBrowserExtraction(unittest.TestCase):
+
+    def test_single_pass_filter_matches_two_step_filter(self):
+        """
+        Test that the compiled filter accepts exactly the hrefs the former two-regex check accepted.
+        """
+        import re
+        hrefs = [
+            "/quote/AAPL/", "/quote/AAPL", "/quote/BRK-B/", "/quote/%5EGSPC/", "/quote/GC=F/",
+            "/quote/AEM.TO/", "/quote/NEM/news/", "/quote/nem/", "/quote/", "/quote//", "/news/x/",
+            "/quote/abc/quote/XYZ/", "https://finance.yahoo.com/quote/MSFT/", "/quote/A1/",
+        ]
+        valid_ticker_pattern = re.compile(r"/quote/([A-Z]+)(/|$)")
+        expected = [
+            "https://finance.yahoo.com" + href for href in hrefs
+            if re.match(r"^/quote/.+/$", href)
+            and valid_ticker_pattern.search("https://finance.yahoo.com" + href)
+        ]
+        self.assertEqual(filter_quote_hrefs(hrefs, limit=len(hrefs)), expected)
+
+    def test_collect_links_with_one_script_call(self):
+        """
+        Test that in-browser extraction uses a single script call and no page source.
+        """
+        fake_driver = MagicMock()
+        fake_driver.execute_script.return_value = ["/quote/NEM/", "/quote/BRK-B/", "/quote/GOLD/"]
+        links = collect_quote_links_in_browser(fake_driver)
+        fake_driver.execute_script.assert_called_once_with(quote_href_script)
+        self.assertEqual(links, ["https://finance.yahoo.com/quote/NEM/", "https://finance.yahoo.com/quote/GOLD/"])
+
+
+def _fake_daily_bars(ticker, period1, period2, *args):
+    """
+    Stand-in for fetch_stock_data serving one bar per day at 14:30 UTC within the period.
+    """
+    first = 1704205800  # 2024-01-02 14:30 UTC
+    epochs = [t for t in range(first, period2 + 1, 86400) if t >= period1]
+    if not epochs:
+        return None, None
+    return pd.to_datetime(epochs, unit="s"), [round(t / 1e7, 4) for t in epochs]
+
+
+class TestChartCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = ChartCache(self.cache_dir)
+        self.links = ["https://finance.yahoo.com/quote/NEM/", "https://finance.yahoo.com/quote/GC=F/"]
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_incremental_requests_only_new_bars(self):
+        """
+        Test that an incremental run requests bars from the watermark on and returns the full window.
+        """
+        period1, period2 = 1704153600, 1706745600  # 2024-01-02 .. 2024-02-01
+        with patch("src.mc1_scraper.fetch_stock_data", side_effect=_fake_daily_bars):
+            fetch_all_tickers_data(self.links, period1=period1, period2=period2 - 5 * 86400, cache=self.cache)
+        watermark = self.cache.load("NEM", "1d")["watermark"]
+        self.assertEqual(watermark, 1706279400)  # 2024-01-26 14:30 UTC
+
+        with patch("src.mc1_scraper.fetch_stock_data", side_effect=_fake_daily_bars) as mock_fetch:
+            incremental = fetch_all_tickers_data(
+                self.links, period1=period1, period2=period2, cache=self.cache, incremental=True
+            )
+            requested_starts = {call.args[1] for call in mock_fetch.call_args_list}
+
+        self.assertEqual(requested_starts, {watermark})
+        self.assertEqual(self.cache.load("NEM", "1d")["watermark"], 1706711400)
+
+        with patch("src.mc1_scraper.fetch_stock_data", side_effect=_fake_daily_bars):
+            full = fetch_all_tickers_data(self.links, period1=period1, period2=period2)
+        pd.testing.assert_frame_equal(incremental, full)
+
+    def test_cached_bars_survive_failed_fetch(self):
+        """
+        Test that cached bars are returned when an incremental fetch brings nothing new.
+        """
+        with patch("src.mc1_scraper.fetch_stock_data", side_effect=_fake_daily_bars):
+            first = fetch_all_tickers_data(self.links[:1], period1=1704153600, period2=1704758400, cache=self.cache)
+        with patch("src.mc1_scraper.fetch_stock_data", return_value=(None, None)):
+            second = fetch_all_tickers_data(
+                self.links[:1], period1=1704153600, period2=1704758400, cache=self.cache, incremental=True
+            )
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_eviction_by_ttl_and_size(self):
+        """
+        Test that stale entries and, above the size limit, the oldest entries are evicted.
+        """
+        for ticker in ("A", "B", "C"):
+            self.cache.update(ticker, "1d", [1704205800, 1704292200], [1.0, float("nan")])
+        os.utime(self.cache.path("A", "1d"), (0, 0))
+        os.utime(self.cache.path("B", "1d"), (time.time() - 60, time.time() - 60))
+
+        self.cache.evict()
+        self.assertIsNone(self.cache.load("A", "1d"))
+        self.assertEqual(self.cache.load("B", "1d")["close"], [1.0, None])
+
+        self.cache.max_bytes = os.path.getsize(self.cache.path("C", "1d"))
+        self.cache.evict()
+        self.assertIsNone(self.cache.load("B", "1d"))
+        self.assertIsNotNone(self.cache.load("C", "1d"))
+
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestColumnarStorage(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.first_run = pd.DataFrame({
+            "timestamp": pd.to_datetime(["2024-10-30 13:30", "2024-10-31 13:30", "2024-11-01 13:30"]),
+            "NEM": [52.1, 52.9, 51.7],
+            "GOLD": [19.5, 19.2, 19.0],
+        })
+        self.second_run = pd.DataFrame({
+            "timestamp": pd.to_datetime(["2024-11-01 13:30", "2024-11-04 14:30"]),
+            "NEM": [51.8, 50.2],
+            "AEM": [81.0, 80.4],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _roundtrip(self, file_format):
+        save_data_to_columnar(self.first_run, self.root, file_format)
+        written = save_data_to_columnar(self.second_run, self.root, file_format)
+        self.assertEqual(len(written), 1)  # only November was touched
+        return load_data_from_columnar(self.root, file_format=file_format)
+
+    def test_partitioned_append(self):
+        """
+        Test that appends merge into month partitions, new values replacing stored ones.
+        """
+        for file_format in ("parquet", "arrow"):
+            data = self._roundtrip(file_format)
+            self.assertEqual(len(data), 4)
+            self.assertEqual(set(data.columns), {"timestamp", "NEM", "GOLD", "AEM"})
+            self.assertAlmostEqual(float(data["NEM"].iloc[2]), 51.8, places=4)
+            self.assertAlmostEqual(float(data["GOLD"].iloc[2]), 19.0, places=4)
+            self.assertTrue(pd.isna(data["AEM"].iloc[0]))
+            self.assertEqual(str(data["NEM"].dtype), "float32")
+            shutil.rmtree(self.root)
+            os.makedirs(self.root)
+
+    def test_projected_range_read(self):
+        """
+        Test reading only selected tickers within a date range.
+        """
+        save_data_to_columnar(self.first_run, self.root, price_dtype="float64")
+        save_data_to_columnar(self.second_run, self.root, price_dtype="float64")
+        data = load_data_from_columnar(self.root, tickers=["AEM", "NEM", "XYZ"], start="2024-10-31", end="2024-11-02")
+        self.assertEqual(list(data.columns), ["timestamp", "AEM", "NEM", "XYZ"])
+        self.assertEqual(list(data["timestamp"]), list(pd.to_datetime(["2024-10-31 13:30", "2024-11-01 13:30"])))
+        self.assertEqual(data["NEM"].tolist(), [52.9, 51.8])
+        self.assertTrue(data["XYZ"].isna().all())
+        self.assertEqual(str(data["timestamp"].dtype), "datetime64[ns]")
+
+
+class TestStreamingPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.workdir, "stock_data_long.csv")
+        self.links = [f"https://finance.yahoo.com/quote/T{chr(65 + i)}/" for i in range(12)]
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_in_flight_window_is_bounded(self):
+        """
+        Test that no more than `window` tickers are fetched or pulled from the links at once.
+        """
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0, "pulled": 0, "yielded": 0, "max_ahead": 0}
+
+        def links():
+            for link in self.links:
+                state["pulled"] += 1
+                state["max_ahead"] = max(state["max_ahead"], state["pulled"] - state["yielded"])
+                yield link
+
+        def fake_fetch(ticker, *args):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.02)
+            with lock:
+                state["in_flight"] -= 1
+            return pd.DataFrame({"timestamp": pd.to_datetime([1704205800], unit="s"), ticker: [1.0]})
+
+        with patch("src.mc1_scraper.fetch_ticker_frame", side_effect=fake_fetch):
+            for _ in iter_ticker_frames(links(), window=3):
+                state["yielded"] += 1
+
+        self.assertEqual(state["yielded"], 12)
+        self.assertLessEqual(state["peak"], 3)
+        self.assertLessEqual(state["max_ahead"], 4)
+
+    def test_partial_results_on_disk(self):
+        """
+        Test that tickers completed before a crash are already written to the sink file.
+        """
+        def fake_fetch(ticker, *args):
+            if ticker == "TF":
+                raise KeyboardInterrupt
+            return pd.DataFrame({"timestamp": pd.to_datetime([1704205800], unit="s"), ticker: [1.0]})
+
+        with patch("src.mc1_scraper.fetch_ticker_frame", side_effect=fake_fetch):
+            with self.assertRaises(KeyboardInterrupt):
+                run_streaming_pipeline(self.links, self.filename, window=1)
+
+        written = load_long_csv(self.filename)
+        self.assertEqual(list(written.columns), ["timestamp", "TA", "TB", "TC", "TD", "TE"])
+
+    def test_long_file_matches_wide_fetch(self):
+        """
+        Test that streaming to disk and aligning the long file matches fetch_all_tickers_data.
+        """
+        period1, period2 = 1704153600, 1706745600
+        with patch("src.mc1_scraper.fetch_stock_data", side_effect=_fake_daily_bars):
+            written = run_streaming_pipeline(self.links[:4], self.filename, window=2, period1=period1, period2=period2)
+            expected = fetch_all_tickers_data(self.links[:4], period1=period1, period2=period2)
+        self.assertEqual(written, 4)
+        streamed = load_long_csv(self.filename)
+        pd.testing.assert_frame_equal(streamed[expected.columns], expected)
+
+
+OHLCV_RESPONSE = {
+    "chart": {
+        "result": [{
+            "meta": {"symbol": "GC=F", "exchangeTimezoneName": "America/New_York"},
+            "timestamp": [1672722000, 1672725600, 1672729200],
+            "indicators": {
+                "quote": [{
+                    "open": [1846.9, 1846.8, None],
+                    "high": [1847.6, 1850.7, None],
+                    "low": [1844.2, 1846.2, None],
+                    "close": [1846.8, 1848.2, None],
+                    "volume": [5083, 6383, None],
+                }],
+                "adjclose": [{"adjclose": [1846.8, 1848.2, None]}],
+            },
+        }]
+    }
+}
+
+
+class TestOhlcvArrays(unittest.TestCase):
+
+    def test_parse_all_fields(self):
+        """
+        Test extracting all fields into typed arrays with missing values handled.
+        """
+        arrays = parse_chart_arrays(OHLCV_RESPONSE)
+        self.assertEqual(arrays["timestamp"].dtype, np.int64)
+        self.assertEqual(arrays["volume"].dtype, np.int64)
+        self.assertEqual(arrays["volume"].tolist(), [5083, 6383, 0])
+        for field in ("open", "high", "low", "close", "adjclose"):
+            self.assertEqual(arrays[field].dtype, np.float32)
+            self.assertTrue(np.isnan(arrays[field][2]))
+        self.assertAlmostEqual(float(arrays["high"][1]), 1850.7, places=3)
+
+    def test_field_selection_and_missing_adjclose(self):
+        """
+        Test keeping only selected fields, with adjclose absent as for intraday intervals.
+        """
+        intraday = json.loads(json.dumps(OHLCV_RESPONSE))
+        del intraday["chart"]["result"][0]["indicators"]["adjclose"]
+        arrays = parse_chart_arrays(intraday, fields=("close", "adjclose"), price_dtype="float64")
+        self.assertEqual(set(arrays), {"timestamp", "close", "adjclose"})
+        self.assertEqual(arrays["close"].dtype, np.float64)
+        self.assertTrue(np.isnan(arrays["adjclose"]).all())
+        with self.assertRaises(ValueError):
+            parse_chart_arrays(OHLCV_RESPONSE, fields=("bid",))
+
+    def test_arrays_smaller_than_python_lists(self):
+        """
+        Test that the array representation uses less memory than lists of Python objects.
+        """
+        import sys
+        n = 10000
+        quote = {f: [1846.5 + i for i in range(n)] for f in ("open", "high", "low", "close")}
+        quote["volume"] = list(range(n))
+        response = {"chart": {"result": [{
+            "timestamp": list(range(1672722000, 1672722000 + n * 3600, 3600)),
+            "indicators": {"quote": [quote]},
+        }]}}
+        arrays = parse_chart_arrays(response, fields=("open", "high", "low", "close", "volume"))
+        array_bytes = sum(a.nbytes for a in arrays.values())
+
+        list_bytes = sum(sys.getsizeof(v) + sum(sys.getsizeof(x) for x in v) for v in quote.values())
+        list_bytes += sum(sys.getsizeof(t) for t in pd.to_datetime(response["chart"]["result"][0]["timestamp"], unit="s"))
+        self.assertLess(array_bytes * 4, list_bytes)
+
+    @patch("requests.get")
+    def test_fetch_ohlcv_layout(self, mock_get):
+        """
+        Test that multi-ticker OHLCV data comes back with (field, ticker) columns.
+        """
+        mock_get.return_value.json.return_value = OHLCV_RESPONSE
+        data = fetch_ohlcv_data(["GC=F", "https://finance.yahoo.com/quote/SI=F/"], 1672700000, 1672800000, "1h")
+        self.assertEqual(data.columns.names, ["field", "ticker"])
+        self.assertEqual(len(data.columns), 12)
+        self.assertEqual(data[("volume", "SI=F")].tolist(), [5083, 6383, 0])
+        self.assertEqual(str(data.index.tz), "UTC")
+
+
+# Local stand-in for both the spark (batch) and chart (single ticker) endpoints
+class _SparkAndChartHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    omitted = {"TC", "TK"}  # symbols the batch endpoint leaves out
+
+    def _bars(self, symbol):
+        offset = sum(map(ord, symbol))
+        return {
+            "timestamp": [1704205800 + day * 86400 for day in range(5)],
+            "indicators": {"quote": [{"close": [float(offset + day) for day in range(5)]}]},
+        }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.startswith("/v7/finance/spark"):
+            symbols = parse_qs(url.query)["symbols"][0].split(",")
+            self.server.batches.append(symbols)
+            result = [{"symbol": s, "response": [self._bars(s)]} for s in symbols if s not in self.omitted]
+            payload = {"spark": {"result": result, "error": None}}
+        else:
+            self.server.charts.append(url.path.rsplit("/", 1)[-1])
+            payload = {"chart": {"result": [self._bars(url.path.rsplit("/", 1)[-1])]}}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestBatchFetch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _SparkAndChartHandler)
+        self.server.batches, self.server.charts = [], []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        root = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.patches = [
+            patch("src.mc1_scraper.chart_base_url", root + "/v8/finance/chart/"),
+            patch("src.mc1_scraper.spark_base_url", root + "/v7/finance/spark"),
+        ]
+        for p in self.patches:
+            p.start()
+        self.links = [f"https://finance.yahoo.com/quote/T{chr(65 + i)}/" for i in range(25)]
+        self.period = dict(period1=1704153600, period2=1704758400)
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_batch_sizes(self):
+        """
+        Test that symbols are split into the fewest, evenly sized batches.
+        """
+        self.assertEqual([len(b) for b in batch_symbols(list(range(25)))], [13, 12])
+        self.assertEqual([len(b) for b in batch_symbols(list(range(40)))], [20, 20])
+        self.assertEqual([len(b) for b in batch_symbols(list(range(3)))], [3])
+        self.assertEqual(batch_symbols([]), [])
+
+    def test_spark_range_covers_period(self):
+        """
+        Test choosing the shortest range that reaches back to period1.
+        """
+        now = 1_700_000_000
+        self.assertEqual(spark_range(now - 3 * 86400, now), "5d")
+        self.assertEqual(spark_range(now - 365 * 86400, now), "1y")
+        self.assertEqual(spark_range(now - 4000 * 86400, now), "max")
+
+    def test_batch_mode_cuts_requests_and_falls_back(self):
+        """
+        Test that batch mode needs two spark requests plus chart requests for omitted symbols only.
+        """
+        session = create_http_session()
+        batched = fetch_all_tickers_data(self.links, session=session, fetch_mode="auto", **self.period)
+        self.assertEqual(len(self.server.batches), 2)
+        self.assertEqual(sorted(self.server.charts), ["TC", "TK"])
+
+        self.server.charts.clear()
+        single = fetch_all_tickers_data(self.links, session=session, fetch_mode="chart", **self.period)
+        session.close()
+        self.assertEqual(len(self.server.charts), 25)
+        pd.testing.assert_frame_equal(batched, single)
+
+    def test_auto_mode_single_ticker_uses_chart(self):
+        """
+        Test that auto mode does not batch a single ticker.
+        """
+        fetch_all_tickers_data(self.links[:1], fetch_mode="auto", **self.period)
+        self.assertEqual(self.server.batches, [])
+        self.assertEqual(self.server.charts, ["TA"])
+
+
+class TestMarketCrawl(unittest.TestCase):
+
+    def setUp(self):
+        sector_html = _read_fixture("sector_basic_materials.html")
+        gold_html = _read_fixture("industry_gold.html")
+        second_page = '<a href="/quote/NGD/">NGD</a><a href="/quote/NEM/">NEM</a><a href="/quote/EQX/">EQX</a>'
+        self.requested = []
+
+        def get(url, **kwargs):
+            self.requested.append(url)
+            response = MagicMock()
+            if url.endswith("/sectors/basic-materials/") or url.endswith("/sectors/energy/"):
+                response.text = sector_html if "basic-materials" in url else "<html></html>"
+            elif "/gold/?start=0&count=100" in url:
+                response.text = gold_html
+            elif "/gold/?start=100&count=100" in url:
+                response.text = second_page
+            elif "/gold/?start=200&count=100" in url:
+                response.text = second_page  # nothing new, paging stops here
+            else:
+                response.text = "<html></html>"
+            return response
+
+        self.session = MagicMock()
+        self.session.get.side_effect = get
+
+    def test_crawl_deduplicates_and_pages(self):
+        """
+        Test crawling sectors, industries and result pages with URL and ticker deduplication.
+        """
+        links = crawl_market(self.session, sectors=["basic-materials", "energy", "basic-materials"],
+                             rate=1000, burst=1000)
+        tickers = [link.split('/')[-2] for link in links]
+
+        self.assertEqual(len(tickers), len(set(tickers)))
+        self.assertIn("HMY", tickers)  # 11th link of the first gold page, beyond the former cap of 10
+        self.assertIn("EQX", tickers)  # second result page
+        self.assertNotIn("news", tickers)  # /quote/NEM/news/ maps to NEM
+        self.assertEqual(len(self.requested), len(set(self.requested)))
+        industry_urls = [url for url in self.requested if "/sectors/basic-materials/" in url and url.count("/") > 5]
+        self.assertEqual(len(industry_urls), 8)
+        self.assertTrue(all("count=100" in url for url in industry_urls))  # no default-sized first page
+        self.assertTrue(any("start=200" in url for url in self.requested))
+        self.assertFalse(any("start=300" in url for url in self.requested))
+        # 2 sectors, 6 industries and 2 extra gold result pages
+        self.assertEqual(len(self.requested), 10)
+
+    def test_frontier_deduplication(self):
+        """
+        Test that the frontier rejects repeated pages and tickers.
+        """
+        frontier = CrawlFrontier()
+        self.assertTrue(frontier.add_page("sector", "https://finance.yahoo.com/sectors/energy/"))
+        self.assertFalse(frontier.add_page("sector", "https://finance.yahoo.com/sectors/energy/"))
+        self.assertEqual(frontier.add_links([
+            "https://finance.yahoo.com/quote/XOM/", "https://finance.yahoo.com/quote/XOM/news/",
+            "https://finance.yahoo.com/quote/CVX/",
+        ]), 2)
+        self.assertEqual(len(frontier), 1)
+
+    def test_token_bucket_paces_requests(self):
+        """
+        Test that a token bucket allows a burst and then paces at its rate.
+        """
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.perf_counter()
+        for _ in range(8):
+            bucket.acquire()
+        elapsed = time.perf_counter() - start
+        self.assertGreater(elapsed, 0.25)  # 6 paced tokens at 20/s
+        self.assertLess(elapsed, 0.6)
+
+    def test_hosts_are_limited_independently(self):
+        """
+        Test that pacing one host does not slow down another.
+        """
+        limiter = HostRateLimiter(rate=1, burst=1)
+        limiter.acquire("https://finance.yahoo.com/sectors/")
+        start = time.perf_counter()
+        limiter.acquire("https://query1.finance.yahoo.com/v8/finance/chart/X")
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertGreater(limiter.bucket("https://finance.yahoo.com/x").try_acquire(), 0.5)
+
+
+class _CapacityChartHandler(_SlowChartHandler):
+    """Serves at most `capacity` requests at a time and answers the rest with 429."""
+    delay = 0.05
+    capacity = 3
+
+    def do_GET(self):
+        with self.server.lock:
+            admitted = self.server.active < self.capacity
+            if admitted:
+                self.server.active += 1
+                self.server.peak = max(self.server.peak, self.server.active)
+        if not admitted:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.05")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        try:
+            super().do_GET()
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+
+def _fake_response(status, retry_after=None):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    return response
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def test_additive_increase_and_multiplicative_decrease(self):
+        """
+        Test that successes grow the limit by about one per round and a throttle halves it.
+        """
+        session = MagicMock()
+        session.get.return_value = _fake_response(200)
+        controller = AdaptiveConcurrency(session, initial=4, max_limit=16)
+        for _ in range(4):
+            controller.get("https://example.com/")
+        self.assertEqual(int(controller.limit), 4)  # 4 + 1/4 + ... stays just below 5
+        for _ in range(2):
+            controller.get("https://example.com/")
+        self.assertEqual(controller.metrics()["limit"], 5)
+
+        session.get.side_effect = [_fake_response(429, "0"), _fake_response(200)]
+        response = controller.get("https://example.com/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.get.call_count, 8)
+        self.assertEqual(controller.metrics()["limit"], 3)  # 5.3 halved, plus one success
+        self.assertEqual(controller.metrics()["throttled"], 1)
+        self.assertGreater(controller.rate(), 0)
+
+    def test_gives_up_after_max_retries(self):
+        """
+        Test that a persistently throttled request returns its last response.
+        """
+        session = MagicMock()
+        session.get.return_value = _fake_response(503, "0")
+        controller = AdaptiveConcurrency(session, initial=8, max_retries=2)
+        self.assertEqual(controller.get("https://example.com/").status_code, 503)
+        self.assertEqual(session.get.call_count, 3)
+        self.assertEqual(controller.metrics()["limit"], 1)
+
+    def test_retry_after_pauses_new_requests(self):
+        """
+        Test that Retry-After delays the retry.
+        """
+        session = MagicMock()
+        session.get.side_effect = [_fake_response(429, "0.3"), _fake_response(200)]
+        controller = AdaptiveConcurrency(session)
+        start = time.perf_counter()
+        controller.get("https://example.com/")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.3)
+
+    def test_parse_retry_after(self):
+        """
+        Test parsing Retry-After as seconds and as an HTTP date.
+        """
+        now = pd.Timestamp("2024-01-01 00:00:00", tz="UTC").to_pydatetime()
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertEqual(parse_retry_after("Mon, 01 Jan 2024 00:00:30 GMT", now=now), 30.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    def test_converges_below_server_capacity(self):
+        """
+        Test that a fetch against a server with limited capacity returns every ticker.
+        """
+        server, chart_url = _start_chart_server(_CapacityChartHandler)
+        server.lock = threading.Lock()
+        server.active = server.peak = 0
+        try:
+            controller = AdaptiveConcurrency(initial=8, max_limit=16)
+            links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(40)]
+            with patch("src.mc1_scraper.chart_base_url", chart_url):
+                data = fetch_all_tickers_data(links, session=controller, max_concurrency=controller.max_limit)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(len(data.columns), 41)
+        metrics = controller.metrics()
+        self.assertEqual(metrics["succeeded"], 40)
+        self.assertGreater(metrics["throttled"], 0)
+        self.assertLessEqual(server.peak, _CapacityChartHandler.capacity)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_counters_timers_and_gauges(self):
+        """
+        Test recording and snapshotting counters, gauges and stage timers.
+        """
+        registry = MetricsRegistry()
+        registry.inc("tickers", result="fetched")
+        registry.inc("tickers", 2, result="fetched")
+        registry.set_gauge("concurrency_limit", 6)
+        with registry.timer("chart_fetch", item="NEM"):
+            time.sleep(0.01)
+        registry.observe("stage_seconds", 0.5, stage="chart_fetch")
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"], [{"name": "tickers", "labels": {"result": "fetched"}, "value": 3}])
+        self.assertEqual(snapshot["gauges"][0]["value"], 6)
+        timer = snapshot["timers"][0]
+        self.assertEqual(timer["labels"], {"stage": "chart_fetch"})
+        self.assertEqual(timer["count"], 2)
+        self.assertEqual(timer["max_seconds"], 0.5)
+        self.assertGreater(timer["sum_seconds"], 0.5)
+
+    def test_disabled_registry_records_nothing(self):
+        """
+        Test that a disabled registry ignores all recording calls.
+        """
+        registry = MetricsRegistry(enabled=False)
+        registry.inc("tickers")
+        with registry.timer("align"):
+            pass
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"] + snapshot["timers"], [])
+
+    def test_export_formats(self):
+        """
+        Test exporting metrics as JSON and as Prometheus text.
+        """
+        registry = MetricsRegistry()
+        registry.inc("http_responses", endpoint="chart", status=200)
+        registry.observe("stage_seconds", 0.25, stage="csv_write")
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            json_path = os.path.join(tmp_dir, "metrics.json")
+            prom_path = os.path.join(tmp_dir, "metrics.prom")
+            registry.export(json_path)
+            registry.export(prom_path)
+            with open(json_path) as file:
+                self.assertEqual(json.load(file)["counters"][0]["value"], 1)
+            with open(prom_path) as file:
+                text = file.read()
+        finally:
+            shutil.rmtree(tmp_dir)
+        self.assertIn('mc1_http_responses_total{endpoint="chart",status="200"} 1', text)
+        self.assertIn('mc1_stage_seconds_count{stage="csv_write"} 1', text)
+        self.assertIn('mc1_stage_seconds_sum{stage="csv_write"} 0.25', text)
+        self.assertIn("# TYPE mc1_stage_seconds summary", text)
+
+    def test_json_log_events(self):
+        """
+        Test that structured log events carry their name and fields.
+        """
+        record = logger.makeRecord(logger.name, 20, __file__, 0, "Fetched 5 1d close prices for NEM.", (), None,
+                                   extra={"event": "ticker_fetched", "fields": {"ticker": "NEM", "bars": 5}})
+        entry = json.loads(JsonLogFormatter().format(record))
+        self.assertEqual(entry["event"], "ticker_fetched")
+        self.assertEqual(entry["ticker"], "NEM")
+        self.assertEqual(entry["bars"], 5)
+        self.assertEqual(entry["level"], "info")
+
+        with self.assertLogs(logger, level="WARNING") as captured:
+            log_event("ticker_missing", "Warning: No data available for X.", 30, ticker="X")
+        self.assertEqual(captured.records[0].fields, {"ticker": "X"})
+
+    @patch("src.mc1_scraper.requests.get")
+    def test_fetch_records_stages(self, mock_get):
+        """
+        Test that a fetch records chart, decode and alignment timers and ticker counters.
+        """
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "chart": {"result": [{"timestamp": [1609459200], "indicators": {"quote": [{"close": [1.0]}]}}]}
+        }
+        mock_get.return_value = mock_response
+
+        metrics.reset()
+        fetch_all_tickers_data(["https://finance.yahoo.com/quote/AAA/", "https://finance.yahoo.com/quote/BBB/"])
+        snapshot = metrics.snapshot()
+        stages = {t["labels"]["stage"]: t["count"] for t in snapshot["timers"] if t["name"] == "stage_seconds"}
+        counters = {(c["name"], tuple(c["labels"].values())): c["value"] for c in snapshot["counters"]}
+        self.assertEqual(stages["chart_fetch"], 2)
+        self.assertEqual(stages["json_decode"], 2)
+        self.assertEqual(stages["align"], 1)
+        self.assertEqual(counters[("tickers", ("fetched",))], 2)
+        self.assertEqual(counters[("http_responses", ("chart", "200"))], 2)
+
+
+class TestLazyStartup(unittest.TestCase):
+
+    def test_import_defers_heavy_dependencies(self):
+        """
+        Test that importing the module neither starts a browser nor imports selenium, bs4 or pandas.
+        """
+        code = (
+            "import sys, src.mc1_scraper\n"
+            "print(sorted(m for m in ('selenium', 'bs4', 'pandas', 'webdriver_manager') if m in sys.modules))"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "[]")
+
+    def test_driver_created_on_first_use(self):
+        """
+        Test that the shared driver comes from the factory once and is quit on close.
+        """
+        factory = MagicMock()
+        with patch("src.mc1_scraper.driver_factory", factory):
+            self.assertIs(get_driver(), get_driver())
+            factory.assert_called_once_with()
+            close_driver()
+        factory.return_value.quit.assert_called_once_with()
+
+    @patch("src.mc1_scraper.open_browser_session")
+    def test_static_discovery_does_not_start_browser(self, mock_open_session):
+        """
+        Test that HTTP discovery never calls the driver factory when the static HTML has the links.
+        """
+        session = _fixture_session({
+            "/basic-materials/": _read_fixture("sector_basic_materials.html"),
+            "/": _read_fixture("industry_gold.html"),
+        })
+        factory = MagicMock()
+        links = discover_quote_links(session, driver_factory=factory)
+        self.assertEqual(len(links), 60)
+        factory.assert_not_called()
+        mock_open_session.assert_not_called()
+
+    def test_cli_fetch_reads_links_csv(self):
+        """
+        Test the fetch command against a local chart server, starting from an existing links CSV.
+        """
+        server, chart_url = _start_chart_server(_FastChartHandler)
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            links_file = os.path.join(tmp_dir, "links.csv")
+            output = os.path.join(tmp_dir, "prices.csv")
+            metrics_file = os.path.join(tmp_dir, "metrics.prom")
+            journal_file = os.path.join(tmp_dir, "journal.sqlite")
+            session_file = os.path.join(tmp_dir, "session.json")
+            store_file = os.path.join(tmp_dir, "prices.sqlite")
+            with open(links_file, "w") as file:
+                file.write("Link\nhttps://finance.yahoo.com/quote/AAA/\nhttps://finance.yahoo.com/quote/BBB/\n")
+
+            factory = MagicMock()
+            with patch("src.mc1_scraper.chart_base_url", chart_url), patch("src.mc1_scraper.driver_factory", factory), \
+                    patch("src.mc1_scraper.session_bootstrap_url", chart_url + "fc"), \
+                    patch("src.mc1_scraper.crumb_url", chart_url + "getcrumb"):
+                status = cli(["--metrics-file", metrics_file, "--journal", journal_file,
+                              "--session-file", session_file, "--log-level", "WARNING", "fetch",
+                              "--links-file", links_file, "--output", output, "--fetch-mode", "chart",
+                              "--no-columnar", "--store", store_file])
+
+            self.assertEqual(status, 0)
+            factory.assert_not_called()
+            self.assertEqual(list(pd.read_csv(output).columns), ["timestamp", "AAA", "BBB"])
+            with open(metrics_file) as file:
+                self.assertIn('mc1_tickers_total{result="fetched"} 2', file.read())
+            with PriceStore(store_file) as prices:
+                self.assertEqual(prices.tickers(), ["AAA", "BBB"])
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(tmp_dir)
+
+    def test_cli_without_command_runs_all(self):
+        """
+        Test that calling the script without a command, as before the commands existed, runs `run-all`.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            with patch("src.mc1_scraper.discover_links", return_value=[]) as discover:
+                status = cli(["--metrics-file", "", "--journal", os.path.join(tmp_dir, "journal.sqlite"),
+                              "--session-file", os.path.join(tmp_dir, "session.json"),
+                              "--discovery-cache", os.path.join(tmp_dir, "discovery.sqlite"),
+                              "--log-level", "WARNING"])
+            self.assertEqual(status, 1)  # no links found
+            self.assertEqual(discover.call_args.args[1:3], ("auto", 1))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class TestCheckpointJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "journal.sqlite")
+        self.server, self.chart_url = _start_chart_server(_FastChartHandler)
+        self.links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(4)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _fetch(self, links, journal):
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url):
+            return fetch_all_tickers_data(links, period1=1609459200, period2=1609632000, journal=journal)
+
+    def test_resumed_pages_are_not_requested(self):
+        """
+        Test that a resumed discovery returns the journaled links without loading those pages again.
+        """
+        gold = "https://finance.yahoo.com/sectors/basic-materials/gold/"
+        copper = "https://finance.yahoo.com/sectors/basic-materials/copper/"
+        session = _fixture_session({"/gold/": _read_fixture("industry_gold.html"), "/copper/": "<html></html>"})
+        with CheckpointJournal(self.path) as journal:
+            first = extract_quote_links_http([gold], session, journal=journal)
+
+        session.get.reset_mock()
+        with CheckpointJournal(self.path, resume=True) as journal:
+            links = extract_quote_links_http([gold, copper], session, journal=journal)
+            self.assertEqual(journal.summary(), {"pages": 2, "tickers": 0})
+        self.assertEqual(links, first)
+        self.assertEqual([call.args[0] for call in session.get.call_args_list], [copper])
+
+    def test_resumed_tickers_are_not_requested(self):
+        """
+        Test that an interrupted fetch resumes with only the remaining tickers and the same result.
+        """
+        with CheckpointJournal(self.path) as journal:
+            self._fetch(self.links[:2], journal)  # the run stops after two tickers
+        requests_before = len(self.server.request_headers)
+
+        with CheckpointJournal(self.path, resume=True) as journal:
+            resumed = self._fetch(self.links, journal)
+            self.assertEqual(journal.summary()["tickers"], 4)
+        self.assertEqual(len(self.server.request_headers) - requests_before, 2)
+        self.assertTrue(resumed.equals(self._fetch(self.links, None)))
+
+    def test_fresh_run_clears_journal(self):
+        """
+        Test that opening the journal without resume forgets the previous run, missing tickers included.
+        """
+        with CheckpointJournal(self.path) as journal:
+            journal.record_ticker("NODATA", None)
+            journal.set_meta("period", [1, 2])
+            self.assertEqual(journal.completed_tickers(["NODATA", "OTHER"]), {"NODATA": None})
+        with CheckpointJournal(self.path) as journal:
+            self.assertEqual(journal.summary(), {"pages": 0, "tickers": 0})
+            self.assertIsNone(journal.get_meta("period"))
+
+
+class _FlakyChartHandler(_SlowChartHandler):
+    """
+    Chart server where FLAKY fails once with 503 and GONE always answers 404.
+    """
+    delay = 0
+
+    def do_GET(self):
+        ticker = urlparse(self.path).path.rsplit("/", 1)[-1]
+        with self.server.lock:
+            self.server.requests_by_ticker[ticker] = self.server.requests_by_ticker.get(ticker, 0) + 1
+            attempt = self.server.requests_by_ticker[ticker]
+        if ticker == "GONE" or (ticker == "FLAKY" and attempt == 1):
+            self.send_response(404 if ticker == "GONE" else 503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        super().do_GET()
+
+
+class TestRetryScheduler(unittest.TestCase):
+
+    def test_only_failed_tickers_are_retried(self):
+        """
+        Test that a transient failure re-requests only that ticker and a 404 is not retried.
+        """
+        server, chart_url = _start_chart_server(_FlakyChartHandler)
+        server.lock = threading.Lock()
+        server.requests_by_ticker = {}
+        try:
+            links = [f"https://finance.yahoo.com/quote/{t}/" for t in ("T0", "FLAKY", "T1", "GONE")]
+            retry = RetryScheduler(base_delay=0.01, seed=1)
+            with patch("src.mc1_scraper.chart_base_url", chart_url):
+                data = fetch_all_tickers_data(links, max_concurrency=2, retry=retry)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(list(data.columns), ["timestamp", "T0", "FLAKY", "T1"])
+        self.assertEqual(server.requests_by_ticker, {"T0": 1, "FLAKY": 2, "T1": 1, "GONE": 1})
+        self.assertEqual(retry.retried, 1)
+        self.assertEqual(list(retry.failed), [links[3]])
+
+    def test_worker_moves_on_while_item_waits(self):
+        """
+        Test that a failed item is re-queued behind the waiting items instead of blocking its worker.
+        """
+        calls = []
+
+        async def call(item):
+            calls.append(item)
+            if item == "bad" and calls.count("bad") == 1:
+                raise requests.ConnectionError("reset")
+            return item.upper()
+
+        scheduler = RetryScheduler(base_delay=0.05, seed=0)
+        results = run_coroutine(scheduler.run(["bad", "a", "b"], call, workers=1))
+        self.assertEqual(results, ["BAD", "A", "B"])
+        self.assertEqual(calls, ["bad", "a", "b", "bad"])
+
+    def test_error_classification(self):
+        """
+        Test that throttling, server errors and connection errors are retryable, other client errors not.
+        """
+        def http_error(status):
+            response = requests.Response()
+            response.status_code = status
+            return requests.HTTPError(response=response)
+
+        self.assertTrue(is_retryable_error(http_error(429)))
+        self.assertTrue(is_retryable_error(http_error(503)))
+        self.assertTrue(is_retryable_error(requests.Timeout()))
+        self.assertFalse(is_retryable_error(http_error(404)))
+        self.assertFalse(is_retryable_error(KeyError("chart")))
+
+    def test_circuit_breaker_opens_and_probes(self):
+        """
+        Test that the breaker opens on a failure spike, admits one probe after the cool-down and closes on success.
+        """
+        now = [0.0]
+        breaker = CircuitBreaker("example.com", window=4, min_calls=4, failure_rate=0.5, cooldown=10,
+                                 clock=lambda: now[0])
+        for success in (True, False, True, False):
+            self.assertEqual(breaker.allow(), 0.0)
+            breaker.record(success)
+        self.assertEqual(breaker.state, "open")
+        self.assertEqual(breaker.allow(), 10)
+
+        now[0] = 10.0
+        self.assertEqual(breaker.allow(), 0.0)  # the probe
+        self.assertEqual(breaker.allow(), CircuitBreaker.probe_wait)
+        breaker.record(True)
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.allow(), 0.0)
+
+
+class _SessionHandler(_SlowChartHandler):
+    """
+    Stand-in for the cookie bootstrap, crumb and chart endpoints; charts need the current cookie and crumb.
+    """
+    delay = 0
+
+    def _reply(self, status, body=b"", extra_headers=()):
+        self.send_response(status)
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        server = self.server
+        has_cookie = f"A3={server.token}" in self.headers.get("Cookie", "")
+        if url.path.endswith("/fc"):
+            server.bootstraps += 1
+            cookies = [("Set-Cookie", f"A3={server.token}; Path=/")] if server.set_cookie else []
+            self._reply(404, extra_headers=cookies)
+        elif url.path.endswith("/getcrumb") and has_cookie:
+            self._reply(200, server.crumb.encode())
+        elif has_cookie and parse_qs(url.query).get("crumb") == [server.crumb]:
+            super().do_GET()
+        else:
+            self._reply(401, b'{"finance":{"error":{"code":"Unauthorized","description":"Invalid Crumb"}}}')
+
+
+class TestSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "session.json")
+        self.server, chart_url = _start_chart_server(_SessionHandler)
+        self.server.token, self.server.crumb = "token1", "crumb1"
+        self.server.bootstraps, self.server.set_cookie = 0, True
+        self.patches = [
+            patch("src.mc1_scraper.chart_base_url", chart_url),
+            patch("src.mc1_scraper.session_bootstrap_url", chart_url + "fc"),
+            patch("src.mc1_scraper.crumb_url", chart_url + "getcrumb"),
+        ]
+        for patcher in self.patches:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patches:
+            patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _manager(self, factory=None):
+        return SessionManager(create_http_session(), path=self.path, driver_factory=factory)
+
+    def test_bootstrap_once_then_reuse_saved_session(self):
+        """
+        Test that the first run bootstraps over HTTP without a browser and the next run reuses the saved session.
+        """
+        factory = MagicMock()
+        timestamps, _ = fetch_stock_data("NEM", 1609459200, 1609632000, session=self._manager(factory))
+        self.assertEqual(len(timestamps), 2)
+        self.assertEqual(self.server.bootstraps, 1)
+        factory.assert_not_called()
+
+        manager = self._manager(factory)
+        timestamps, _ = fetch_stock_data("NEM", 1609459200, 1609632000, session=manager)
+        self.assertEqual(len(timestamps), 2)
+        self.assertEqual((manager.source, self.server.bootstraps), ("file", 1))
+
+    def test_refresh_when_session_is_rejected(self):
+        """
+        Test that a response rejecting the crumb refreshes the session and the request succeeds.
+        """
+        manager = self._manager()
+        manager.ensure()
+        self.server.token, self.server.crumb = "token2", "crumb2"  # the session expires server-side
+        timestamps, _ = fetch_stock_data("NEM", 1609459200, 1609632000, session=manager)
+        self.assertEqual(len(timestamps), 2)
+        self.assertEqual((manager.crumb, self.server.bootstraps), ("crumb2", 2))
+
+    def test_browser_only_when_http_bootstrap_fails(self):
+        """
+        Test that the browser hands its consent cookies over when plain HTTP gets none, and expired files are ignored.
+        """
+        with open(self.path, "w") as file:
+            json.dump({"cookies": [], "crumb": "old", "expires": time.time() - 1}, file)
+        self.server.set_cookie = False
+        driver = MagicMock()
+        driver.get_cookies.return_value = [{"name": "A3", "value": "token1", "domain": "127.0.0.1", "path": "/"}]
+        factory = MagicMock(return_value=driver)
+
+        manager = self._manager(factory)
+        with patch("src.mc1_scraper.open_browser_session") as mock_open_session:
+            manager.ensure()
+        mock_open_session.assert_called_once_with(driver)
+        self.assertEqual((manager.source, manager.crumb), ("browser", "crumb1"))
+        with open(self.path) as file:
+            self.assertEqual(json.load(file)["crumb"], "crumb1")
+
+
+class _PageAndChartSession:
+    """
+    Serves fixture industry pages by URL suffix and sends every other request to a real session.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.session = create_http_session()
+
+    def get(self, url, **kwargs):
+        for suffix, html in self.pages.items():
+            if url.endswith(suffix):
+                response = MagicMock(status_code=200, text=html)
+                return response
+        return self.session.get(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class TestShardedExecution(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.queue_path = os.path.join(self.tmp_dir, "queue.sqlite")
+        self.server, self.chart_url = _start_chart_server(_FastChartHandler)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_leases_are_exclusive_and_expire(self):
+        """
+        Test that workers never lease the same item, expired leases move on and failures are re-queued or dropped.
+        """
+        links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(3)]
+        with WorkQueue(self.queue_path) as work:
+            self.assertEqual(work.put("ticker", links + links[:1]), 3)
+            first = work.lease("w1", limit=2, lease_seconds=0)
+            second = work.lease("w2", limit=5)
+            self.assertEqual([item["key"] for item in second], [links[0], links[1], links[2]])  # w1's leases expired
+            self.assertFalse(work.complete(first[0], "w1", "{}"))
+            self.assertTrue(work.complete(second[0], "w2", "{}"))
+
+            work.fail(second[1], "w2", requests.Timeout(), retryable=True)
+            work.fail(second[2], "w2", KeyError("chart"), retryable=False)
+            self.assertEqual(work.counts(), {"ticker": {"done": 1, "pending": 1, "failed": 1}})
+            self.assertEqual(work.remaining(), 1)
+
+    def test_enqueue_resets_queue_with_pages_or_links(self):
+        """
+        Test that enqueueing starts a new queue with its period and interval, holding either industry pages or links.
+        """
+        links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(3)]
+        with WorkQueue(self.queue_path) as work:
+            work.put("ticker", ["https://finance.yahoo.com/quote/OLD/"])
+
+        self.assertEqual(enqueue_work(self.queue_path, links=links, days=30, interval="1h"), 3)
+        with WorkQueue(self.queue_path) as work:
+            self.assertEqual(work.counts(), {"ticker": {"pending": 3}})
+            period1, period2 = work.get_meta("period")
+            self.assertAlmostEqual(period2 - period1, 30 * 86400, delta=86400)
+            self.assertEqual(work.get_meta("interval"), "1h")
+
+        session = _ConditionalSession({"/basic-materials/": _read_fixture("sector_basic_materials.html")})
+        self.assertEqual(enqueue_work(self.queue_path, session), len(generate_urls()))
+        with WorkQueue(self.queue_path) as work:
+            self.assertEqual(work.counts(), {"page": {"pending": len(generate_urls())}})
+
+    def test_shared_queue_uses_rollback_journal(self):
+        """
+        Test that a queue on shared storage uses a rollback journal instead of WAL and still hands out leases.
+        """
+        with WorkQueue(self.queue_path, shared=True) as work:
+            self.assertEqual(work._db.execute("PRAGMA journal_mode").fetchone()[0], "delete")
+            work.put("ticker", ["https://finance.yahoo.com/quote/T0/"])
+            with WorkQueue(self.queue_path, shared=True) as other:
+                self.assertEqual(len(work.lease("w1")), 1)
+                self.assertEqual(other.lease("w2"), [])
+        self.assertFalse(os.path.exists(self.queue_path + "-wal"))
+        with WorkQueue(os.path.join(self.tmp_dir, "local.sqlite")) as work:
+            self.assertEqual(work._db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_repeatedly_expired_lease_fails(self):
+        """
+        Test that an item whose lease keeps expiring is marked failed after the last attempt, so the queue drains.
+        """
+        link = "https://finance.yahoo.com/quote/CRASH/"
+        with WorkQueue(self.queue_path) as work:
+            work.put("ticker", [link])
+            for attempt in range(1, 4):
+                self.assertEqual(work.lease(f"w{attempt}", lease_seconds=0, max_attempts=3)[0]["attempts"], attempt)
+            self.assertEqual(work.lease("w4", lease_seconds=0, max_attempts=3), [])
+            self.assertEqual(work.counts(), {"ticker": {"failed": 1}})
+            self.assertEqual(work.remaining(), 0)
+
+    def test_workers_share_queue_and_merge(self):
+        """
+        Test that two workers drain a queue of industry pages and the merge holds every discovered ticker.
+        """
+        gold = "https://finance.yahoo.com/sectors/basic-materials/gold/"
+        with WorkQueue(self.queue_path) as work:
+            work.reset()
+            work.set_meta("period", [1609459200, 1609632000])
+            work.put("page", [gold])
+
+        session = _PageAndChartSession({"/gold/": _read_fixture("industry_gold.html")})
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url):
+            threads = [
+                threading.Thread(target=run_worker, args=(self.queue_path, f"w{i}", 4, session),
+                                 kwargs={"poll_interval": 0.05})
+                for i in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        session.close()
+
+        data = merge_work_queue(self.queue_path)
+        self.assertEqual(len(data.columns), 11)
+        self.assertEqual(data.columns[1], "NEM")
+        with WorkQueue(self.queue_path) as work:
+            self.assertEqual(work.counts(), {"page": {"done": 1}, "ticker": {"done": 10}})
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork", "worker processes inherit the test patches")
+    def test_run_sharded_with_processes(self):
+        """
+        Test the sharded mode end to end with worker processes.
+        """
+        links = [f"https://finance.yahoo.com/quote/T{i}/" for i in range(6)]
+        with patch("src.mc1_scraper.chart_base_url", self.chart_url), \
+                patch("src.mc1_scraper.session_bootstrap_url", self.chart_url + "fc"), \
+                patch("src.mc1_scraper.crumb_url", self.chart_url + "getcrumb"):
+            data = run_sharded(workers=2, queue_path=self.queue_path, links=links, concurrency=2)
+        self.assertEqual(list(data.columns), ["timestamp"] + [f"T{i}" for i in range(6)])
+
+
+class TestPriceStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.tmp_dir, "prices.sqlite"))
+        self.days = pd.date_range("2024-01-02 14:30", periods=6, freq="D")
+        self.data = pd.DataFrame({
+            "timestamp": self.days,
+            "NEM": [1.0, 2.0, 3.0, 4.0, 5.0, 6.0],
+            "GOLD": [10.0, np.nan, 30.0, 40.0, 50.0, 60.0],
+        })
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_upsert_is_idempotent_and_accumulates(self):
+        """
+        Test that writing a run twice stores each bar once, newer prices win and later runs add history.
+        """
+        self.assertEqual(self.store.upsert_frame(self.data), 11)  # the NaN is not stored
+        self.store.upsert_frame(self.data)
+        self.store.upsert("NEM", self.days[-1:] + pd.Timedelta(days=1), [7.0])
+        self.store.upsert("NEM", self.days[:1], [1.5])
+
+        nem = self.store.series("NEM")
+        self.assertEqual(nem["NEM"].tolist(), [1.5, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(self.store.time_range("NEM"), (1704205800, 1704205800 + 6 * 86400))
+        self.assertEqual(self.store.get("GOLD", "2024-01-04 14:30"), 30.0)
+        self.assertIsNone(self.store.get("GOLD", "2024-01-03 14:30"))
+
+    def test_query_returns_aligned_range(self):
+        """
+        Test that a query returns the wide frame of the chosen tickers and range, like the fetcher output.
+        """
+        self.store.upsert_frame(self.data)
+        self.store.upsert("SPY", self.days, [100.0] * 6, interval="1h")  # other intervals stay separate
+
+        result = self.store.query(["GOLD", "NEM", "MISSING"], start="2024-01-03", end="2024-01-05 23:59")
+        expected = self.data.iloc[1:4][["timestamp", "GOLD", "NEM"]].reset_index(drop=True)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+        self.assertEqual(list(self.store.query().columns), ["timestamp", "GOLD", "NEM"])
+
+
+class _IntradayChartHandler(_SlowChartHandler):
+    """
+    Hourly chart server that, like Yahoo, returns only the last 60 days of a longer range.
+    """
+    delay = 0.05
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        period1, period2 = int(query["period1"][0]), int(query["period2"][0])
+        with self.server.lock:
+            self.server.ranges.append((period1, period2))
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        time.sleep(self.delay)
+        start = max(period1, period2 - 60 * 86400)
+        timestamps = list(range(start - start % 3600 + 1800, period2, 3600))
+        timestamps = [t for t in timestamps if t >= start]
+        body = json.dumps({
+            "chart": {
+                "result": [{
+                    "meta": {"exchangeTimezoneName": "America/New_York", "gmtoffset": -14400},
+                    "timestamp": timestamps,
+                    "indicators": {"quote": [{"close": [t / 3600 for t in timestamps]}]},
+                }]
+            }
+        }).encode()
+        with self.server.lock:
+            self.server.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class TestIntradayHistory(unittest.TestCase):
+
+    def test_long_range_is_fetched_in_concurrent_windows(self):
+        """
+        Test that a year of hourly bars is split into windows Yahoo serves in full, fetched concurrently and stitched.
+        """
+        server, chart_url = _start_chart_server(_IntradayChartHandler)
+        server.lock = threading.Lock()
+        server.ranges, server.in_flight, server.max_in_flight = [], 0, 0
+        now = 1735689600  # 2025-01-01
+        period1, period2 = now - 365 * 86400, now
+        try:
+            with patch("src.mc1_scraper.chart_base_url", chart_url):
+                data = fetch_intraday_history(["https://finance.yahoo.com/quote/SPY/", "QQQ"], period1, period2,
+                                              interval="1h", max_concurrency=8, now=now)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        expected = np.arange(period1 + 1800, period2, 3600)
+        self.assertEqual(list(data.columns), ["timestamp", "SPY", "QQQ"])
+        self.assertTrue(np.array_equal(data["timestamp"].to_numpy(), pd.to_datetime(expected, unit="s").to_numpy()))
+        np.testing.assert_allclose(data["SPY"], expected / 3600)
+        self.assertFalse(data["QQQ"].isna().any())
+        self.assertEqual(len(server.ranges), 2 * 7)
+        self.assertTrue(all(end - start <= 60 * 86400 for start, end in server.ranges))
+        self.assertGreater(server.max_in_flight, 1)
+        self.assertEqual(data.attrs["exchange_timezones"], {"SPY": "America/New_York", "QQQ": "America/New_York"})
+
+    def test_windows_respect_lookback(self):
+        """
+        Test that minute ranges are cut into 7-day windows starting at the 30-day lookback limit.
+        """
+        now = 1735689600
+        windows = intraday_windows(now - 90 * 86400, now, "1m", now=now)
+        self.assertEqual(len(windows), 5)
+        self.assertEqual(windows[0][0], now - 30 * 86400 + 60)
+        self.assertEqual(windows[-1][1], now)
+        self.assertTrue(all(b[0] < a[1] for a, b in zip(windows, windows[1:])))
+        with self.assertRaises(ValueError):
+            intraday_windows(0, now, "1d")
+
+    def test_stitching_and_exchange_time(self):
+        """
+        Test that overlapping bars are kept once, with a price preferred, and local times follow DST.
+        """
+        epochs, closes = stitch_intraday_chunks([
+            (np.array([100, 200, 300]), np.array([1.0, 2.0, np.nan])),
+            (np.array([300, 400]), np.array([3.0, 4.0])),
+            (np.array([400]), np.array([np.nan])),
+        ])
+        self.assertEqual(epochs.tolist(), [100, 200, 300, 400])
+        self.assertEqual(closes.tolist(), [1.0, 2.0, 3.0, 4.0])
+
+        # 14:30 UTC is the NYSE open in winter (EST) and 10:30 in summer (EDT)
+        local = to_exchange_time(pd.to_datetime(["2024-03-08 14:30", "2024-03-11 14:30"]), "America/New_York")
+        self.assertEqual([t.strftime("%H:%M") for t in local], ["09:30", "10:30"])
+        local = to_exchange_time([1710167400], "America/New_York")
+        self.assertEqual(local[0].strftime("%Y-%m-%d %H:%M"), "2024-03-11 10:30")
+
+
+class _ConditionalSession:
+    """
+    Serves fixture HTML by URL suffix with an ETag per page, answering 304 to a matching If-None-Match.
+    """
+
+    def __init__(self, pages, etags=True):
+        self.pages = dict(pages)
+        self.etags = etags
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        suffix, html = next((suffix, html) for suffix, html in self.pages.items() if url.endswith(suffix))
+        etag = f'"{hash(html)}"' if self.etags else None
+        conditional = (headers or {}).get("If-None-Match")
+        self.requests.append((suffix, conditional))
+        response = MagicMock()
+        response.status_code = 304 if etag and conditional == etag else 200
+        response.text = html
+        response.headers = {"ETag": etag} if etag else {}
+        return response
+
+
+class TestDiscoveryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.now = [1_700_000_000.0]
+        self.cache = DiscoveryCache(os.path.join(self.tmp_dir, "discovery.sqlite"), clock=lambda: self.now[0])
+        sector = _read_fixture("sector_basic_materials.html")
+        gold = _read_fixture("industry_gold.html")
+        # Every industry of the fixture sector page is served the gold page
+        self.pages = {"/basic-materials/": sector, "/": gold}
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fresh_pages_are_not_requested(self):
+        """
+        Test that a second discovery within the TTL returns the same links without any request.
+        """
+        session = _ConditionalSession(self.pages)
+        links = discover_quote_links(session, cache=self.cache)
+        self.assertEqual(len(session.requests), 7)
+
+        session.requests.clear()
+        self.now[0] += 3600
+        self.assertEqual(discover_quote_links(session, cache=self.cache), links)
+        self.assertEqual(session.requests, [])
+
+    def test_unchanged_pages_are_not_parsed_after_ttl(self):
+        """
+        Test that after the TTL pages are requested conditionally and neither a 304 nor an identical body is parsed.
+        """
+        for etags in (True, False):
+            cache = DiscoveryCache(os.path.join(self.tmp_dir, f"etags_{etags}.sqlite"), clock=lambda: self.now[0])
+            session = _ConditionalSession(self.pages, etags=etags)
+            links = discover_quote_links(session, cache=cache)
+            self.now[0] += cache.ttl.total_seconds() + 1
+            session.requests.clear()
+
+            with patch("src.mc1_scraper.parse_quote_links") as parse, \
+                    patch("src.mc1_scraper.parse_industry_names") as parse_names:
+                self.assertEqual(discover_quote_links(session, cache=cache), links)
+            parse.assert_not_called()
+            parse_names.assert_not_called()
+            self.assertEqual(len(session.requests), 7)
+            self.assertEqual(all(etag is not None for _, etag in session.requests), etags)
+            self.assertEqual(cache.changes(), [])
+            cache.close()
+
+    def test_changed_page_is_parsed_and_recorded(self):
+        """
+        Test that a changed industry page is parsed again and the added and removed links are recorded.
+        """
+        session = _ConditionalSession(self.pages)
+        links = discover_quote_links(session, cache=self.cache)
+        gold_url = generate_urls()[0]
+        self.now[0] += self.cache.ttl.total_seconds() + 1
+
+        session.pages = {"/basic-materials/": self.pages["/basic-materials/"],
+                         "/": self.pages["/"].replace("/quote/NEM/", "/quote/NEWCO/")}
+        updated = discover_quote_links(session, cache=self.cache)
+
+        self.assertIn("https://finance.yahoo.com/quote/NEWCO/", updated)
+        self.assertNotIn("https://finance.yahoo.com/quote/NEM/", updated)
+        changes = self.cache.changes()
+        self.assertEqual(len(changes), len(generate_urls()))
+        self.assertEqual(changes[0]["url"], gold_url)
+        self.assertEqual(changes[0]["added"], ["https://finance.yahoo.com/quote/NEWCO/"])
+        self.assertEqual(changes[0]["removed"], ["https://finance.yahoo.com/quote/NEM/"])
+        self.assertEqual(len(links), len(updated))
+
+    def test_market_crawl_and_discovery_share_a_cache(self):
+        """
+        Test that the industry URLs cached by a market crawl are not read back as industry names.
+        """
+        pages = dict(self.pages, **{"count=100": self.pages["/"]})
+        crawled = crawl_market(_ConditionalSession(pages), sectors=["basic-materials"], rate=1000, burst=1000,
+                               cache=self.cache)
+        links = discover_quote_links(_ConditionalSession(pages), cache=self.cache)
+
+        self.assertEqual(links, discover_quote_links(_ConditionalSession(pages)))
+        self.assertFalse(any("https://" in url[len("https://"):] for url in generate_urls()))
+        self.assertEqual(sorted(crawl_market(_ConditionalSession(pages), sectors=["basic-materials"], rate=1000,
+                                             burst=1000, cache=self.cache)), sorted(crawled))
+
+
+class _RecordingChartHandler(_SlowChartHandler):
+    """
+    Chart server that records the requested paths.
+    """
+    delay = 0
+
+    def do_GET(self):
+        self.server.paths.append(self.path)
+        super().do_GET()
+
+
+class TestScraperDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.server, self.chart_url = _start_chart_server(_RecordingChartHandler)
+        self.server.paths = []
+        self.patcher = patch("src.mc1_scraper.chart_base_url", self.chart_url)
+        self.patcher.start()
+        self.daemon = ScraperDaemon(
+            links=["https://finance.yahoo.com/quote/NEM/", "https://finance.yahoo.com/quote/GOLD/"],
+            days=365 * 20, fetch_mode="chart", store=os.path.join(self.tmp_dir, "prices.sqlite"),
+            session=create_http_session(), chart_cache=ChartCache(os.path.join(self.tmp_dir, "chart_cache")),
+            port=0,
+        )
+
+    def tearDown(self):
+        self.daemon.close()
+        self.patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _get(self, path):
+        response = requests.get(self.daemon.url + path, timeout=5)
+        return response.status_code, response
+
+    def test_serves_latest_prices_and_metrics(self):
+        """
+        Test that a refresh cycle is served from memory as JSON, CSV, stored history, status and metrics.
+        """
+        self.daemon.run(cycles=1)
+
+        status, response = self._get("/prices")
+        self.assertEqual(status, 200)
+        payload = response.json()
+        self.assertEqual(payload["columns"], ["timestamp", "NEM", "GOLD"])
+        self.assertEqual([row[1] for row in payload["data"]], [123.45, 125.67])
+
+        status, response = self._get("/prices?tickers=GOLD,UNKNOWN&start=2021-01-02&format=csv")
+        self.assertEqual(response.text.splitlines(), ["timestamp,GOLD", "2021-01-02,125.67"])
+        status, response = self._get("/history?tickers=NEM&end=2021-01-01")
+        self.assertEqual(response.json()["data"], [["2021-01-01T00:00:00.000", 123.45]])
+
+        status, response = self._get("/status")
+        self.assertEqual((response.json()["cycles"], response.json()["tickers"]), (1, 2))
+        status, response = self._get("/metrics")
+        self.assertIn("mc1_daemon_requests_total", response.text)
+        self.assertEqual(self._get("/unknown")[0], 404)
+
+    def test_refresh_requests_only_new_bars(self):
+        """
+        Test that later cycles reuse the warm session and request bars from the cached watermark on.
+        """
+        self.daemon.refresh_interval = timedelta(hours=1)
+        runner = threading.Thread(target=self.daemon.run, kwargs={"cycles": 2})
+        runner.start()
+        deadline = time.monotonic() + 5
+        while self.daemon.cycles < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        first_periods = {parse_qs(urlparse(path).query)["period1"][0] for path in self.server.paths}
+        connections = len(self.server.connections)
+        self.server.paths.clear()
+
+        # The second cycle starts on request instead of after the hour
+        response = requests.post(self.daemon.url + "/refresh", timeout=5)
+        self.assertEqual(response.status_code, 202)
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+
+        periods = {parse_qs(urlparse(path).query)["period1"][0] for path in self.server.paths}
+        self.assertEqual(periods, {"1609545600"})  # the newest cached bar
+        self.assertNotEqual(first_periods, periods)
+        self.assertEqual(self.daemon.cycles, 2)
+        self.assertEqual(len(self.server.connections), connections)  # pooled connections are reused
+
+    def test_long_intraday_range_is_backfilled_once(self):
+        """
+        Test that a long intraday range is backfilled in windows on the first cycle and only the delta is requested after.
+        """
+        server, chart_url = _start_chart_server(_IntradayChartHandler)
+        server.lock = threading.Lock()
+        server.ranges, server.in_flight, server.max_in_flight = [], 0, 0
+        daemon = ScraperDaemon(links=["https://finance.yahoo.com/quote/NEM/"], days=150, interval="1h",
+                               fetch_mode="chart", store=os.path.join(self.tmp_dir, "intraday.sqlite"),
+                               session=create_http_session(),
+                               chart_cache=ChartCache(os.path.join(self.tmp_dir, "intraday_cache")), port=0)
+        try:
+            with patch("src.mc1_scraper.chart_base_url", chart_url):
+                daemon.run(cycles=1)
+                self.assertEqual(len(server.ranges), 4)  # 3 windows and the delta since the backfill
+                first_ts, last_ts = daemon.store.time_range("NEM", "1h")
+                self.assertLess(first_ts, time.time() - 149 * 86400)  # the whole backfill is stored
+                self.assertEqual(len(daemon.data), daemon.max_bars)
+
+                server.ranges.clear()
+                daemon.run(cycles=1)
+        finally:
+            daemon.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(len(server.ranges), 1)
+        self.assertEqual(server.ranges[0][0], last_ts)  # from the watermark on
+        self.assertEqual(daemon.cycles, 2)
+
+    def test_select_prices(self):
+        """
+        Test selecting tickers and an inclusive time range from an aligned frame.
+        """
+        data = pd.DataFrame({"timestamp": pd.date_range("2024-01-01", periods=4, freq="D"),
+                             "A": [1.0, 2.0, 3.0, 4.0], "B": [5.0, 6.0, 7.0, 8.0]})
+        selected = select_prices(data, ["B", "C"], "2024-01-02", "2024-01-03")
+        self.assertEqual(list(selected.columns), ["timestamp", "B"])
+        self.assertEqual(selected["B"].tolist(), [6.0, 7.0])
+
+
 # Run the test suite
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file